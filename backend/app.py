@@ -1,19 +1,43 @@
 import argparse
+import atexit
 import base64
+import copy
+import gzip
+import hashlib
 import json
+import logging
+import multiprocessing
 import os
-import re
+import threading
+import time
+import zlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
 from io import BytesIO
 
 import cv2
+import map_codec
 import numpy as np
 from bosdyn.api import image_pb2
 from bosdyn.api.graph_nav import map_pb2
-from bosdyn.client.math_helpers import SE3Pose
-from flask import Flask, jsonify, request, send_from_directory
+from derived_cache import DerivedCache, files_key
+from flask import Flask, g, jsonify, request, send_from_directory, url_for
 from flask_cors import CORS
+from image_cache import ImageCache
+from label_journal import LabelJournal
+from level_of_detail import LevelOfDetailPyramid
+from map_watcher import MapWatcher, file_stat
+from metrics import METRICS
+from object_index import ObjectIndex, normalize_object_name
+from parallel_loader import PhaseTimer, is_metadata_file, load_metadata_files_parallel
 from PIL import Image
+from pose_table import PoseTable, invert_se3, se3_matrices
+from route_planner import RoutePlanner
 from scipy import ndimage
+from snapshot_store import SnapshotStore
+from spatial_index import SpatialIndex, segments_in_bbox
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__, static_folder="../spot-map-visualizer/build")
 CORS(app, resources={r"/api/*": {"origins": "*"}}, supports_credentials=True)
@@ -28,6 +52,9 @@ def serve(path):
         return send_from_directory(app.static_folder, "index.html")
 
 
+MapPayload = namedtuple("MapPayload", ["body", "gzip_body", "etag", "waypoints_count"])
+
+
 class SpotMapAPI:
     """API class to handle GraphNav map data and provide endpoints for React frontend."""
 
@@ -41,46 +68,115 @@ class SpotMapAPI:
         "right_fisheye_image": 180,
     }
 
-    def __init__(self, map_path, rag_path):
-        """Initialize the API with map and RAG data."""
+    # Longest image side in pixels for each served size variant (None keeps the original size)
+    IMAGE_SIZES = {"thumbnail": 320, "full": None}
+
+    def __init__(
+        self,
+        map_path,
+        rag_path,
+        snapshot_cache_mb=512,
+        image_cache_dir=None,
+        workers=None,
+        preload_snapshots=False,
+        derived_cache_dir=None,
+        image_workers=0,
+        prefetch_workers=2,
+        prefetch_depth=1,
+    ):
+        """Initialize the API with map and RAG data.
+
+        With ``image_workers > 0``, images are decoded and encoded in a pool of that many processes so that
+        rendering doesn't hold the GIL while other requests are served. ``prefetch_workers`` background threads
+        render the images of waypoints within ``prefetch_depth`` edges of a selected one before they are asked
+        for; 0 disables prefetching.
+        """
         self.map_path = map_path
         self.rag_db_path = rag_path
         self.snapshot_dir = os.path.join(self.map_path, "waypoint_snapshots")
+        self.snapshot_cache_bytes = int(snapshot_cache_mb * 1024 * 1024)
+        self.workers = max(1, int(workers or min(8, os.cpu_count() or 1)))
+        self.load_timings = PhaseTimer()
+        self.image_cache = ImageCache(image_cache_dir or os.path.join(self.map_path, "image_cache"))
+        self.derived_cache = DerivedCache(derived_cache_dir or os.path.join(self.map_path, "derived_cache"))
+        self.image_workers = max(0, int(image_workers or 0))
+        self._image_pool = None
+        self._image_pool_pid = None
+        self._image_pool_lock = threading.Lock()
+        self.prefetch_workers = max(0, int(prefetch_workers or 0))
+        self.prefetch_depth = max(0, int(prefetch_depth or 0))
+        self._prefetch_pool = None
+        self._prefetch_pool_pid = None
+        self._prefetch_lock = threading.Lock()
+        # Queued or running prefetches by (snapshot_id, source, version)
+        self._prefetching = {}
+
+        # Path for saving updated graph, and the journal of label edits not yet written to it
+        self.graph_file_path = os.path.join(self.map_path, "graph")
+        self.label_journal_path = os.path.join(self.map_path, "graph_labels.jsonl")
+
+        # Load data; the label files are stat-ed first so that sync_labels catches edits made while they're read
+        timings = self.load_timings
+        self._label_files_state = self._label_files_stat()
+        with timings.phase("load_graph"):
+            self.graph, self.waypoints, self.snapshots, self.anchors, self.anchored_world_objects = self.load_graph()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # Annotations and snapshots are read in the background while the transforms are computed
+            rag_future = executor.submit(timings.timed, "load_rag_data", self.load_rag_data)
+            preload_future = None
+            if preload_snapshots:
+                preload_future = executor.submit(
+                    timings.timed, "preload_snapshots", self.snapshots.preload, workers=self.workers
+                )
+
+            self.build_graph_data()
+            self.waypoint_annotations, self.object_index, self.rag_files = rag_future.result()
+
+            # Preloading only warms the snapshot cache; snapshots it missed are parsed on first use
+            if preload_future is not None:
+                try:
+                    preload_future.result()
+                except Exception as e:
+                    logger.warning("Could not preload snapshots of %s: %s", self.map_path, e)
 
-        # Load data
-        self.graph, self.waypoints, self.snapshots, self.anchors, self.anchored_world_objects = self.load_graph()
+        self.all_objects = self.extract_all_objects()
+        self.waypoint_objects = self.object_index.waypoint_objects
 
-        # Compute global transforms
-        self.global_transforms = self.compute_global_transforms()
-        self.anchored_transforms = self.compute_anchored_transforms()
+        # Label edits are journaled and compacted into the graph file in the background
+        self.label_journal = LabelJournal(self.label_journal_path, self.graph_file_path, self.rewrite_graph_labels)
+        atexit.register(self.close)
 
-        # Load annotations and extract all objects
-        self.waypoint_annotations = self.load_rag_annotations()
-        self.all_objects = self.extract_all_objects()
+        # Serialized /api/map payloads, rebuilt only when the graph changes
+        self._map_payloads = {}
+        self._map_payload_generation = 0
+        self._map_payload_lock = threading.Lock()
+        with timings.phase("build_map_payloads"):
+            for use_anchoring in (True, False):
+                for fmt in PREBUILT_MAP_FORMATS:
+                    self.get_map_payload(use_anchoring, fmt=fmt)
 
-        # Path for saving updated graph
-        self.graph_file_path = os.path.join(self.map_path, "graph")
+        timings.finish()
+        logger.info("Loaded map %s with %d workers: %s", self.map_path, self.workers, timings.summary())
 
     def load_graph(self):
-        """Load GraphNav map data including anchoring information."""
-        with open(os.path.join(self.map_path, "graph"), "rb") as f:
+        """Load GraphNav map data including anchoring information.
+
+        Also sets ``graph_key``, the geometry key of the graph (see ``_geometry_key``).
+        """
+        with open(self.graph_file_path, "rb") as f:
             graph = map_pb2.Graph()
             graph.ParseFromString(f.read())
+        self.graph_key = self._geometry_key(graph)
 
         waypoints = {waypoint.id: waypoint for waypoint in graph.waypoints}
-        snapshots = {}
+
+        # Replay label edits that were acknowledged but not yet compacted into the graph file
+        self._apply_labels(waypoints, LabelJournal.read(self.label_journal_path))
         anchors = {}
         anchored_world_objects = {}
 
-        # Load snapshots
-        for waypoint in graph.waypoints:
-            if waypoint.snapshot_id:
-                snapshot_path = os.path.join(self.snapshot_dir, waypoint.snapshot_id)
-                if os.path.exists(snapshot_path):
-                    with open(snapshot_path, "rb") as f:
-                        snapshot = map_pb2.WaypointSnapshot()
-                        snapshot.ParseFromString(f.read())
-                        snapshots[snapshot.id] = snapshot
+        snapshots = self._build_snapshot_store(graph)
 
         # Load anchoring information
         for anchor in graph.anchoring.anchors:
@@ -92,203 +188,1023 @@ class SpotMapAPI:
 
         return graph, waypoints, snapshots, anchors, anchored_world_objects
 
-    def load_rag_annotations(self):
-        """Load RAG annotations."""
-        annotations = {}
+    def _build_snapshot_store(self, graph):
+        """Index the snapshots of the graph's waypoints; they are parsed on first access."""
+        snapshot_ids = [waypoint.snapshot_id for waypoint in graph.waypoints if waypoint.snapshot_id]
+        return SnapshotStore(self.snapshot_dir, snapshot_ids, max_bytes=self.snapshot_cache_bytes)
+
+    @staticmethod
+    def _geometry_key(graph):
+        """Hash the parts of a graph that poses and LOD levels are derived from: waypoint ids, edges and anchoring.
+
+        Waypoint labels and snapshots are left out, so editing them doesn't invalidate the derived data.
+        """
+        digest = hashlib.sha1()
+        for waypoint in graph.waypoints:
+            digest.update(waypoint.id.encode("utf-8") + b"\0")
+        for edge in graph.edges:
+            data = edge.SerializeToString(deterministic=True)
+            digest.update(len(data).to_bytes(4, "little") + data)
+        digest.update(graph.anchoring.SerializeToString(deterministic=True))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _apply_labels(waypoints, labels):
+        """Set waypoint labels from ``(waypoint_id, label)`` pairs and return how many of them changed.
+
+        Waypoints not in the graph and labels that aren't strings are skipped.
+        """
+        changed = 0
+        for waypoint_id, label in labels:
+            waypoint = waypoints.get(waypoint_id)
+            if waypoint is not None and isinstance(label, str) and waypoint.annotations.name != label:
+                waypoint.annotations.name = label
+                changed += 1
+        return changed
+
+    def rewrite_graph_labels(self, labels):
+        """Serialize the graph file on disk with label edits applied, to compact the label journal into it.
+
+        The file is re-read rather than serializing ``self.graph`` so that edits journaled by other server
+        processes are kept.
+        """
+        with open(self.graph_file_path, "rb") as f:
+            graph = map_pb2.Graph()
+            graph.ParseFromString(f.read())
+
+        self._apply_labels({waypoint.id: waypoint for waypoint in graph.waypoints}, labels)
+        return graph.SerializeToString()
+
+    def read_graph_labels(self):
+        """Read the ``(waypoint_id, label)`` pairs stored in the graph file on disk."""
+        with open(self.graph_file_path, "rb") as f:
+            graph = map_pb2.Graph()
+            graph.ParseFromString(f.read())
+        return [(waypoint.id, waypoint.annotations.name) for waypoint in graph.waypoints]
+
+    def _label_files_stat(self):
+        return file_stat(self.graph_file_path), file_stat(self.label_journal_path)
+
+    def sync_labels(self):
+        """Apply the label edits other server processes made since the labels were loaded or last synced.
+
+        Called before data is served, so that every worker shows an edit as soon as it is acknowledged. Unless
+        the graph file or label journal changed, this only stats them. When the graph file changed, e.g. because
+        another process compacted the journal into it, its labels are re-read as well.
+        """
+        if self._label_files_stat() == self._label_files_state:
+            return
+
+        with self.label_journal.lock, self.label_journal.file_lock():
+            # Appends and compactions wait for the file lock, so the files can't change while they're read
+            state = self._label_files_stat()
+            if state == self._label_files_state:
+                return
+            labels = self.read_graph_labels() if state[0] != self._label_files_state[0] else []
+            labels.extend(LabelJournal.read(self.label_journal_path))
+            changed = self._apply_labels(self.waypoints, labels)
+            self._label_files_state = state
+        if changed:
+            self.invalidate_map_payloads()
+
+    def replay_label_journal(self):
+        """Apply the label edits in the journal, e.g. ones made by another server process, to the loaded graph."""
+        with self.label_journal.lock:
+            changed = self._apply_labels(self.waypoints, LabelJournal.read(self.label_journal_path))
+        if changed:
+            self.invalidate_map_payloads()
+
+    def reload(self, changes):
+        """Return an API that reflects ``changes`` (a ``MapChanges``) to the map and RAG files.
+
+        Label journal changes are applied in place. Anything else is rebuilt on a shallow copy of this instance
+        that shares all the state the changes don't affect: poses are only recomputed if the graph geometry
+        changed, unchanged snapshots stay parsed and only changed annotation files are re-read. This instance is
+        not modified, so requests already using it finish against consistent data while the caller swaps in
+        the copy.
+        """
+        if changes.labels:
+            self.replay_label_journal()
+        if not (changes.graph or changes.snapshots or changes.rag_changed or changes.rag_removed):
+            return self
+
+        api = copy.copy(self)
+        api.load_timings = timings = PhaseTimer()
+
+        if changes.graph:
+            api._label_files_state = api._label_files_stat()
+            with timings.phase("load_graph"):
+                api.graph, api.waypoints, api.snapshots, api.anchors, api.anchored_world_objects = api.load_graph()
+            if api.graph_key != self.graph_key:
+                api.build_graph_data()
+        elif changes.snapshots:
+            api.snapshots = api._build_snapshot_store(api.graph)
+        if api.snapshots is not self.snapshots:
+            api.snapshots.adopt(self.snapshots)
+
+        if changes.rag_changed or changes.rag_removed:
+            with timings.phase("update_rag_data"):
+                api.waypoint_annotations, api.object_index, api.rag_files = api.update_rag_data(
+                    changes.rag_changed, changes.rag_removed
+                )
+            api.all_objects = api.extract_all_objects()
+            api.waypoint_objects = api.object_index.waypoint_objects
+            # Routes to objects are memoized by object name, so the ones planned with the old annotations are dropped
+            if api.route_planner is self.route_planner:
+                api.route_planner = api.route_planner.with_empty_memo()
+
+        # The map payloads embed labels, snapshots and objects, so none of the old ones can be reused
+        api._map_payloads = {}
+        api._map_payload_generation = 0
+        api._map_payload_lock = threading.Lock()
+        if changes.graph:
+            # Edits journaled after the graph file was read
+            api.replay_label_journal()
+        with timings.phase("build_map_payloads"):
+            for use_anchoring in (True, False):
+                for fmt in PREBUILT_MAP_FORMATS:
+                    api.get_map_payload(use_anchoring, fmt=fmt)
+
+        timings.finish()
+        logger.info("Reloaded map %s: %s", api.map_path, timings.summary())
+        return api
+
+    def watch(self, on_reload, interval=2.0):
+        """Start a ``MapWatcher`` that passes each reloaded API to ``on_reload`` when the map or RAG files change.
+
+        Returns the watcher so it can be stopped.
+        """
+        state = {"api": self}
+
+        def reload(changes):
+            api = state["api"].reload(changes)
+            if api is not state["api"]:
+                state["api"] = api
+                on_reload(api)
+
+        watcher = MapWatcher(
+            self.graph_file_path, self.label_journal_path, self.snapshot_dir, self.rag_db_path, reload, interval
+        )
+        watcher.start()
+        return watcher
+
+    def after_fork(self):
+        """Restart background work in a server worker forked from the process that loaded the map.
+
+        Threads don't survive a fork; the image worker and prefetch pools are recreated on first use in each process.
+        """
+        with self._prefetch_lock:
+            self._prefetching = {}
+        self.label_journal.start()
+
+    def close(self):
+        """Compact outstanding label edits and stop the image worker and prefetch pools."""
+        self.label_journal.close()
+        if self._prefetch_pool is not None and self._prefetch_pool_pid == os.getpid():
+            with self._prefetch_lock:
+                pending = list(self._prefetching.values())
+            for future in pending:
+                future.cancel()
+            self._prefetch_pool.shutdown()
+        if self._image_pool is not None and self._image_pool_pid == os.getpid():
+            self._image_pool.shutdown()
+
+    def rag_metadata_paths(self):
+        """List the RAG ``metadata_*.json`` files, or an empty list if the RAG folder doesn't exist."""
         if not os.path.exists(self.rag_db_path):
-            return annotations
+            return []
+
+        metadata_files = [f for f in os.listdir(self.rag_db_path) if is_metadata_file(f)]
+        return [os.path.join(self.rag_db_path, metadata_file) for metadata_file in metadata_files]
 
-        metadata_files = [f for f in os.listdir(self.rag_db_path) if f.startswith("metadata_") and f.endswith(".json")]
+    def load_rag_data(self):
+        """Load the RAG annotations and index their objects, reusing the derived cache if no file changed.
 
-        for metadata_file in metadata_files:
-            with open(os.path.join(self.rag_db_path, metadata_file)) as f:
-                metadata = json.load(f)
-                waypoint_id = metadata.get("waypoint_id")
-                if waypoint_id:
-                    annotations[waypoint_id] = metadata
+        Returns ``(waypoint_annotations, object_index, rag_files)``, where ``rag_files`` maps each metadata file
+        name to the waypoint it annotates.
+        """
+        metadata_paths = self.rag_metadata_paths()
+        key = files_key(metadata_paths)
 
-        return annotations
+        cached = self.derived_cache.load("rag", key)
+        if cached is not None:
+            _, (annotations, postings, waypoint_objects, rag_files) = cached
+            return annotations, ObjectIndex.from_postings(postings, waypoint_objects, self._clean_text), rag_files
+
+        annotations = {}
+        rag_files = {}
+        for path, waypoint_id, metadata in load_metadata_files_parallel(metadata_paths, self.workers):
+            annotations[waypoint_id] = metadata
+            rag_files[os.path.basename(path)] = waypoint_id
+
+        object_index = ObjectIndex(annotations, self._clean_text)
+        self.save_cached_rag_data(key, annotations, object_index, rag_files)
+        return annotations, object_index, rag_files
+
+    def update_rag_data(self, changed_files, removed_files):
+        """Re-read only the changed metadata files and update the annotations and object index to match.
+
+        The current annotations and index are not modified; unchanged entries are shared with the new ones.
+        Returns ``(waypoint_annotations, object_index, rag_files)`` like ``load_rag_data``.
+        """
+        annotations = dict(self.waypoint_annotations)
+        rag_files = dict(self.rag_files)
+        affected = set()
+
+        for filename in set(changed_files) | set(removed_files):
+            waypoint_id = rag_files.pop(filename, None)
+            if waypoint_id is not None:
+                affected.add(waypoint_id)
+                annotations.pop(waypoint_id, None)
+
+        changed_paths = [os.path.join(self.rag_db_path, filename) for filename in sorted(changed_files)]
+        for path, waypoint_id, metadata in load_metadata_files_parallel(changed_paths, self.workers):
+            annotations[waypoint_id] = metadata
+            rag_files[os.path.basename(path)] = waypoint_id
+            affected.add(waypoint_id)
+
+        object_index = self.object_index.updated(annotations, affected)
+        self.save_cached_rag_data(files_key(self.rag_metadata_paths()), annotations, object_index, rag_files)
+        return annotations, object_index, rag_files
+
+    def save_cached_rag_data(self, key, annotations, object_index, rag_files):
+        """Write the annotations and object index to the derived cache under a key of the metadata files."""
+        objects = (annotations, object_index.postings, object_index.waypoint_objects, rag_files)
+        return self.derived_cache.save("rag", key, {}, objects)
 
     @staticmethod
     def _clean_text(text):
-        "Remove articles, plurals, and lower-case"
-        if not text:
-            return ""
-        text = re.sub(r"\b(a|an|the)\b", "", text)
-        text = re.sub(r"s\b", "", text)
-        text = text.lower()
-        return text
+        "Remove articles, plurals, case and extra whitespace"
+        return normalize_object_name(text)
 
     def extract_all_objects(self):
         """Extract all unique objects from the annotations."""
-        objects = set()
+        return self.object_index.objects
+
+    def get_object_waypoints(self, name):
+        """Get the waypoints that see an object, in graph order, with per-view sighting counts."""
+        postings = self.object_index.waypoints(name)
+        return [
+            {"id": waypoint_id, "views": postings[waypoint_id], "count": sum(postings[waypoint_id].values())}
+            for waypoint_id in self._in_graph_order(postings)
+        ]
 
-        for _, ann in self.waypoint_annotations.items():
-            if "views" in ann:
-                for _, view_data in ann["views"].items():
-                    visible_objects = view_data.get("visible_objects", [])
-                    # Clean and normalize object names
-                    cleaned_objects = [self._clean_text(obj) for obj in visible_objects]
-                    objects.update(cleaned_objects)
+    def query_object_waypoints(self, names, mode="or"):
+        """Get the ids, in graph order, of waypoints that see all (``mode="and"``) or any of the objects."""
+        return self._in_graph_order(self.object_index.query(names, mode))
 
-        return sorted(list(objects))
+    def _in_graph_order(self, waypoint_ids):
+        """Sort waypoint ids by their position in the graph, dropping ids the graph doesn't contain."""
+        rows = self.global_transforms.index
+        return sorted((waypoint_id for waypoint_id in waypoint_ids if waypoint_id in rows), key=rows.__getitem__)
 
-    def compute_global_transforms(self):
-        """Compute global transforms for all waypoints using BFS."""
-        # Dictionary to store global transforms for each waypoint
-        global_transforms = {}
+    def build_edge_index(self, edge_transforms=None):
+        """Index edges by waypoint and cache each edge transform and its inverse.
 
-        # Start BFS from the first waypoint
-        queue = []
-        visited = {}
+        Returns ``adjacency``, mapping a waypoint id to a list of ``(neighbor_id, edge_index, forward)``
+        tuples in graph order, and ``edge_transforms``, an (E, 2, 4, 4) array holding ``from_tform_to``
+        and ``to_tform_from`` for each edge, indexed like ``self.graph.edges``. Previously computed
+        ``edge_transforms`` can be passed in to only rebuild the adjacency.
+        """
+        adjacency = {waypoint_id: [] for waypoint_id in self.waypoints}
 
-        # Start with first waypoint and identity matrix
-        first_waypoint = self.graph.waypoints[0]
-        queue.append((first_waypoint, np.eye(4)))
+        if edge_transforms is None:
+            from_tform_to = se3_matrices(edge.from_tform_to for edge in self.graph.edges)
+            edge_transforms = np.stack([from_tform_to, invert_se3(from_tform_to)], axis=1)
+
+        for edge_index, edge in enumerate(self.graph.edges):
+            from_id, to_id = edge.id.from_waypoint, edge.id.to_waypoint
+            if from_id == to_id or from_id not in adjacency or to_id not in adjacency:
+                continue
+            adjacency[from_id].append((to_id, edge_index, True))
+            adjacency[to_id].append((from_id, edge_index, False))
 
-        while len(queue) > 0:
-            curr_element = queue[0]
-            queue.pop(0)
-            curr_waypoint = curr_element[0]
-            world_tform_current = curr_element[1]
+        return adjacency, edge_transforms
 
-            if curr_waypoint.id in visited:
+    def compute_global_transforms(self):
+        """Compute global transforms for all waypoints using BFS.
+
+        The first waypoint is the world origin. Every other connected component is rooted at its first
+        waypoint in graph order, so its waypoints are placed relative to that root rather than dropped.
+        The BFS runs level by level so each frontier is composed with its edge transforms in one batch.
+        """
+        waypoint_ids = [waypoint.id for waypoint in self.graph.waypoints]
+        rows = {waypoint_id: row for row, waypoint_id in enumerate(waypoint_ids)}
+        matrices = np.zeros((len(waypoint_ids), 4, 4))
+        placed = np.zeros(len(waypoint_ids), dtype=bool)
+
+        for root_row, root_id in enumerate(waypoint_ids):
+            if placed[root_row]:
                 continue
 
-            visited[curr_waypoint.id] = True
-            global_transforms[curr_waypoint.id] = world_tform_current
+            matrices[root_row] = np.eye(4)
+            placed[root_row] = True
+            frontier = [root_id]
+
+            while frontier:
+                parent_rows, child_rows, edge_indices, directions = [], [], [], []
+                for curr_id in frontier:
+                    for neighbor_id, edge_index, forward in self.adjacency[curr_id]:
+                        neighbor_row = rows[neighbor_id]
+                        if placed[neighbor_row]:
+                            continue
 
-            for edge in self.graph.edges:
-                # Handle forward edges
-                if edge.id.from_waypoint == curr_waypoint.id and edge.id.to_waypoint not in visited:
-                    to_waypoint = self.waypoints[edge.id.to_waypoint]
-                    current_tform_to = SE3Pose.from_proto(edge.from_tform_to).to_matrix()
-                    world_tform_to = np.dot(world_tform_current, current_tform_to)
-                    queue.append((to_waypoint, world_tform_to))
+                        placed[neighbor_row] = True
+                        parent_rows.append(rows[curr_id])
+                        child_rows.append(neighbor_row)
+                        edge_indices.append(edge_index)
+                        # Forward edges use from_tform_to, reverse edges its inverse
+                        directions.append(0 if forward else 1)
 
-                # Handle reverse edges
-                elif edge.id.to_waypoint == curr_waypoint.id and edge.id.from_waypoint not in visited:
-                    from_waypoint = self.waypoints[edge.id.from_waypoint]
-                    current_tform_from = SE3Pose.from_proto(edge.from_tform_to).inverse().to_matrix()
-                    world_tform_from = np.dot(world_tform_current, current_tform_from)
-                    queue.append((from_waypoint, world_tform_from))
+                if child_rows:
+                    current_tform_neighbor = self.edge_transforms[edge_indices, directions]
+                    matrices[child_rows] = np.matmul(matrices[parent_rows], current_tform_neighbor)
+                frontier = [waypoint_ids[row] for row in child_rows]
 
-        return global_transforms
+        return PoseTable(waypoint_ids, matrices)
 
     def compute_anchored_transforms(self):
         """Compute transforms for waypoints using seed frame anchoring."""
-        anchored_transforms = {}
+        return PoseTable(
+            self.anchors.keys(), se3_matrices(anchor.seed_tform_waypoint for anchor in self.anchors.values())
+        )
+
+    def compute_anchored_object_transforms(self):
+        """Compute seed frame transforms for anchored world objects."""
+        return PoseTable(
+            self.anchored_world_objects.keys(),
+            se3_matrices(anchored_wo.seed_tform_object for anchored_wo in self.anchored_world_objects.values()),
+        )
+
+    def build_graph_data(self):
+        """Set the edge index, poses, LOD pyramids, spatial indexes and route planner of the loaded graph.
+
+        Poses and LOD pyramids are memory-mapped from the derived cache unless the graph geometry changed.
+        """
+        timings = self.load_timings
+        with timings.phase("load_cached_graph_data"):
+            cached = self.load_cached_graph_data()
+        if not cached:
+            # Index edges per waypoint and compute global transforms
+            with timings.phase("compute_transforms"):
+                self.adjacency, self.edge_transforms = self.build_edge_index()
+                self.global_transforms = self.compute_global_transforms()
+                self.anchored_transforms = self.compute_anchored_transforms()
+                self.anchored_object_transforms = self.compute_anchored_object_transforms()
+            with timings.phase("build_lod_pyramids"):
+                self.lod_pyramids = self.build_lod_pyramids()
+            with timings.phase("save_cached_graph_data"):
+                self.save_cached_graph_data()
+        with timings.phase("build_spatial_indexes"):
+            self.spatial_indexes = self.build_spatial_indexes()
+        # A new planner also drops the routes memoized for the previous geometry
+        with timings.phase("build_route_planner"):
+            self.route_planner = RoutePlanner(
+                self.global_transforms.ids, self.adjacency, self.edge_transforms, self.global_transforms.positions
+            )
+
+    def load_cached_graph_data(self):
+        """Restore the edge transforms, poses and LOD pyramids from the derived cache.
+
+        The arrays are memory-mapped read-only. Returns False, leaving everything unset, if the cache
+        was not built from the current graph file.
+        """
+        cached = self.derived_cache.load("graph", self.graph_key)
+        if cached is None:
+            return False
+
+        arrays, lod_levels = cached
+        self.adjacency, self.edge_transforms = self.build_edge_index(arrays["edge_transforms"])
+        self.global_transforms = PoseTable(
+            (waypoint.id for waypoint in self.graph.waypoints), arrays["global_transforms"]
+        )
+        self.anchored_transforms = PoseTable(self.anchors.keys(), arrays["anchored_transforms"])
+        self.anchored_object_transforms = PoseTable(
+            self.anchored_world_objects.keys(), arrays["anchored_object_transforms"]
+        )
+        self.lod_pyramids = {
+            use_anchoring: LevelOfDetailPyramid.from_levels(levels) for use_anchoring, levels in lod_levels.items()
+        }
+        return True
+
+    def save_cached_graph_data(self):
+        """Write the edge transforms, poses and LOD pyramids to the derived cache under the current graph key."""
+        arrays = {
+            "edge_transforms": self.edge_transforms,
+            "global_transforms": self.global_transforms.matrices,
+            "anchored_transforms": self.anchored_transforms.matrices,
+            "anchored_object_transforms": self.anchored_object_transforms.matrices,
+        }
+        lod_levels = {use_anchoring: pyramid.levels for use_anchoring, pyramid in self.lod_pyramids.items()}
+        return self.derived_cache.save("graph", self.graph_key, arrays, lod_levels)
 
-        for waypoint_id, anchor in self.anchors.items():
-            seed_tform_waypoint = SE3Pose.from_proto(anchor.seed_tform_waypoint).to_matrix()
-            anchored_transforms[waypoint_id] = seed_tform_waypoint
+    def build_spatial_indexes(self):
+        """Build a spatial index over waypoint positions for each coordinate frame, keyed by use_anchoring."""
+        edge_ids = [(edge.id.from_waypoint, edge.id.to_waypoint) for edge in self.graph.edges]
+        return {
+            True: SpatialIndex(self.anchored_transforms, edge_ids),
+            False: SpatialIndex(self.global_transforms, edge_ids),
+        }
+
+    def build_lod_pyramids(self):
+        """Build the level-of-detail pyramid of the waypoint graph for each coordinate frame, keyed by use_anchoring."""
+        edge_ids = [(edge.id.from_waypoint, edge.id.to_waypoint) for edge in self.graph.edges]
+        return {
+            True: LevelOfDetailPyramid(self.anchored_transforms, edge_ids),
+            False: LevelOfDetailPyramid(self.global_transforms, edge_ids),
+        }
 
-        return anchored_transforms
+    def get_map_data(self, use_anchoring=True, bbox=None, lod=0):
+        """Get the map data in a format suitable for frontend visualization.
+
+        If bbox is given as ``(min_x, min_y, max_x, max_y)``, only the waypoints and anchored objects inside it
+        and the edges crossing it are included. A positive lod returns that level of the simplified graph instead.
+        """
+        return self._collect_map_data(self.iter_map_data(use_anchoring, bbox, lod))
+
+    def get_lod_map_data(self, use_anchoring, lod, bbox=None):
+        """Get one level of the simplified graph in the same layout as get_map_data.
+
+        Each waypoint is a representative node listing the waypoints it stands for in ``members`` and the union
+        of their objects; each edge lists the waypoints collapsed into it in ``members``.
+        """
+        return self._collect_map_data(self._iter_lod_map_data(use_anchoring, lod, bbox))
+
+    @staticmethod
+    def _collect_map_data(records):
+        """Assemble the ``(kind, record)`` pairs of iter_map_data into the map data dict."""
+        map_data = {"waypoints": [], "edges": [], "objects": []}
+        header = {}
+        for kind, record in records:
+            if kind == "map":
+                header = record
+            else:
+                map_data[kind + "s"].append(record)
+
+        map_data.update(header)
+        return map_data
+
+    def iter_map_data(self, use_anchoring=True, bbox=None, lod=0):
+        """Generate the map data of get_map_data one item at a time, as ``(kind, record)`` pairs.
+
+        The first pair is ``("map", fields)`` with the top-level fields (``use_anchoring``, ``bbox``, the LOD
+        fields). It is followed by a ``"waypoint"``, ``"edge"`` or ``"object"`` pair for each item, in that order.
+        """
+        if lod > 0:
+            yield from self._iter_lod_map_data(use_anchoring, lod, bbox)
+            return
 
-    def get_map_data(self, use_anchoring=True):
-        """Get the map data in a format suitable for frontend visualization."""
         transforms = self.anchored_transforms if use_anchoring else self.global_transforms
+        positions = transforms.positions.tolist()
 
-        waypoints_data = []
-        edges_data = []
-        objects_data = []
+        visible_rows = None
+        visible_edges = None
+        if bbox is not None:
+            spatial_index = self.spatial_indexes[use_anchoring]
+            visible_rows = set(spatial_index.within_bbox(*bbox).tolist())
+            visible_edges = spatial_index.edges_in_bbox(*bbox)
+
+        header = {"use_anchoring": use_anchoring}
+        if bbox is not None:
+            header["bbox"] = list(bbox)
+        yield "map", header
 
         for waypoint in self.graph.waypoints:
-            if waypoint.id not in transforms:
+            row = transforms.index.get(waypoint.id)
+            if row is None or (visible_rows is not None and row not in visible_rows):
                 continue
 
-            world_transform = transforms[waypoint.id]
-            position = world_transform[:3, 3]
-
             waypoint_data = {
                 "id": waypoint.id,
-                "position": [float(position[0]), float(position[1]), float(position[2])],
+                "position": positions[row],
                 "label": waypoint.annotations.name or "",
                 "snapshot_id": waypoint.snapshot_id,
                 "has_images": waypoint.snapshot_id in self.snapshots,
             }
 
-            if waypoint.id in self.waypoint_annotations:
-                objects = []
-                ann = self.waypoint_annotations[waypoint.id]
-                if "views" in ann:
-                    for view_type, view_data in ann["views"].items():
-                        visible = view_data.get("visible_objects", [])
-                        for obj in visible:
-                            clean_obj = self._clean_text(obj)
-                            if clean_obj not in objects:
-                                objects.append(clean_obj)
-
-                waypoint_data["objects"] = objects
-
-            waypoints_data.append(waypoint_data)
-
-        for edge in self.graph.edges:
-            if edge.id.from_waypoint in transforms and edge.id.to_waypoint in transforms:
-                from_transform = transforms[edge.id.from_waypoint]
-                to_transform = transforms[edge.id.to_waypoint]
-                from_pos = from_transform[:3, 3]
-                to_pos = to_transform[:3, 3]
-
-                edge_data = {
+            if waypoint.id in self.waypoint_objects:
+                waypoint_data["objects"] = list(self.waypoint_objects[waypoint.id])
+
+            yield "waypoint", waypoint_data
+
+        for edge_index, edge in enumerate(self.graph.edges):
+            if visible_edges is not None and not visible_edges[edge_index]:
+                continue
+
+            from_row = transforms.index.get(edge.id.from_waypoint)
+            to_row = transforms.index.get(edge.id.to_waypoint)
+            if from_row is not None and to_row is not None:
+                yield "edge", {
                     "id": f"{edge.id.from_waypoint}_{edge.id.to_waypoint}",
                     "from_id": edge.id.from_waypoint,
                     "to_id": edge.id.to_waypoint,
-                    "from_position": [float(from_pos[0]), float(from_pos[1]), float(from_pos[2])],
-                    "to_position": [float(to_pos[0]), float(to_pos[1]), float(to_pos[2])],
+                    "from_position": positions[from_row],
+                    "to_position": positions[to_row],
                 }
 
-                edges_data.append(edge_data)
-
         # Process anchored world objects if in anchoring mode
         if use_anchoring:
-            for obj_id, anchored_obj in self.anchored_world_objects.items():
-                seed_tform_obj = SE3Pose.from_proto(anchored_obj.seed_tform_object).to_matrix()
-                position = seed_tform_obj[:3, 3]
-
-                object_data = {
-                    "id": obj_id,
-                    "position": [float(position[0]), float(position[1]), float(position[2])],
-                    "type": "anchor",
+            for object_data in self._anchored_objects_data(bbox):
+                yield "object", object_data
+
+    def _iter_lod_map_data(self, use_anchoring, lod, bbox=None):
+        """Generate one level of the simplified graph as ``(kind, record)`` pairs, like iter_map_data."""
+        transforms = self.anchored_transforms if use_anchoring else self.global_transforms
+        pyramid = self.lod_pyramids[use_anchoring]
+        lod = min(lod, len(pyramid))
+        if lod == 0:
+            yield from self.iter_map_data(use_anchoring, bbox)
+            return
+
+        level = pyramid.level(lod)
+        ids = transforms.ids
+        positions = transforms.positions.tolist()
+
+        node_rows = sorted(level.nodes)
+        edge_rows = list(level.edges)
+        if bbox is not None:
+            min_x, min_y, max_x, max_y = bbox
+            node_rows = [
+                row for row in node_rows if min_x <= positions[row][0] <= max_x and min_y <= positions[row][1] <= max_y
+            ]
+            edge_array = np.array(edge_rows, dtype=np.int64).reshape(-1, 2)
+            xy = transforms.positions[:, :2]
+            visible = segments_in_bbox(xy[edge_array[:, 0]], xy[edge_array[:, 1]], bbox)
+            edge_rows = [edge for edge, is_visible in zip(edge_rows, visible) if is_visible]
+
+        header = {
+            "use_anchoring": use_anchoring,
+            "lod": lod,
+            "lod_levels": len(pyramid),
+            "resolution": level.resolution,
+        }
+        if bbox is not None:
+            header["bbox"] = list(bbox)
+        yield "map", header
+
+        for row in node_rows:
+            waypoint = self.waypoints.get(ids[row])
+            members = [ids[member] for member in level.nodes[row]]
+            objects = {}
+            for member in members:
+                for obj in self.waypoint_objects.get(member, []):
+                    objects.setdefault(obj, None)
+
+            yield "waypoint", {
+                "id": ids[row],
+                "position": positions[row],
+                "label": waypoint.annotations.name if waypoint is not None else "",
+                "snapshot_id": waypoint.snapshot_id if waypoint is not None else "",
+                "has_images": waypoint is not None and waypoint.snapshot_id in self.snapshots,
+                "members": members,
+                "objects": list(objects),
+            }
+
+        for a, b in edge_rows:
+            yield "edge", {
+                "id": f"{ids[a]}_{ids[b]}",
+                "from_id": ids[a],
+                "to_id": ids[b],
+                "from_position": positions[a],
+                "to_position": positions[b],
+                "members": [ids[member] for member in level.edges[(a, b)]],
+            }
+
+        if use_anchoring:
+            for object_data in self._anchored_objects_data(bbox):
+                yield "object", object_data
+
+    def _anchored_objects_data(self, bbox=None):
+        """Serialize the anchored world objects, optionally only those inside bbox."""
+        objects_data = []
+
+        object_positions = self.anchored_object_transforms.positions.tolist()
+        for obj_id, position in zip(self.anchored_object_transforms.ids, object_positions):
+            if bbox is not None and not (bbox[0] <= position[0] <= bbox[2] and bbox[1] <= position[1] <= bbox[3]):
+                continue
+
+            object_data = {
+                "id": obj_id,
+                "position": position,
+                "type": "anchor",
+            }
+
+            objects_data.append(object_data)
+
+        return objects_data
+
+    def find_nearest_waypoints(self, x, y, k=1, use_anchoring=False):
+        """Get the k waypoints closest to a point in the XY plane, nearest first."""
+        rows, distances = self.spatial_indexes[use_anchoring].nearest(x, y, k)
+        return self._spatial_results(rows, distances, use_anchoring)
+
+    def find_waypoints_in_radius(self, x, y, radius, use_anchoring=False):
+        """Get the waypoints within radius of a point in the XY plane, nearest first."""
+        rows, distances = self.spatial_indexes[use_anchoring].within_radius(x, y, radius)
+        return self._spatial_results(rows, distances, use_anchoring)
+
+    def _spatial_results(self, rows, distances, use_anchoring):
+        """Serialize spatial query hits as waypoint summaries with their distance."""
+        transforms = self.anchored_transforms if use_anchoring else self.global_transforms
+        positions = transforms.positions[rows].tolist()
+
+        results = []
+        for row, position, distance in zip(rows.tolist(), positions, distances.tolist()):
+            waypoint = self.waypoints.get(transforms.ids[row])
+            results.append(
+                {
+                    "id": transforms.ids[row],
+                    "label": waypoint.annotations.name if waypoint is not None else "",
+                    "position": position,
+                    "distance": distance,
                 }
+            )
+
+        return results
+
+    def get_waypoint_details(self, waypoint_id, use_anchoring=False):
+        """Get the label, snapshot, position and objects of a waypoint, or None if it doesn't exist."""
+        waypoint = self.waypoints.get(waypoint_id)
+        if waypoint is None:
+            return None
 
-                objects_data.append(object_data)
+        # Get position in the selected coordinate frame
+        transforms = self.anchored_transforms if use_anchoring else self.global_transforms
+        row = transforms.index.get(waypoint_id)
+        position = transforms.positions[row].tolist() if row is not None else None
 
         return {
-            "waypoints": waypoints_data,
-            "edges": edges_data,
-            "objects": objects_data,
-            "use_anchoring": use_anchoring,
+            "id": waypoint_id,
+            "label": waypoint.annotations.name or "",
+            "snapshot_id": waypoint.snapshot_id,
+            "has_images": waypoint.snapshot_id in self.snapshots,
+            "position": position,
+            "objects": list(self.waypoint_objects.get(waypoint_id, [])),
+        }
+
+    def waypoint_neighbors(self, waypoint_id, depth=1):
+        """Return the ids of the waypoints within depth edges of a waypoint, nearest first, excluding itself."""
+        seen = {waypoint_id}
+        frontier = [waypoint_id]
+        neighbors = []
+        for _ in range(depth):
+            next_frontier = []
+            for current_id in frontier:
+                for neighbor_id, _, _ in self.adjacency.get(current_id, ()):
+                    if neighbor_id not in seen:
+                        seen.add(neighbor_id)
+                        neighbors.append(neighbor_id)
+                        next_frontier.append(neighbor_id)
+            frontier = next_frontier
+        return neighbors
+
+    def plan_route(self, source_id, target_id, use_anchoring=False):
+        """Get the shortest route along the graph edges between two waypoints.
+
+        Returns None if either waypoint doesn't exist or no route connects them.
+        """
+        if source_id not in self.waypoints or target_id not in self.waypoints:
+            return None
+        route = self.route_planner.shortest_path(source_id, target_id)
+        return self._route_data(source_id, route, use_anchoring)
+
+    def plan_route_to_objects(self, source_id, names, mode="or", use_anchoring=False):
+        """Get the shortest route from a waypoint to the nearest one that sees all (``mode="and"``) or any objects.
+
+        Returns None if the waypoint doesn't exist or no waypoint seeing the objects can be reached.
+        """
+        if source_id not in self.waypoints:
+            return None
+        resolved = [self.object_index.resolve(name) for name in names]
+        if mode == "and" and None in resolved:
+            return None
+        resolved = tuple(sorted({name for name in resolved if name is not None}))
+        if not resolved:
+            return None
+        route = self.route_planner.nearest(source_id, (mode, resolved), lambda: self.object_index.query(resolved, mode))
+        data = self._route_data(source_id, route, use_anchoring)
+        if data is not None:
+            data["objects"] = list(self.waypoint_objects.get(data["to"], []))
+        return data
+
+    def _route_data(self, source_id, route, use_anchoring):
+        """Serialize a ``(distance, waypoint_ids)`` route with waypoint positions in the selected frame."""
+        if route is None:
+            return None
+        distance, waypoint_ids = route
+        transforms = self.anchored_transforms if use_anchoring else self.global_transforms
+        positions = transforms.positions
+        return {
+            "from": source_id,
+            "to": waypoint_ids[-1],
+            "distance": distance,
+            "waypoints": waypoint_ids,
+            "positions": [
+                positions[transforms.index[w]].tolist() if w in transforms.index else None for w in waypoint_ids
+            ],
         }
 
-    def get_waypoint_images(self, waypoint_id):
-        """Get the images for a specific waypoint."""
-        if waypoint_id not in self.waypoints or not self.waypoints[waypoint_id].snapshot_id:
+    def get_map_payload(self, use_anchoring=True, lod=0, fmt="json"):
+        """Get the serialized map data, plus its gzip encoding and ETag, building it on first use.
+
+        ``fmt`` is ``"json"``, ``"ndjson"`` (see ``_stream_map``) or ``"binary"`` (see ``map_codec``).
+        """
+        lod = min(lod, len(self.lod_pyramids[use_anchoring]))
+        key = (use_anchoring, lod, fmt)
+        with self._map_payload_lock:
+            payload = self._map_payloads.get(key)
+            generation = self._map_payload_generation
+        if payload is not None:
+            METRICS.inc("spot_map_cache_requests_total", cache="map_payload", result="hit")
+            return payload
+
+        METRICS.inc("spot_map_cache_requests_total", cache="map_payload", result="miss")
+        if fmt == "binary":
+            with METRICS.timer("spot_map_phase_duration_seconds", phase="map_encode_binary"):
+                body = map_codec.encode_map(self.iter_map_data(use_anchoring, lod=lod))
+            waypoints_count = map_codec.read_header(body)["counts"]["waypoints"]
+        elif fmt == "ndjson":
+            with METRICS.timer("spot_map_phase_duration_seconds", phase="map_serialize"):
+                body = b"".join(_stream_map(self.iter_map_data(use_anchoring, lod=lod)))
+            # The last line is {"end": counts}
+            waypoints_count = json.loads(body[body.rindex(b"\n", 0, len(body) - 1) + 1 :])["end"]["waypoints"]
+        else:
+            with METRICS.timer("spot_map_phase_duration_seconds", phase="map_build"):
+                data = self.get_map_data(use_anchoring, lod=lod)
+            with METRICS.timer("spot_map_phase_duration_seconds", phase="map_serialize"):
+                body = json.dumps(data, separators=(",", ":")).encode("utf-8")
+            waypoints_count = len(data["waypoints"])
+        with METRICS.timer("spot_map_phase_duration_seconds", phase="map_compress"):
+            gzip_body = gzip.compress(body, compresslevel=6, mtime=0)
+        payload = MapPayload(
+            body=body,
+            gzip_body=gzip_body,
+            etag=hashlib.sha1(body).hexdigest(),
+            waypoints_count=waypoints_count,
+        )
+
+        with self._map_payload_lock:
+            # Don't cache a payload built from data that changed while it was being serialized
+            if generation == self._map_payload_generation:
+                self._map_payloads[key] = payload
+        return payload
+
+    def invalidate_map_payloads(self):
+        """Drop the cached /api/map payloads after the graph changed."""
+        with self._map_payload_lock:
+            self._map_payload_generation += 1
+            self._map_payloads.clear()
+
+    def get_waypoint_images(self, waypoint_id, size="full"):
+        """Get the base64-encoded front camera images for a specific waypoint."""
+        if waypoint_id not in self.waypoints or self.waypoints[waypoint_id].snapshot_id not in self.snapshots:
+            return None
+
+        images = {}
+
+        # Process only front camera images
+        for camera in self.FRONT_CAMERA_SOURCES:
+            jpeg = self.get_waypoint_image(waypoint_id, camera, size)
+            if jpeg is not None:
+                images[camera] = base64.b64encode(jpeg).decode("utf-8")
+
+        return images
+
+    def _image_key(self, waypoint_id, camera, size):
+        """Resolve a waypoint camera image to ``(snapshot_id, source, rotation, version)``, or None if it doesn't exist.
+
+        ``version`` identifies the snapshot file the image is rendered from.
+        """
+        if waypoint_id not in self.waypoints or camera not in self.FRONT_CAMERA_SOURCES or size not in self.IMAGE_SIZES:
             return None
 
         snapshot_id = self.waypoints[waypoint_id].snapshot_id
         if snapshot_id not in self.snapshots:
             return None
 
-        snapshot = self.snapshots[snapshot_id]
-        images = {}
+        source = self.FRONT_CAMERA_SOURCES[camera]
+        return snapshot_id, source, self.ROTATION_ANGLE.get(source, 0), self.snapshots.version(snapshot_id)
+
+    def get_waypoint_image_etag(self, waypoint_id, camera, size="full"):
+        """Get the ETag of a waypoint camera image without loading it.
 
+        The image only changes when its snapshot file does, so the ETag is derived from the image cache key.
+        """
+        key = self._image_key(waypoint_id, camera, size)
+        if key is None:
+            return None
+
+        snapshot_id, source, rotation, version = key
+        return hashlib.sha1(f"{snapshot_id}/{source}/{rotation}/{size}/{version}".encode("utf-8")).hexdigest()
+
+    def get_waypoint_image(self, waypoint_id, camera, size="full"):
+        """Get one front camera image of a waypoint as JPEG bytes, rendering and caching it on a miss."""
+        key = self._image_key(waypoint_id, camera, size)
+        if key is None:
+            return None
+
+        snapshot_id, source, rotation, version = key
+        jpeg = self.image_cache.get(snapshot_id, source, rotation, size, version)
+        if jpeg is not None:
+            METRICS.inc("spot_map_cache_requests_total", cache="image", result="hit")
+            return jpeg
+
+        with self._prefetch_lock:
+            prefetch = self._prefetching.get((snapshot_id, source, version))
+        # Wait for a prefetch that is already rendering this image, or take over one that hasn't started
+        if prefetch is not None and not prefetch.cancel():
+            wait([prefetch])
+            jpeg = self.image_cache.get(snapshot_id, source, rotation, size, version)
+        if jpeg is not None:
+            METRICS.inc("spot_map_cache_requests_total", cache="image", result="prefetch")
+            return jpeg
+
+        METRICS.inc("spot_map_cache_requests_total", cache="image", result="miss")
+        return self.render_snapshot_images(snapshot_id, source, [size]).get(size)
+
+    def render_snapshot_images(self, snapshot_id, source, sizes):
+        """Decode, rotate and JPEG-encode one snapshot image in the given sizes and store them in the image cache.
+
+        Returns a dict mapping each size to its JPEG bytes; it is empty if the snapshot has no image for source.
+        """
+        snapshot = self.snapshots.get(snapshot_id)
+        if snapshot is None:
+            return {}
+
+        rendered = {}
         for image in snapshot.images:
-            # Process only front camera images
-            if image.source.name == self.FRONT_CAMERA_SOURCES["left"]:
-                opencv_image, _ = self.convert_image_from_snapshot(image.shot.image, image.source.name)
-                if opencv_image is not None:
-                    images["left"] = self._encode_image_to_base64(opencv_image)
+            if image.source.name != source:
+                continue
 
-            elif image.source.name == self.FRONT_CAMERA_SOURCES["right"]:
-                opencv_image, _ = self.convert_image_from_snapshot(image.shot.image, image.source.name)
-                if opencv_image is not None:
-                    images["right"] = self._encode_image_to_base64(opencv_image)
+            max_sides = [self.IMAGE_SIZES[size] for size in sizes]
+            if self.image_workers > 0:
+                future = self._image_pool_executor().submit(
+                    self.encode_snapshot_image, image.shot.image, source, max_sides
+                )
+                jpegs, durations = future.result()
+            else:
+                jpegs, durations = self.encode_snapshot_image(image.shot.image, source, max_sides)
+            # Recorded here since the encoding may have run in a worker process with its own metrics
+            for phase, seconds in durations.items():
+                METRICS.observe("spot_map_phase_duration_seconds", seconds, phase=phase)
+            if jpegs is None:
+                break
+
+            rotation = self.ROTATION_ANGLE.get(source, 0)
+            version = self.snapshots.version(snapshot_id)
+            for size, jpeg in zip(sizes, jpegs):
+                if jpeg is not None:
+                    self.image_cache.put(snapshot_id, source, rotation, size, jpeg, version)
+                    rendered[size] = jpeg
+            break
+
+        return rendered
+
+    def _image_pool_executor(self):
+        """Return this process's image worker pool, creating it on first use."""
+        with self._image_pool_lock:
+            if self._image_pool is None or self._image_pool_pid != os.getpid():
+                self._image_pool = ProcessPoolExecutor(
+                    max_workers=self.image_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+                self._image_pool_pid = os.getpid()
+            return self._image_pool
+
+    @classmethod
+    def encode_snapshot_image(cls, image_data, image_source, max_sides):
+        """Decode and rotate a snapshot image once, then JPEG-encode it with each longest-side limit in max_sides.
+
+        Returns a list of JPEG bytes (None where encoding failed), or None if the image can't be decoded, and the
+        seconds spent in each phase by name. Only class attributes are used, so this can run in an image worker
+        process.
+        """
+        durations = {}
+        start = time.perf_counter()
+        # Full size needs a full decode; thumbnails only need enough resolution for the largest one
+        decode_max_side = None if None in max_sides else max(max_sides)
+        opencv_image, _ = cls.convert_image_from_snapshot(
+            image_data, image_source, auto_rotate=False, max_side=decode_max_side
+        )
+        durations["image_decode"] = time.perf_counter() - start
+        if opencv_image is None:
+            return None, durations
+
+        start = time.perf_counter()
+        opencv_image = cls._rotate_image(opencv_image, cls.ROTATION_ANGLE.get(image_source, 0))
+        durations["image_rotate"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        jpegs = [cls._encode_image_to_jpeg(cls._resize_image(opencv_image, max_side)) for max_side in max_sides]
+        durations["image_encode"] = time.perf_counter() - start
+        return jpegs, durations
+
+    def _missing_image_sizes(self, snapshot_id, source, sizes):
+        """Return the sizes of a snapshot image that are not in the image cache yet."""
+        rotation = self.ROTATION_ANGLE.get(source, 0)
+        version = self.snapshots.version(snapshot_id)
+        return [
+            size
+            for size in sizes
+            if not os.path.exists(self.image_cache.path(snapshot_id, source, rotation, size, version))
+        ]
 
-        return images
+    def warm_image_cache(self, sizes=None):
+        """Render every missing front camera image of every waypoint into the image cache."""
+        sizes = list(sizes or self.IMAGE_SIZES)
+        rendered_count = 0
+
+        for waypoint in self.graph.waypoints:
+            if waypoint.snapshot_id not in self.snapshots:
+                continue
+
+            for source in self.FRONT_CAMERA_SOURCES.values():
+                missing = self._missing_image_sizes(waypoint.snapshot_id, source, sizes)
+                if missing:
+                    rendered_count += len(self.render_snapshot_images(waypoint.snapshot_id, source, missing))
+
+        return rendered_count
+
+    # Prefetches beyond this many queued or running ones are dropped rather than queued behind stale ones
+    MAX_PENDING_PREFETCHES = 64
+
+    def prefetch_images(self, waypoint_ids, sizes=None):
+        """Render the missing front camera images of waypoints into the image cache in the background.
+
+        Images that are already cached or being prefetched are skipped. Returns the number of snapshot images
+        queued.
+        """
+        if self.prefetch_workers == 0:
+            return 0
+
+        sizes = list(sizes or self.IMAGE_SIZES)
+        queued = 0
+        for waypoint_id in waypoint_ids:
+            waypoint = self.waypoints.get(waypoint_id)
+            if waypoint is None or waypoint.snapshot_id not in self.snapshots:
+                continue
+
+            version = self.snapshots.version(waypoint.snapshot_id)
+            for source in self.FRONT_CAMERA_SOURCES.values():
+                task = (waypoint.snapshot_id, source, version)
+                with self._prefetch_lock:
+                    if task in self._prefetching or len(self._prefetching) >= self.MAX_PENDING_PREFETCHES:
+                        continue
+                missing = self._missing_image_sizes(waypoint.snapshot_id, source, sizes)
+                if not missing:
+                    continue
+
+                with self._prefetch_lock:
+                    if task in self._prefetching:
+                        continue
+                    future = self._prefetch_executor().submit(self._prefetch_image, task, missing)
+                    self._prefetching[task] = future
+                # Outside the lock, since the callback runs right away if the prefetch already finished
+                future.add_done_callback(lambda _, task=task: self._prefetch_done(task))
+                queued += 1
+
+        return queued
+
+    def prefetch_neighbor_images(self, waypoint_id):
+        """Prefetch the images of the waypoints within ``prefetch_depth`` edges of a waypoint."""
+        return self.prefetch_images(self.waypoint_neighbors(waypoint_id, self.prefetch_depth))
+
+    def _prefetch_image(self, task, sizes):
+        snapshot_id, source, _ = task
+        try:
+            self.render_snapshot_images(snapshot_id, source, sizes)
+        except Exception as e:
+            logger.warning("Could not prefetch %s image of snapshot %s: %s", source, snapshot_id, e)
+
+    def _prefetch_done(self, task):
+        with self._prefetch_lock:
+            self._prefetching.pop(task, None)
+
+    def _prefetch_executor(self):
+        """Return this process's prefetch thread pool, creating it on first use. Call with _prefetch_lock held."""
+        if self._prefetch_pool is None or self._prefetch_pool_pid != os.getpid():
+            self._prefetch_pool = ThreadPoolExecutor(
+                max_workers=self.prefetch_workers, thread_name_prefix="image-prefetch"
+            )
+            self._prefetch_pool_pid = os.getpid()
+        return self._prefetch_pool
+
+    # cv2.imdecode flags that decode a JPEG at 1/2, 1/4 or 1/8 resolution, by scale factor
+    REDUCED_DECODE_FLAGS = {
+        "grayscale": {
+            2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+            4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+            8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+        },
+        "color": {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8},
+    }
+
+    @classmethod
+    def convert_image_from_snapshot(cls, image_data, image_source, auto_rotate=True, max_side=None):
+        """Convert an image from a GraphNav waypoint snapshot to an OpenCV image.
 
-    def convert_image_from_snapshot(self, image_data, image_source, auto_rotate=True):
-        """Convert an image from a GraphNav waypoint snapshot to an OpenCV image."""
+        If max_side is given, JPEG images are decoded at the smallest power-of-two reduced resolution whose
+        longest side is still at least max_side pixels.
+        """
         # Determine pixel format and number of channels
         num_channels = 1  # Default to 1 channel
         dtype = np.uint8  # Default to 8-bit unsigned integer
@@ -317,19 +1233,66 @@ class SpotMapAPI:
             except ValueError:
                 img = cv2.imdecode(img, -1)
         else:
-            img = cv2.imdecode(img, -1)
+            img = cv2.imdecode(img, cls._decode_flag(image_data, max_side))
 
         if auto_rotate:
             try:
-                rotation_angle = self.ROTATION_ANGLE.get(image_source, 0)
-                img = ndimage.rotate(img, rotation_angle)
+                rotation_angle = cls.ROTATION_ANGLE.get(image_source, 0)
+                img = cls._rotate_image(img, rotation_angle)
             except KeyError:
-                print(f"Warning: No rotation defined for source {image_source}")
+                logger.warning("No rotation defined for source %s", image_source)
 
         return img, extension
 
-    def _encode_image_to_base64(self, cv_image):
-        """Convert OpenCV image to base64 string with consistent compression."""
+    @classmethod
+    def _decode_flag(cls, image_data, max_side):
+        """Pick the cv2.imdecode flag, using reduced-resolution JPEG decoding when max_side allows it."""
+        longest_side = max(image_data.rows, image_data.cols)
+        if max_side is None or image_data.format != image_pb2.Image.FORMAT_JPEG or longest_side == 0:
+            return cv2.IMREAD_UNCHANGED
+
+        if image_data.pixel_format == image_pb2.Image.PIXEL_FORMAT_GREYSCALE_U8:
+            flags = cls.REDUCED_DECODE_FLAGS["grayscale"]
+        elif image_data.pixel_format == image_pb2.Image.PIXEL_FORMAT_RGB_U8:
+            flags = cls.REDUCED_DECODE_FLAGS["color"]
+        else:
+            return cv2.IMREAD_UNCHANGED
+
+        for factor in sorted(flags, reverse=True):
+            if longest_side // factor >= max_side:
+                return flags[factor]
+
+        return cv2.IMREAD_UNCHANGED
+
+    @staticmethod
+    def _rotate_image(img, angle):
+        """Rotate an image counter-clockwise by angle degrees, expanding the canvas to fit.
+
+        Multiples of 90 degrees are exact pixel transposes; other angles fall back to spline interpolation.
+        """
+        quarter_turns = int(angle // 90) % 4 if angle % 90 == 0 else None
+        if quarter_turns == 0:
+            return img
+        if quarter_turns is not None:
+            rotate_code = {1: cv2.ROTATE_90_COUNTERCLOCKWISE, 2: cv2.ROTATE_180, 3: cv2.ROTATE_90_CLOCKWISE}
+            return cv2.rotate(img, rotate_code[quarter_turns])
+
+        return ndimage.rotate(img, angle)
+
+    @staticmethod
+    def _resize_image(cv_image, max_side):
+        """Downscale an image so its longest side is at most max_side pixels."""
+        height, width = cv_image.shape[:2]
+        if max_side is None or max(height, width) <= max_side:
+            return cv_image
+
+        scale = max_side / float(max(height, width))
+        new_size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        return cv2.resize(cv_image, new_size, interpolation=cv2.INTER_AREA)
+
+    @staticmethod
+    def _encode_image_to_jpeg(cv_image):
+        """Convert OpenCV image to JPEG bytes with consistent compression."""
         try:
             if len(cv_image.shape) == 2 or (len(cv_image.shape) == 3 and cv_image.shape[2] == 1):
                 if len(cv_image.shape) == 3:
@@ -340,12 +1303,11 @@ class SpotMapAPI:
 
             buffered = BytesIO()
             image.save(buffered, format="JPEG", quality=85)
-            encoded = base64.b64encode(buffered.getvalue()).decode("utf-8")
 
-            return encoded
+            return buffered.getvalue()
 
-        except Exception as e:
-            print(f"Error in _encode_image_to_base64: {str(e)}")
+        except Exception:
+            logger.exception("Error in _encode_image_to_jpeg")
             return None
 
     def update_waypoint_label(self, waypoint_id, new_label):
@@ -353,42 +1315,207 @@ class SpotMapAPI:
         if waypoint_id not in self.waypoints:
             return False, "Waypoint not found"
 
-        try:
-            # Update the waypoint label
-            self.waypoints[waypoint_id].annotations.name = new_label
+        success, message = self.update_waypoint_labels({waypoint_id: new_label})
+        return success, "Label updated successfully" if success else message
+
+    def update_waypoint_labels(self, labels):
+        """Update the labels of several waypoints at once from a ``{waypoint_id: label}`` dict.
 
-            # Save the updated graph
-            with open(self.graph_file_path, "wb") as f:
-                f.write(self.graph.SerializeToString())
+        The edits are journaled before they are applied and written to the graph file in the background.
+        Either all labels are updated or, if any waypoint is unknown, none are.
+        """
+        missing = [waypoint_id for waypoint_id in labels if waypoint_id not in self.waypoints]
+        if missing:
+            return False, f"Waypoints not found: {', '.join(missing)}"
+        # Invalid labels must not reach the journal, which every later compaction and restart replays
+        if not all(isinstance(label, str) for label in labels.values()):
+            return False, "Labels must be strings"
+        if self.label_journal.read_only:
+            return False, "Labels can't be saved: the map folder is read-only"
+
+        try:
+            updates = list(labels.items())
+            with self.label_journal.lock:
+                self.label_journal.append(updates)
+                self._apply_labels(self.waypoints, updates)
+            self.invalidate_map_payloads()
 
-            return True, "Label updated successfully"
+            return True, f"Updated {len(updates)} labels"
         except Exception as e:
-            return False, f"Error updating label: {str(e)}"
+            return False, f"Error updating labels: {str(e)}"
 
 
 api_instance = None
 
+# Seconds browsers and proxies may reuse a waypoint image requested with its current version (``v``, its ETag)
+# before revalidating it. Unversioned image URLs are revalidated on every use, so a changed snapshot shows up.
+IMAGE_MAX_AGE = 86400
+
+# Most waypoints /api/waypoints/details returns per request
+MAX_BATCH_WAYPOINTS = 100
+
+# Map records per chunk of a streamed /api/map response
+MAP_STREAM_BATCH = 500
+
+# /api/map formats whose full-map payloads are built when the map is loaded: JSON for API clients, and NDJSON,
+# which the frontend draws as it downloads
+PREBUILT_MAP_FORMATS = ("json", "ndjson")
+
+
+def _parse_bbox(value):
+    """Parse a ``min_x,min_y,max_x,max_y`` viewport string."""
+    try:
+        bbox = tuple(float(v) for v in value.split(","))
+    except ValueError:
+        raise ValueError(f"Invalid bbox: {value}")
+
+    if len(bbox) != 4 or not np.all(np.isfinite(bbox)) or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+        raise ValueError(f"Invalid bbox: {value}")
+    return bbox
+
+
+def _stream_map(records):
+    """Serialize ``(kind, record)`` map records as NDJSON, one ``{kind: record}`` object per line.
+
+    Lines are yielded in batches of MAP_STREAM_BATCH. The last line is ``{"end": counts}``, so clients can tell a
+    complete stream from a truncated one.
+    """
+    counts = {"waypoints": 0, "edges": 0, "objects": 0}
+    lines = []
+    for kind, record in records:
+        lines.append(json.dumps({kind: record}, separators=(",", ":")))
+        if kind != "map":
+            counts[kind + "s"] += 1
+        if len(lines) >= MAP_STREAM_BATCH:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+
+    lines.append(json.dumps({"end": counts}, separators=(",", ":")))
+    yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _gzip_stream(chunks):
+    """Gzip a stream of byte chunks, flushing after each so the client can decode it as it arrives."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+MAP_FORMATS = {"json": "application/json", "ndjson": "application/x-ndjson", "binary": map_codec.MIME_TYPE}
+
+
+def _map_format():
+    """The /api/map format the client asked for, with ``format=`` or its Accept header. Defaults to JSON."""
+    if "format" in request.args:
+        if request.args["format"] not in MAP_FORMATS:
+            raise ValueError(f"Unknown format: {request.args['format']}")
+        return request.args["format"]
+    best = request.accept_mimetypes.best_match(list(MAP_FORMATS.values()))
+    return next((fmt for fmt, mimetype in MAP_FORMATS.items() if mimetype == best), "json")
+
+
+def _float_arg(name, default=None):
+    """Read a finite float query parameter, raising ValueError if it is missing, malformed, NaN or infinite."""
+    value = request.args.get(name, default)
+    if value is None:
+        raise ValueError(f"Missing parameter: {name}")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name}: {value}")
+
+    if not np.isfinite(number):
+        raise ValueError(f"Invalid {name}: {value}")
+    return number
+
+
+def _int_arg(name):
+    """Read a required integer query parameter, raising ValueError if it is missing or malformed."""
+    value = request.args.get(name)
+    if value is None:
+        raise ValueError(f"Missing parameter: {name}")
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {value}")
+
 
 @app.route("/api/map", methods=["GET"])
 def get_map():
     """Get the map data with enhanced error handling."""
     try:
-        print(f"Map path: {api_instance.map_path}")
-        print(f"Number of waypoints: {len(api_instance.waypoints)}")
-        print(f"Number of edges: {len(api_instance.graph.edges)}")
-
         use_anchoring = request.args.get("use_anchoring", "false").lower() == "true"
-        print(f"Fetching map data with use_anchoring={use_anchoring}")
-        data = api_instance.get_map_data(use_anchoring)
-        print(f"Successfully retrieved map with {len(data['waypoints'])} waypoints")
+        logger.debug("Fetching map data from %s with use_anchoring=%s", api_instance.map_path, use_anchoring)
 
-        return jsonify(data)
+        try:
+            if "lod" in request.args:
+                lod = _int_arg("lod")
+            elif "zoom" in request.args:
+                zoom = _float_arg("zoom")
+                if zoom <= 0:
+                    raise ValueError(f"Invalid zoom: {request.args['zoom']}")
+                lod = api_instance.lod_pyramids[use_anchoring].level_for_zoom(zoom)
+            else:
+                lod = 0
+            bbox = _parse_bbox(request.args["bbox"]) if "bbox" in request.args else None
+            fmt = _map_format()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if lod < 0:
+            return jsonify({"error": "lod must be non-negative"}), 400
+
+        if fmt == "ndjson" and bbox is not None:
+            # Serialize the items as they are generated rather than holding the whole map in memory
+            chunks = _stream_map(api_instance.iter_map_data(use_anchoring, bbox=bbox, lod=lod))
+            if "gzip" in request.accept_encodings:
+                response = app.response_class(_gzip_stream(chunks), mimetype="application/x-ndjson")
+                response.headers["Content-Encoding"] = "gzip"
+            else:
+                response = app.response_class(chunks, mimetype="application/x-ndjson")
+            response.headers["Cache-Control"] = "no-cache"
+            response.vary.add("Accept")
+            response.vary.add("Accept-Encoding")
+            return response
+
+        if bbox is not None:
+            if fmt == "binary":
+                body = map_codec.encode_map(api_instance.iter_map_data(use_anchoring, bbox=bbox, lod=lod))
+                response = app.response_class(body, mimetype=map_codec.MIME_TYPE)
+                response.vary.add("Accept")
+                return response
+            data = api_instance.get_map_data(use_anchoring, bbox=bbox, lod=lod)
+            logger.debug("Retrieved %d waypoints inside %s", len(data["waypoints"]), bbox)
+            return jsonify(data)
+
+        # Full maps are served from the cached payloads in every format; clients still parse NDJSON as it arrives
+        payload = api_instance.get_map_payload(use_anchoring, lod, fmt)
+        logger.debug("Retrieved map with %d waypoints", payload.waypoints_count)
+
+        # Each encoding is a different representation, so each gets its own strong ETag
+        mimetype = MAP_FORMATS[fmt]
+        use_gzip = "gzip" in request.accept_encodings
+        etag = f"{payload.etag}-gzip" if use_gzip else payload.etag
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        elif use_gzip:
+            response = app.response_class(payload.gzip_body, mimetype=mimetype)
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            response = app.response_class(payload.body, mimetype=mimetype)
+
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        response.vary.add("Accept")
+        response.vary.add("Accept-Encoding")
+        return response
     except Exception as e:
         import traceback
 
         error_traceback = traceback.format_exc()
-        print(f"Error in get_map: {str(e)}")
-        print(f"Traceback: {error_traceback}")
+        logger.error("Error in get_map: %s\n%s", e, error_traceback)
         return jsonify({"error": str(e), "traceback": error_traceback}), 500
 
 
@@ -400,67 +1527,153 @@ def get_waypoints():
             {"id": wp.id, "label": wp.annotations.name or "", "has_snapshot": bool(wp.snapshot_id)}
             for wp in api_instance.graph.waypoints
         ]
-        print(f"Successfully retrieved {len(waypoints)} waypoints")
+        logger.debug("Retrieved %d waypoints", len(waypoints))
         return jsonify(waypoints)
     except Exception as e:
         import traceback
 
         error_traceback = traceback.format_exc()
-        print(f"Error in get_waypoints: {str(e)}")
-        print(f"Traceback: {error_traceback}")
+        logger.error("Error in get_waypoints: %s\n%s", e, error_traceback)
         return jsonify({"error": str(e), "traceback": error_traceback}), 500
 
 
+@app.route("/api/waypoints/nearest", methods=["GET"])
+def get_nearest_waypoints():
+    """Get the k waypoints nearest to a point (x, y) in the selected coordinate frame."""
+    try:
+        try:
+            x, y = _float_arg("x"), _float_arg("y")
+            k = int(_float_arg("k", 1))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        use_anchoring = request.args.get("use_anchoring", "false").lower() == "true"
+        return jsonify(api_instance.find_nearest_waypoints(x, y, k, use_anchoring))
+    except Exception as e:
+        import traceback
+
+        error_traceback = traceback.format_exc()
+        logger.error("Error in get_nearest_waypoints: %s\n%s", e, error_traceback)
+        return jsonify({"error": str(e), "traceback": error_traceback}), 500
+
+
+@app.route("/api/waypoints/radius", methods=["GET"])
+def get_waypoints_in_radius():
+    """Get the waypoints within radius r of a point (x, y) in the selected coordinate frame."""
+    try:
+        try:
+            x, y, radius = _float_arg("x"), _float_arg("y"), _float_arg("r")
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if radius < 0:
+            return jsonify({"error": "Radius must be non-negative"}), 400
+
+        use_anchoring = request.args.get("use_anchoring", "false").lower() == "true"
+        return jsonify(api_instance.find_waypoints_in_radius(x, y, radius, use_anchoring))
+    except Exception as e:
+        import traceback
+
+        error_traceback = traceback.format_exc()
+        logger.error("Error in get_waypoints_in_radius: %s\n%s", e, error_traceback)
+        return jsonify({"error": str(e), "traceback": error_traceback}), 500
+
+
+@app.route("/api/route", methods=["GET"])
+def get_route():
+    """Get the shortest route along the graph edges from waypoint ``from`` to waypoint ``to``."""
+    source_id, target_id = request.args.get("from"), request.args.get("to")
+    if not source_id or not target_id:
+        return jsonify({"error": "Missing from or to waypoint"}), 400
+    if source_id not in api_instance.waypoints or target_id not in api_instance.waypoints:
+        return jsonify({"error": "Waypoint not found"}), 404
+
+    use_anchoring = request.args.get("use_anchoring", "false").lower() == "true"
+    route = api_instance.plan_route(source_id, target_id, use_anchoring)
+    if route is None:
+        return jsonify({"error": "No route between the waypoints"}), 404
+
+    return jsonify(route)
+
+
+@app.route("/api/route/objects", methods=["GET"])
+def get_route_to_objects():
+    """Get the shortest route from waypoint ``from`` to the nearest waypoint that sees all (mode=and) or any
+    (mode=or) of the given objects."""
+    source_id = request.args.get("from")
+    names = request.args.getlist("object")
+    mode = request.args.get("mode", "or").lower()
+    if not source_id or not names:
+        return jsonify({"error": "Missing from waypoint or objects"}), 400
+    if mode not in ("and", "or"):
+        return jsonify({"error": f"Unknown filter mode: {mode}"}), 400
+    if source_id not in api_instance.waypoints:
+        return jsonify({"error": "Waypoint not found"}), 404
+
+    use_anchoring = request.args.get("use_anchoring", "false").lower() == "true"
+    route = api_instance.plan_route_to_objects(source_id, names, mode, use_anchoring)
+    if route is None:
+        return jsonify({"error": "No reachable waypoint sees the objects"}), 404
+
+    return jsonify(route)
+
+
 @app.route("/api/waypoint/<waypoint_id>", methods=["GET"])
 def get_waypoint(waypoint_id):
     """Get detailed information about a specific waypoint with enhanced error handling."""
     try:
-        if waypoint_id not in api_instance.waypoints:
-            print(f"Waypoint not found: {waypoint_id}")
+        use_anchoring = request.args.get("use_anchoring", "false").lower() == "true"
+        result = api_instance.get_waypoint_details(waypoint_id, use_anchoring)
+        if result is None:
+            logger.debug("Waypoint not found: %s", waypoint_id)
             return jsonify({"error": "Waypoint not found"}), 404
 
-        waypoint = api_instance.waypoints[waypoint_id]
-        print(f"Retrieved waypoint: {waypoint_id}")
-
-        # Get position in the selected coordinate frame
-        use_anchoring = request.args.get("use_anchoring", "false").lower() == "true"
-        transforms = api_instance.anchored_transforms if use_anchoring else api_instance.global_transforms
-
-        position = None
-        if waypoint_id in transforms:
-            world_transform = transforms[waypoint_id]
-            position = world_transform[:3, 3].tolist()
-
-        # Get annotation data
-        objects = []
-        if waypoint_id in api_instance.waypoint_annotations:
-            ann = api_instance.waypoint_annotations[waypoint_id]
-            if "views" in ann:
-                for _, view_data in ann["views"].items():
-                    visible = view_data.get("visible_objects", [])
-                    for obj in visible:
-                        clean_obj = api_instance._clean_text(obj)
-                        if clean_obj not in objects:
-                            objects.append(clean_obj)
-
-        result = {
-            "id": waypoint_id,
-            "label": waypoint.annotations.name or "",
-            "snapshot_id": waypoint.snapshot_id,
-            "position": position,
-            "objects": objects,
-        }
+        logger.debug("Retrieved waypoint: %s", waypoint_id)
+        # The next waypoint selected is likely a neighbor; render its images before they are asked for
+        api_instance.prefetch_neighbor_images(waypoint_id)
 
         return jsonify(result)
     except Exception as e:
         import traceback
 
         error_traceback = traceback.format_exc()
-        print(f"Error in get_waypoint: {str(e)}")
-        print(f"Traceback: {error_traceback}")
+        logger.error("Error in get_waypoint: %s\n%s", e, error_traceback)
         return jsonify({"error": str(e), "traceback": error_traceback}), 500
 
 
+@app.route("/api/waypoints/details", methods=["GET"])
+def get_waypoints_details():
+    """Get the details and image URLs of several waypoints (``id`` repeated) in one request.
+
+    The images of the requested waypoints are prefetched in the background, since the client is about to show
+    them.
+    """
+    waypoint_ids = request.args.getlist("id")
+    if len(waypoint_ids) > MAX_BATCH_WAYPOINTS:
+        return jsonify({"error": f"At most {MAX_BATCH_WAYPOINTS} waypoints can be requested at once"}), 400
+    use_anchoring = request.args.get("use_anchoring", "false").lower() == "true"
+
+    waypoints = []
+    missing = []
+    for waypoint_id in waypoint_ids:
+        details = api_instance.get_waypoint_details(waypoint_id, use_anchoring)
+        if details is None:
+            missing.append(waypoint_id)
+            continue
+
+        details["images"] = {}
+        if details["has_images"]:
+            for camera in SpotMapAPI.FRONT_CAMERA_SOURCES:
+                details["images"][camera] = {}
+                for size in SpotMapAPI.IMAGE_SIZES:
+                    etag = api_instance.get_waypoint_image_etag(waypoint_id, camera, size)
+                    url = url_for("get_waypoint_image", waypoint_id=waypoint_id, camera=camera, size=size, v=etag)
+                    details["images"][camera][size] = {"url": url, "etag": etag}
+        waypoints.append(details)
+
+    api_instance.prefetch_images([details["id"] for details in waypoints])
+    return jsonify({"waypoints": waypoints, "missing": missing})
+
+
 @app.route("/api/check", methods=["GET"])
 def check_api():
     """Simple endpoint to check if the API is working."""
@@ -471,40 +1684,167 @@ def check_api():
             "waypoints_count": len(api_instance.waypoints),
             "edges_count": len(api_instance.graph.edges),
             "snapshots_count": len(api_instance.snapshots),
+            "snapshots_loaded": api_instance.snapshots.loaded_count,
             "objects_count": len(api_instance.all_objects),
+            "load_timings": api_instance.load_timings.as_dict(),
         }
         return jsonify(map_info)
     except Exception as e:
         import traceback
 
         error_traceback = traceback.format_exc()
-        print(f"Error in check_api: {str(e)}")
-        print(f"Traceback: {error_traceback}")
+        logger.error("Error in check_api: %s\n%s", e, error_traceback)
         return jsonify({"error": str(e), "traceback": error_traceback}), 500
 
 
+@app.route("/api/metrics", methods=["GET"])
+def get_metrics():
+    """Request timings, phase timings, cache counters and memory gauges in the Prometheus text format."""
+    return app.response_class(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.before_request
+def _sync_labels():
+    # Label edits are only applied in memory by the worker that handled them; pick up the other workers' edits
+    if request.method == "GET" and api_instance is not None:
+        api_instance.sync_labels()
+
+
+@app.after_request
+def _record_request_duration(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        # Label by route pattern rather than path so waypoint ids don't each make a new series
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        METRICS.observe(
+            "spot_map_http_request_duration_seconds",
+            time.perf_counter() - start,
+            route=route,
+            method=request.method,
+            status=response.status_code,
+        )
+    return response
+
+
+def _api_gauge(function):
+    """Wrap a function of the served API as a gauge, omitted until a map is loaded."""
+    return lambda: None if api_instance is None else function(api_instance)
+
+
+METRICS.describe(
+    "spot_map_http_request_duration_seconds",
+    "Time to build each response, by route pattern; streamed bodies are sent after this",
+)
+METRICS.describe("spot_map_phase_duration_seconds", "Time spent in each snapshot, image and map payload phase")
+METRICS.describe("spot_map_cache_requests_total", "Lookups in each cache, by result")
+METRICS.gauge("spot_map_waypoints", _api_gauge(lambda api: len(api.waypoints)), "Waypoints in the served map")
+METRICS.gauge("spot_map_snapshots", _api_gauge(lambda api: len(api.snapshots)), "Snapshot files of the served map")
+METRICS.gauge(
+    "spot_map_snapshots_loaded", _api_gauge(lambda api: api.snapshots.loaded_count), "Snapshots parsed in memory"
+)
+METRICS.gauge(
+    "spot_map_snapshots_loaded_bytes",
+    _api_gauge(lambda api: api.snapshots.loaded_bytes),
+    "Serialized size of the snapshots parsed in memory",
+)
+METRICS.gauge(
+    "spot_map_image_prefetches_pending",
+    _api_gauge(lambda api: len(api._prefetching)),
+    "Image prefetches queued or running",
+)
+METRICS.gauge(
+    "spot_map_load_phase_seconds",
+    _api_gauge(lambda api: api.load_timings.as_dict()),
+    "Duration of each phase of the last map load or reload",
+    label="phase",
+)
+
+
 @app.route("/api/waypoint/<waypoint_id>/images", methods=["GET"])
 def get_waypoint_images(waypoint_id):
     """Get the images for a specific waypoint."""
-    images = api_instance.get_waypoint_images(waypoint_id)
+    size = request.args.get("size", "full")
+    if size not in SpotMapAPI.IMAGE_SIZES:
+        return jsonify({"error": f"Unknown image size: {size}"}), 400
+
+    images = api_instance.get_waypoint_images(waypoint_id, size)
     if images is None:
         return jsonify({"error": "Images not found"}), 404
 
     return jsonify(images)
 
 
+@app.route("/api/waypoint/<waypoint_id>/image/<camera>", methods=["GET"])
+def get_waypoint_image(waypoint_id, camera):
+    """Stream a single camera image of a waypoint as JPEG bytes.
+
+    URLs from /api/waypoints/details carry the image's ETag as ``v``; only those are cached for IMAGE_MAX_AGE.
+    """
+    size = request.args.get("size", "full")
+    if size not in SpotMapAPI.IMAGE_SIZES:
+        return jsonify({"error": f"Unknown image size: {size}"}), 400
+
+    etag = api_instance.get_waypoint_image_etag(waypoint_id, camera, size)
+    if etag is None:
+        return jsonify({"error": "Image not found"}), 404
+
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        jpeg = api_instance.get_waypoint_image(waypoint_id, camera, size)
+        if jpeg is None:
+            return jsonify({"error": "Image not found"}), 404
+        response = app.response_class(jpeg, mimetype="image/jpeg")
+
+    response.set_etag(etag)
+    if request.args.get("v") == etag:
+        response.headers["Cache-Control"] = f"public, max-age={IMAGE_MAX_AGE}"
+    else:
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
 @app.route("/api/objects", methods=["GET"])
 def get_objects():
     """Get a list of all objects in the environment."""
     return jsonify(api_instance.all_objects)
 
 
+@app.route("/api/objects/<path:name>/waypoints", methods=["GET"])
+def get_object_waypoints(name):
+    """Get the waypoints that see a specific object."""
+    waypoints = api_instance.get_object_waypoints(name)
+    if not waypoints:
+        return jsonify({"error": "Object not found"}), 404
+
+    return jsonify({"object": name, "waypoints": waypoints})
+
+
+@app.route("/api/objects/filter", methods=["GET"])
+def filter_objects():
+    """Get the ids of waypoints that see all (mode=and) or any (mode=or) of the given objects."""
+    names = request.args.getlist("object")
+    mode = request.args.get("mode", "or").lower()
+    if mode not in ("and", "or"):
+        return jsonify({"error": f"Unknown filter mode: {mode}"}), 400
+
+    waypoint_ids = api_instance.query_object_waypoints(names, mode)
+    return jsonify({"objects": names, "mode": mode, "waypoints": waypoint_ids})
+
+
 @app.route("/api/waypoint/<waypoint_id>/label", methods=["PUT"])
 def update_waypoint_label(waypoint_id):
     """Update the label for a specific waypoint."""
-    data = request.json
-    if not data or "label" not in data:
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or "label" not in data:
         return jsonify({"error": "Missing label in request"}), 400
+    if not isinstance(data["label"], str):
+        return jsonify({"error": "Label must be a string"}), 400
 
     success, message = api_instance.update_waypoint_label(waypoint_id, data["label"])
     if not success:
@@ -513,11 +1853,56 @@ def update_waypoint_label(waypoint_id):
     return jsonify({"message": message})
 
 
-def run_server(map_path, rag_path, port=5000):
-    """Run the Flask server."""
+@app.route("/api/waypoints/labels", methods=["PUT"])
+def update_waypoint_labels():
+    """Update the labels of several waypoints in one request."""
+    data = request.get_json(silent=True)
+    labels = data.get("labels") if isinstance(data, dict) else None
+    if not isinstance(labels, dict) or not all(isinstance(label, str) for label in labels.values()):
+        return jsonify({"error": 'Expected {"labels": {waypoint_id: label}}'}), 400
+
+    success, message = api_instance.update_waypoint_labels(labels)
+    if not success:
+        return jsonify({"error": message}), 400
+
+    return jsonify({"message": message})
+
+
+def create_api(map_path, rag_path, **kwargs):
+    """Load a map into the ``SpotMapAPI`` instance served by the routes and return it.
+
+    Keyword arguments are passed to ``SpotMapAPI``. Used by ``run_server`` and the WSGI entry point in ``wsgi.py``.
+    """
     global api_instance
-    api_instance = SpotMapAPI(map_path, rag_path)
-    app.run(debug=True, port=port)
+    api_instance = SpotMapAPI(map_path, rag_path, **kwargs)
+    return api_instance
+
+
+def _set_api_instance(api):
+    global api_instance
+    api_instance = api
+
+
+def watch_map(interval=2.0):
+    """Reload the served map and RAG data whenever their files change, checking every interval seconds."""
+    return api_instance.watch(_set_api_instance, interval)
+
+
+def configure_logging(level="info"):
+    """Send log records at level and above to stderr."""
+    logging.basicConfig(level=level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+def run_server(map_path, rag_path, port=5000, debug=False, reload_interval=0, **kwargs):
+    """Run the Flask development server; see ``wsgi.py`` for production serving.
+
+    With a positive reload_interval, changes to the map and RAG folders are loaded without a restart.
+    """
+    create_api(map_path, rag_path, **kwargs)
+    if reload_interval > 0:
+        watch_map(reload_interval)
+    # The debug reloader would load the map a second time in its child process
+    app.run(debug=debug, use_reloader=False, port=port, threaded=True)
 
 
 if __name__ == "__main__":
@@ -527,5 +1912,83 @@ if __name__ == "__main__":
         "--rag-path", type=str, default="../assets/database/chair_v2", help="Path to RAG database folder"
     )
     parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument(
+        "--snapshot-cache-mb", type=float, default=512, help="Memory budget for parsed waypoint snapshots (MB)"
+    )
+    parser.add_argument(
+        "--image-cache-dir",
+        type=str,
+        default=None,
+        help="Rendered image cache folder (default: <map-path>/image_cache)",
+    )
+    parser.add_argument(
+        "--warm-image-cache", action="store_true", help="Render all waypoint images into the image cache and exit"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Worker threads/processes for loading (default: CPU count, max 8)"
+    )
+    parser.add_argument(
+        "--preload-snapshots", action="store_true", help="Parse snapshots at startup, up to --snapshot-cache-mb"
+    )
+    parser.add_argument(
+        "--derived-cache-dir",
+        default=None,
+        help="Directory for cached poses and annotation indexes (default: <map-path>/derived_cache)",
+    )
+    parser.add_argument(
+        "--image-workers", type=int, default=0, help="Processes for decoding and encoding images (default: in-thread)"
+    )
+    parser.add_argument(
+        "--prefetch-workers",
+        type=int,
+        default=2,
+        help="Threads prefetching the images of neighboring waypoints (default: 2, 0 disables prefetching)",
+    )
+    parser.add_argument(
+        "--prefetch-depth",
+        type=int,
+        default=1,
+        help="Edges from a selected waypoint to prefetch images for (default: 1)",
+    )
+    parser.add_argument("--debug", action="store_true", help="Enable the Flask debugger")
+    parser.add_argument(
+        "--log-level",
+        default="info",
+        choices=["debug", "info", "warning", "error"],
+        help="Least severe log messages to show (default: info; debug logs every request)",
+    )
+    parser.add_argument(
+        "--reload-interval",
+        type=float,
+        default=0,
+        help="Seconds between checks for changed map and RAG files to reload (default: 0, never reload)",
+    )
     args = parser.parse_args()
-    run_server(args.map_path, args.rag_path, args.port)
+    configure_logging(args.log_level)
+
+    if args.warm_image_cache:
+        api = SpotMapAPI(
+            args.map_path,
+            args.rag_path,
+            snapshot_cache_mb=args.snapshot_cache_mb,
+            image_cache_dir=args.image_cache_dir,
+            workers=args.workers,
+            derived_cache_dir=args.derived_cache_dir,
+        )
+        logger.info("Rendered %d images into %s", api.warm_image_cache(), api.image_cache.cache_dir)
+    else:
+        run_server(
+            args.map_path,
+            args.rag_path,
+            args.port,
+            debug=args.debug,
+            reload_interval=args.reload_interval,
+            snapshot_cache_mb=args.snapshot_cache_mb,
+            image_cache_dir=args.image_cache_dir,
+            workers=args.workers,
+            preload_snapshots=args.preload_snapshots,
+            derived_cache_dir=args.derived_cache_dir,
+            image_workers=args.image_workers,
+            prefetch_workers=args.prefetch_workers,
+            prefetch_depth=args.prefetch_depth,
+        )
@@ -0,0 +1,340 @@
+"""Benchmark the backend on synthetic maps of increasing size.
+
+    python benchmark.py --sizes 100,1000,10000 --output before.json
+    python benchmark.py --sizes 100,1000,10000 --output after.json --compare before.json
+
+Maps are generated by ``synthetic_map.py`` with a fixed seed and kept in --work-dir, so runs on different commits
+measure the same input. Each size is measured in a fresh Python process: a cold start (no derived or image cache),
+the latency of a fixed, seeded set of requests through the Flask test client, peak RSS, and a warm start from the
+derived cache. With --compare, metrics that got worse than the baseline by more than --threshold are listed and the
+exit status is 1.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from synthetic_map import GENERATOR_VERSION, generate_map
+
+DEFAULT_SIZES = (100, 1000, 10000)
+
+# Snapshots are a few hundred KB each on disk, and image latency doesn't depend on the map size
+DEFAULT_MAX_SNAPSHOTS = 2000
+
+# Changes below these are noise, however large they are relative to the baseline
+MIN_LATENCY_CHANGE_MS = 0.5
+MIN_STARTUP_CHANGE_S = 0.05
+MIN_RSS_CHANGE_MB = 10
+
+
+def map_dir(work_dir, size, seed, max_snapshots):
+    """Generate the synthetic map for a size unless an identical one is already in work_dir."""
+    output_dir = os.path.join(work_dir, f"map-{size}-seed{seed}-snapshots{max_snapshots}-v{GENERATOR_VERSION}")
+    done_path = os.path.join(output_dir, "done")
+    if not os.path.exists(done_path):
+        shutil.rmtree(output_dir, ignore_errors=True)
+        print(f"Generating a map with {size} waypoints in {output_dir}", file=sys.stderr)
+        generate_map(output_dir, size, seed=seed, snapshot_ratio=min(1.0, max_snapshots / size))
+        open(done_path, "w").close()
+    return os.path.join(output_dir, "map"), os.path.join(output_dir, "rag")
+
+
+def latency_summary(seconds):
+    """Summarize request durations as milliseconds percentiles."""
+    ms = np.asarray(seconds) * 1000
+    return {
+        "p50": round(float(np.percentile(ms, 50)), 3),
+        "p90": round(float(np.percentile(ms, 90)), 3),
+        "p99": round(float(np.percentile(ms, 99)), 3),
+        "mean": round(float(ms.mean()), 3),
+        "max": round(float(ms.max()), 3),
+        "n": int(ms.size),
+    }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def request_cases(api, requests, seed):
+    """Return ``{name: [(path, headers), ...]}``, the requests timed for each case."""
+    rng = random.Random(seed)
+    waypoint_ids = list(api.waypoints)
+    with_images = [w for w in waypoint_ids if api.waypoints[w].snapshot_id in api.snapshots]
+    positions = api.global_transforms.positions
+    objects = api.all_objects
+
+    def sample(population, count):
+        return [rng.choice(population) for _ in range(count)] if population else []
+
+    def viewport():
+        x, y = positions[rng.randrange(len(positions))][:2]
+        return f"{x - 10:.2f},{y - 10:.2f},{x + 10:.2f},{y + 10:.2f}"
+
+    identity = {"Accept-Encoding": "identity"}
+    gzip = {"Accept-Encoding": "gzip"}
+    # Each cold image is a different waypoint, so that every request renders
+    cold_images = rng.sample(with_images, min(requests, len(with_images)))
+    return {
+        "map_json": [("/api/map", identity)] * requests,
+        "map_json_gzip": [("/api/map", gzip)] * requests,
+        "map_binary": [("/api/map?format=binary", gzip)] * requests,
+        "map_ndjson": [("/api/map?format=ndjson", identity)] * requests,
+        "map_bbox": [(f"/api/map?bbox={viewport()}", identity) for _ in range(requests)],
+        "map_lod1": [("/api/map?lod=1", gzip)] * requests,
+        "waypoint": [(f"/api/waypoint/{w}", identity) for w in sample(waypoint_ids, requests)],
+        "waypoints_details_20": [
+            ("/api/waypoints/details?" + "&".join(f"id={w}" for w in sample(waypoint_ids, 20)), identity)
+            for _ in range(requests)
+        ],
+        "nearest_5": [
+            (f"/api/waypoints/nearest?x={p[0]:.2f}&y={p[1]:.2f}&k=5", identity)
+            for p in (positions[rng.randrange(len(positions))] for _ in range(requests))
+        ],
+        "objects_filter_and": [
+            ("/api/objects/filter?mode=and&" + "&".join(f"object={o}" for o in sample(objects, 2)), identity)
+            for _ in range(requests)
+        ],
+        "route": [
+            (f"/api/route?from={a}&to={b}", identity)
+            for a, b in zip(sample(waypoint_ids, requests), sample(waypoint_ids, requests))
+        ],
+        "route_to_object": [
+            (f"/api/route/objects?from={w}&object={o}", identity)
+            for w, o in zip(sample(waypoint_ids, requests), sample(objects, requests))
+        ],
+        "image_thumbnail_cold": [(f"/api/waypoint/{w}/image/left?size=thumbnail", identity) for w in cold_images],
+        "image_full_cold": [(f"/api/waypoint/{w}/image/left?size=full", identity) for w in cold_images],
+        "image_full_warm": [(f"/api/waypoint/{w}/image/left?size=full", identity) for w in cold_images],
+    }
+
+
+def measure(map_path, rag_path, requests, seed, image_workers):
+    """Measure one map in this process. Returns the results as a dict."""
+    # Imported here so that only the measuring processes load the server
+    import app
+
+    app.configure_logging("warning")
+    cache_dir = tempfile.mkdtemp(prefix="spot-benchmark-")
+    options = dict(
+        image_cache_dir=os.path.join(cache_dir, "images"),
+        derived_cache_dir=os.path.join(cache_dir, "derived"),
+        image_workers=image_workers,
+        prefetch_workers=0,
+    )
+    try:
+        start = time.perf_counter()
+        api = app.create_api(map_path, rag_path, **options)
+        startup_cold = time.perf_counter() - start
+        load_timings = api.load_timings.as_dict()
+
+        client = app.app.test_client()
+        latencies = {}
+        for name, case_requests in request_cases(api, requests, seed).items():
+            durations = []
+            for path, headers in case_requests:
+                start = time.perf_counter()
+                response = client.get(path, headers=headers)
+                # Reading the body runs streamed responses to completion
+                response.get_data()
+                durations.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise RuntimeError(f"GET {path} returned {response.status_code}")
+            if durations:
+                latencies[name] = latency_summary(durations)
+        rss = peak_rss_mb()
+        api.close()
+
+        start = time.perf_counter()
+        app.SpotMapAPI(map_path, rag_path, **options).close()
+        startup_warm = time.perf_counter() - start
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    return {
+        "waypoints": len(api.waypoints),
+        "edges": len(api.graph.edges),
+        "snapshots": len(api.snapshots),
+        "startup_cold_s": round(startup_cold, 4),
+        "startup_warm_s": round(startup_warm, 4),
+        "peak_rss_mb": rss,
+        "load_timings": load_timings,
+        "latency_ms": latencies,
+    }
+
+
+def run_size(map_path, rag_path, args):
+    """Measure one map in a fresh interpreter, so that start-up and memory aren't affected by earlier sizes."""
+    command = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--measure",
+        map_path,
+        rag_path,
+        "--requests",
+        str(args.requests),
+        "--seed",
+        str(args.seed),
+        "--image-workers",
+        str(args.image_workers),
+    ]
+    output = subprocess.run(
+        command, check=True, stdout=subprocess.PIPE, cwd=os.path.dirname(os.path.abspath(__file__))
+    ).stdout
+    return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+
+def environment():
+    """Describe the commit and machine results were recorded on."""
+
+    def git(*command):
+        try:
+            return (
+                subprocess.run(
+                    ["git", *command],
+                    cwd=os.path.dirname(os.path.abspath(__file__)),
+                    stdout=subprocess.PIPE,
+                    check=True,
+                )
+                .stdout.decode("utf-8")
+                .strip()
+            )
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def flatten(size_results):
+    """Map each comparable metric of one size to ``(value, minimum change that counts)``."""
+    metrics = {
+        "startup_cold_s": (size_results["startup_cold_s"], MIN_STARTUP_CHANGE_S),
+        "startup_warm_s": (size_results["startup_warm_s"], MIN_STARTUP_CHANGE_S),
+        "peak_rss_mb": (size_results["peak_rss_mb"], MIN_RSS_CHANGE_MB),
+    }
+    for name, summary in size_results["latency_ms"].items():
+        for percentile in ("p50", "p90"):
+            metrics[f"{name}.{percentile}_ms"] = (summary[percentile], MIN_LATENCY_CHANGE_MS)
+    return metrics
+
+
+def compare(results, baseline, threshold):
+    """Print how each metric changed from baseline and return the ones that regressed by more than threshold."""
+    regressions = []
+    for size, size_results in results["sizes"].items():
+        if size not in baseline["sizes"]:
+            continue
+        old_metrics = flatten(baseline["sizes"][size])
+        print(f"\n{size} waypoints (baseline {(baseline['environment'].get('commit') or '?')[:10]}):")
+        for name, (value, min_change) in flatten(size_results).items():
+            if name not in old_metrics:
+                continue
+            old_value = old_metrics[name][0]
+            ratio = value / old_value if old_value else float("inf")
+            regressed = value - old_value > min_change and ratio > 1 + threshold
+            print(
+                f"  {name:<36} {old_value:>10.3f} -> {value:>10.3f}  x{ratio:5.2f}{'  REGRESSION' if regressed else ''}"
+            )
+            if regressed:
+                regressions.append((size, name, old_value, value))
+    return regressions
+
+
+def print_results(results):
+    for size, size_results in results["sizes"].items():
+        print(
+            f"\n{size} waypoints: cold start {size_results['startup_cold_s']:.3f}s, "
+            f"warm start {size_results['startup_warm_s']:.3f}s, peak RSS {size_results['peak_rss_mb']:.0f} MB"
+        )
+        print(f"  {'request':<24} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}")
+        for name, summary in size_results["latency_ms"].items():
+            print(f"  {name:<24} {summary['p50']:>9.3f} {summary['p90']:>9.3f} {summary['p99']:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the backend on synthetic maps")
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in DEFAULT_SIZES),
+        help="Comma-separated waypoint counts (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--work-dir",
+        default=os.path.join(tempfile.gettempdir(), "spot-map-benchmark"),
+        help="Where generated maps are kept between runs (default: %(default)s)",
+    )
+    parser.add_argument("--requests", type=int, default=50, help="Requests timed per case (default: 50)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the maps and requests (default: 0)")
+    parser.add_argument(
+        "--max-snapshots",
+        type=int,
+        default=DEFAULT_MAX_SNAPSHOTS,
+        help="Most waypoints given a snapshot with camera images (default: %(default)s)",
+    )
+    parser.add_argument("--image-workers", type=int, default=0, help="Passed to SpotMapAPI (default: 0)")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Results JSON of a baseline run to compare with")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="Relative slowdown reported as a regression (default: 0.2)"
+    )
+    parser.add_argument("--measure", nargs=2, metavar=("MAP_PATH", "RAG_PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(*args.measure, args.requests, args.seed, args.image_workers)))
+        return 0
+
+    results = {
+        "environment": environment(),
+        "settings": {
+            "requests": args.requests,
+            "seed": args.seed,
+            "max_snapshots": args.max_snapshots,
+            "image_workers": args.image_workers,
+            "generator_version": GENERATOR_VERSION,
+        },
+        "sizes": {},
+    }
+    for size in (int(size) for size in args.sizes.split(",")):
+        map_path, rag_path = map_dir(args.work_dir, size, args.seed, args.max_snapshots)
+        print(f"Measuring {size} waypoints", file=sys.stderr)
+        results["sizes"][str(size)] = run_size(map_path, rag_path, args)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != results["settings"]:
+            print("\nWarning: the baseline was recorded with different settings", file=sys.stderr)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metrics regressed by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import pickle
+
+import numpy as np
+from label_journal import atomic_write
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout or meaning of any cached section changes
+CACHE_VERSION = 3
+
+
+def files_key(paths):
+    """Fingerprint a set of files by name, size and modification time without reading them."""
+    digest = hashlib.sha1()
+    for path in sorted(paths):
+        stat = os.stat(path)
+        digest.update(f"{os.path.basename(path)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class DerivedCache:
+    """On-disk cache of data derived from the map and RAG folders, so restarts can skip recomputing it.
+
+    The cache is split into independent sections (e.g. ``graph`` and ``rag``) laid out as
+    ``<cache_dir>/<section>/``. Each section holds NumPy arrays saved as ``.npy`` files, which are
+    memory-mapped read-only on load, plus one pickle of plain Python objects. A section is only valid
+    for the key it was saved with; ``key.json`` is written last and removed first, so a crash while
+    saving leaves a section that reads as stale rather than corrupt.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def _section_dir(self, section):
+        return os.path.join(self.cache_dir, section)
+
+    def load(self, section, key):
+        """Return ``(arrays, objects)`` for a section saved with key, or None if it is missing or stale."""
+        section_dir = self._section_dir(section)
+        try:
+            with open(os.path.join(section_dir, "key.json")) as f:
+                manifest = json.load(f)
+            if manifest.get("version") != CACHE_VERSION or manifest.get("key") != key:
+                METRICS.inc("spot_map_cache_requests_total", cache=f"derived_{section}", result="miss")
+                return None
+
+            arrays = {
+                name: np.load(os.path.join(section_dir, f"{name}.npy"), mmap_mode="r" if size else None)
+                for name, size in manifest["arrays"].items()
+            }
+            with open(os.path.join(section_dir, "objects.pickle"), "rb") as f:
+                objects = pickle.load(f)
+        except (OSError, ValueError, KeyError, pickle.UnpicklingError, EOFError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning("Ignoring unreadable derived cache section %s: %s", section_dir, e)
+            METRICS.inc("spot_map_cache_requests_total", cache=f"derived_{section}", result="miss")
+            return None
+
+        METRICS.inc("spot_map_cache_requests_total", cache=f"derived_{section}", result="hit")
+        return arrays, objects
+
+    def save(self, section, key, arrays, objects):
+        """Replace a section with new arrays and objects. Failures are reported and otherwise ignored."""
+        section_dir = self._section_dir(section)
+        try:
+            os.makedirs(section_dir, exist_ok=True)
+            key_path = os.path.join(section_dir, "key.json")
+            if os.path.exists(key_path):
+                os.unlink(key_path)
+
+            for name, array in arrays.items():
+                buffer = io.BytesIO()
+                np.save(buffer, np.ascontiguousarray(array), allow_pickle=False)
+                atomic_write(os.path.join(section_dir, f"{name}.npy"), buffer.getvalue())
+            atomic_write(
+                os.path.join(section_dir, "objects.pickle"), pickle.dumps(objects, protocol=pickle.HIGHEST_PROTOCOL)
+            )
+
+            # Empty arrays can't be memory-mapped, so record sizes to load those eagerly
+            manifest = {
+                "version": CACHE_VERSION,
+                "key": key,
+                "arrays": {name: int(a.size) for name, a in arrays.items()},
+            }
+            atomic_write(key_path, json.dumps(manifest).encode("utf-8"))
+            return True
+        except (OSError, pickle.PicklingError) as e:
+            logger.warning("Could not write derived cache section %s: %s", section_dir, e)
+            return False
@@ -0,0 +1,22 @@
+"""Gunicorn settings for ``gunicorn -c gunicorn.conf.py wsgi:app``. Command-line options override them."""
+
+import os
+
+bind = os.environ.get("SPOT_BIND", "127.0.0.1:5000")
+workers = int(os.environ.get("SPOT_WEB_WORKERS", 2))
+
+# Threads let cheap map requests be served while others wait on the image worker pool
+worker_class = "gthread"
+threads = int(os.environ.get("SPOT_WEB_THREADS", 16))
+
+# Load the map once in the master process so the workers share its memory
+preload_app = True
+timeout = 120
+
+
+def post_fork(server, worker):
+    import wsgi
+
+    wsgi.api.after_fork()
+    if wsgi.reload_interval > 0:
+        wsgi.watch_map(wsgi.reload_interval)
@@ -0,0 +1,62 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+class ImageCache:
+    """Disk cache of rendered waypoint camera images stored as JPEG files.
+
+    Entries are keyed by snapshot id, camera source, rotation, size variant and snapshot file version and laid
+    out as ``<cache_dir>/<snapshot_id>/<source>_r<rotation>_<size>_<version>.jpg``, so an image rendered from a
+    snapshot that has since been rewritten is never served. Writes go through a temporary file and an atomic
+    rename so concurrent readers never see a partial image.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def _safe_name(name):
+        """Make an id usable as a path component, adding a hash suffix if anything was replaced."""
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+        if safe != name or safe in ("", ".", ".."):
+            safe = f"{safe}-{hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]}"
+        return safe
+
+    def path(self, snapshot_id, source, rotation, size, version=""):
+        """Return the file path of a cache entry."""
+        filename = f"{self._safe_name(source)}_r{int(rotation)}_{self._safe_name(size)}"
+        if version:
+            filename += f"_{self._safe_name(version)}"
+        filename += ".jpg"
+        return os.path.join(self.cache_dir, self._safe_name(snapshot_id), filename)
+
+    def get(self, snapshot_id, source, rotation, size, version=""):
+        """Return the cached JPEG bytes, or None on a miss."""
+        try:
+            with open(self.path(snapshot_id, source, rotation, size, version), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, snapshot_id, source, rotation, size, data, version=""):
+        """Store JPEG bytes. Failures (e.g. a read-only map folder) are reported and otherwise ignored."""
+        path = self.path(snapshot_id, source, rotation, size, version)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            return True
+        except OSError as e:
+            logger.warning("Could not write image cache entry %s: %s", path, e)
+            return False
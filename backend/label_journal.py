@@ -0,0 +1,209 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single server process is assumed
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def _fsync_dir(path):
+    """Flush a directory entry so a rename inside it survives a crash (no-op where unsupported)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, data):
+    """Write bytes to path through a synced temporary file and an atomic rename."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    _fsync_dir(directory)
+
+
+class LabelJournal:
+    """Write-ahead journal of waypoint label edits, compacted into the graph file in the background.
+
+    Each edit is appended to a JSON-lines journal and synced before it is acknowledged. A background thread
+    coalesces edits that arrive within ``compact_delay`` seconds, then ``rewrite_graph`` applies every journaled
+    edit to the graph file on disk and the result replaces it through an atomic rename. Because compaction
+    works from the files rather than from one process's in-memory graph, several server processes can share
+    a journal: appends and compactions are serialized by an exclusive lock on ``<journal_path>.lock``.
+    Callers hold ``lock`` while appending and applying edits so that edits are applied in journal order.
+
+    If the journal can't be opened for writing, e.g. in a read-only map folder, it is ``read_only``: the edits
+    already journaled are still read, but ``append`` raises.
+    """
+
+    def __init__(self, journal_path, graph_file_path, rewrite_graph, compact_delay=2.0):
+        self.journal_path = journal_path
+        self.graph_file_path = graph_file_path
+        self.rewrite_graph = rewrite_graph
+        self.compact_delay = compact_delay
+        self.lock = threading.RLock()
+        self.read_only = False
+
+        try:
+            with self.file_lock():
+                self._pending = self._read_and_repair()
+        except OSError as e:
+            logger.warning("Label journal %s is read-only, label edits are disabled: %s", journal_path, e)
+            self.read_only = True
+            self._pending = []
+        self._wake = threading.Event()
+        self._closed = False
+        self.start()
+        if self._pending:
+            self._wake.set()
+
+    def start(self):
+        """Start the background compaction thread, e.g. again in a process forked after the journal was opened."""
+        self._thread = threading.Thread(target=self._run, name="label-journal-compactor", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def read(journal_path):
+        """Read ``(waypoint_id, label)`` entries from a journal, ignoring a torn last line."""
+        return LabelJournal._read_entries(journal_path)[0]
+
+    @staticmethod
+    def _read_entries(journal_path):
+        """Return the journal entries and the byte length of the valid prefix they were read from."""
+        entries = []
+        valid_length = 0
+        if not os.path.exists(journal_path):
+            return entries, valid_length
+
+        with open(journal_path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete line")
+                    entry = json.loads(line)
+                    waypoint_id, label = entry["waypoint_id"], entry["label"]
+                except (ValueError, KeyError, TypeError):
+                    # Only the last write can be incomplete after a crash; nothing after it was acknowledged
+                    break
+                valid_length += len(line)
+                if isinstance(waypoint_id, str) and isinstance(label, str):
+                    entries.append((waypoint_id, label))
+                else:
+                    logger.warning("Skipping invalid label journal entry: %s", line.decode("utf-8", "replace").strip())
+
+        return entries, valid_length
+
+    def _read_and_repair(self):
+        """Read the journal and cut off a torn last line, so later appends don't run into it."""
+        entries, valid_length = self._read_entries(self.journal_path)
+        if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) > valid_length:
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(valid_length)
+                os.fsync(f.fileno())
+        return entries
+
+    @contextmanager
+    def file_lock(self):
+        """Hold an exclusive lock shared with other processes using the same journal.
+
+        A read-only journal isn't locked: no process can write to it.
+        """
+        if fcntl is None or self.read_only:
+            yield
+            return
+
+        with open(self.journal_path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    @property
+    def pending_count(self):
+        """Number of edits journaled by this process and not yet compacted into the graph file."""
+        return len(self._pending)
+
+    def append(self, updates):
+        """Durably record a batch of ``(waypoint_id, label)`` edits and schedule a compaction.
+
+        Raises PermissionError if the journal is read-only.
+        """
+        if self.read_only:
+            raise PermissionError(f"Label journal {self.journal_path} is read-only")
+        lines = "".join(
+            json.dumps({"waypoint_id": waypoint_id, "label": label}) + "\n" for waypoint_id, label in updates
+        )
+        with self.lock, self.file_lock():
+            with open(self.journal_path, "ab") as f:
+                f.write(lines.encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending.extend(updates)
+        self._wake.set()
+
+    def compact(self):
+        """Apply all journaled edits to the graph file and empty the journal.
+
+        Returns False if there was nothing to compact, e.g. because another process already did.
+        """
+        with self.file_lock():
+            # Appends extend _pending while holding the file lock, so this counts exactly the edits compacted here
+            compacted = len(self._pending)
+            entries = self.read(self.journal_path)
+            if entries:
+                atomic_write(self.graph_file_path, self.rewrite_graph(entries))
+            if os.path.exists(self.journal_path):
+                os.unlink(self.journal_path)
+                _fsync_dir(os.path.dirname(os.path.abspath(self.journal_path)))
+
+        with self.lock:
+            del self._pending[:compacted]
+
+        return bool(entries)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            if self._closed:
+                return
+
+            # Let a burst of edits accumulate so they are written with one graph rewrite
+            time.sleep(self.compact_delay)
+            self._wake.clear()
+            try:
+                self.compact()
+            except Exception:
+                logger.exception("Error compacting label journal")
+                self._wake.set()
+
+    def close(self):
+        """Stop the background thread and compact any outstanding edits."""
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=self.compact_delay + 5)
+        if not self.read_only:
+            self.compact()
@@ -0,0 +1,213 @@
+import numpy as np
+
+
+def _point_segment_distances(points, start, end):
+    """Distances from each of the (N, 2) points to the segment from start to end."""
+    segment = end - start
+    length_sq = float(segment.dot(segment))
+    if length_sq == 0.0:
+        return np.linalg.norm(points - start, axis=1)
+
+    t = np.clip((points - start).dot(segment) / length_sq, 0.0, 1.0)
+    return np.linalg.norm(points - (start + t[:, None] * segment), axis=1)
+
+
+def simplify_polyline(xy, epsilon):
+    """Ramer-Douglas-Peucker simplification of an (N, 2) polyline.
+
+    Returns a boolean mask of the points to keep; the two endpoints are always kept.
+    """
+    keep = np.zeros(len(xy), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(xy) - 1)]
+
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        distances = _point_segment_distances(xy[first + 1 : last], xy[first], xy[last])
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > epsilon:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            stack.append((first, middle))
+            stack.append((middle, last))
+
+    return keep
+
+
+class LevelOfDetail:
+    """One simplified version of the waypoint graph.
+
+    ``nodes`` maps each representative waypoint row to the rows of the waypoints it stands for, and ``edges``
+    maps each ``(row_a, row_b)`` pair (``row_a < row_b``) to the rows of the waypoints collapsed into it.
+    ``resolution`` is the size in meters of the smallest detail the level preserves.
+    """
+
+    def __init__(self, resolution, nodes, edges):
+        self.resolution = resolution
+        self.nodes = nodes
+        self.edges = edges
+
+
+class LevelOfDetailPyramid:
+    """Progressively coarser simplifications of the waypoint graph in one coordinate frame.
+
+    Level 1 collapses chains of degree-2 waypoints that are collinear within half its resolution. Every further
+    level doubles the resolution, collapses chains again and merges the nodes falling in the same grid cell of
+    that size into the member closest to their centroid. Levels stop once the graph has at most ``min_nodes``
+    nodes. Level 0 is the full graph and is not stored.
+    """
+
+    def __init__(self, poses, edge_ids, min_nodes=64, max_levels=8):
+        self.levels = []
+        if not len(poses):
+            return
+
+        self.xy = poses.positions[:, :2]
+        extent = max(float(np.ptp(self.xy[:, 0])), float(np.ptp(self.xy[:, 1])), 1e-6)
+        base_resolution = extent / 512.0
+
+        nodes = {row: [row] for row in range(len(poses))}
+        edges = {}
+        for from_id, to_id in edge_ids:
+            a, b = poses.index.get(from_id), poses.index.get(to_id)
+            if a is not None and b is not None and a != b:
+                edges.setdefault((min(a, b), max(a, b)), [])
+
+        for level in range(1, max_levels + 1):
+            resolution = base_resolution * 2 ** (level - 1)
+            nodes, edges = self._collapse_chains(nodes, edges, resolution / 2.0)
+            if level > 1:
+                nodes, edges = self._cluster(nodes, edges, resolution)
+
+            self.levels.append(LevelOfDetail(resolution, nodes, edges))
+            if len(nodes) <= min_nodes or resolution >= extent:
+                break
+
+    @classmethod
+    def from_levels(cls, levels):
+        """Rebuild a pyramid from the ``levels`` of a previously built one."""
+        pyramid = cls.__new__(cls)
+        pyramid.levels = levels
+        return pyramid
+
+    def __len__(self):
+        return len(self.levels)
+
+    def level(self, lod):
+        """Return level ``lod`` (1-based); level 0 is the full graph and has no entry."""
+        return self.levels[lod - 1]
+
+    def level_for_zoom(self, pixels_per_meter, pixel_size=4.0):
+        """Pick the coarsest level whose resolution is still below pixel_size pixels at the given zoom."""
+        lod = 0
+        for index, level in enumerate(self.levels):
+            if level.resolution * pixels_per_meter <= pixel_size:
+                lod = index + 1
+        return lod
+
+    def _collapse_chains(self, nodes, edges, epsilon):
+        """Replace chains of degree-2 nodes by the fewest edges that stay within epsilon of them."""
+        neighbors = {node: set() for node in nodes}
+        for a, b in edges:
+            neighbors[a].add(b)
+            neighbors[b].add(a)
+
+        junctions = [node for node in nodes if len(neighbors[node]) != 2]
+        # Pure cycles have no junction; root each at its lowest node once the other chains are walked
+        cycle_roots = sorted(node for node in nodes if len(neighbors[node]) == 2)
+
+        new_nodes = {}
+        new_edges = {}
+        visited = set()
+
+        def edge_key(a, b):
+            return (a, b) if a < b else (b, a)
+
+        def walk(start, first_step, stops):
+            chain = [start]
+            previous, current = start, first_step
+            while current not in stops and current != start:
+                chain.append(current)
+                a, b = neighbors[current]
+                previous, current = current, (b if a == previous else a)
+            chain.append(current)
+            return chain
+
+        def add_chain(chain):
+            for a, b in zip(chain, chain[1:]):
+                visited.add(edge_key(a, b))
+
+            keep = np.flatnonzero(simplify_polyline(self.xy[chain], epsilon))
+            for index in keep:
+                new_nodes.setdefault(chain[index], list(nodes[chain[index]]))
+
+            for first, last in zip(keep, keep[1:]):
+                members = []
+                for index in range(first, last):
+                    members.extend(edges[edge_key(chain[index], chain[index + 1])])
+                    if index > first:
+                        members.extend(nodes[chain[index]])
+
+                a, b = chain[first], chain[last]
+                if a == b:
+                    new_nodes[a].extend(members)
+                else:
+                    new_edges.setdefault(edge_key(a, b), []).extend(members)
+
+        stops = set(junctions)
+        for start in junctions:
+            new_nodes.setdefault(start, list(nodes[start]))
+            for first_step in sorted(neighbors[start]):
+                if edge_key(start, first_step) not in visited:
+                    add_chain(walk(start, first_step, stops))
+
+        for start in cycle_roots:
+            first_step = min(neighbors[start])
+            if edge_key(start, first_step) not in visited:
+                stops.add(start)
+                add_chain(walk(start, first_step, stops))
+
+        return new_nodes, new_edges
+
+    def _cluster(self, nodes, edges, cell_size):
+        """Merge the nodes in each grid cell into the member closest to their member-weighted centroid."""
+        rows = np.fromiter(nodes, dtype=np.int64, count=len(nodes))
+        weights = np.fromiter((len(nodes[row]) for row in rows), dtype=np.float64, count=len(rows))
+        xy = self.xy[rows]
+
+        _, group = np.unique(np.floor(xy / cell_size).astype(np.int64), axis=0, return_inverse=True)
+        group = group.reshape(-1)
+        group_weight = np.bincount(group, weights)
+        centroids = np.stack(
+            [
+                np.bincount(group, weights * xy[:, 0]) / group_weight,
+                np.bincount(group, weights * xy[:, 1]) / group_weight,
+            ],
+            axis=1,
+        )
+        distances = np.linalg.norm(xy - centroids[group], axis=1)
+
+        # Sort by group, then distance to the centroid, so each group's first entry is its representative
+        order = np.lexsort((distances, group))
+        is_first = np.ones(len(order), dtype=bool)
+        is_first[1:] = group[order][1:] != group[order][:-1]
+        representative_of_group = np.empty(group_weight.shape[0], dtype=np.int64)
+        representative_of_group[group[order][is_first]] = rows[order][is_first]
+        representative = dict(zip(rows.tolist(), representative_of_group[group].tolist()))
+
+        new_nodes = {}
+        for row in rows[order].tolist():
+            new_nodes.setdefault(representative[row], []).extend(nodes[row])
+
+        new_edges = {}
+        for (a, b), members in edges.items():
+            a, b = representative[a], representative[b]
+            if a == b:
+                new_nodes[a].extend(members)
+            else:
+                new_edges.setdefault((a, b) if a < b else (b, a), []).extend(members)
+
+        return new_nodes, new_edges
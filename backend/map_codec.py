@@ -0,0 +1,166 @@
+import json
+import struct
+
+import numpy as np
+
+# Binary /api/map layout, all little-endian:
+#
+#   "SPMB" | uint32 version | uint32 header length | header JSON | sections, each aligned to 8 bytes
+#
+# The header holds the top-level map fields ("map"), the item "counts" and each section's [dtype, byte offset,
+# length]. Waypoints, plus any edge endpoints outside a requested bbox, form one table of points whose first
+# counts["waypoints"] rows are the waypoints in JSON response order; edges reference points by row. Strings are
+# stored once in a NUL-separated table and referenced by index, and lists per item (objects, LOD members) are
+# an offsets array of length n + 1 into one flat array.
+MAGIC = b"SPMB"
+FORMAT_VERSION = 1
+MIME_TYPE = "application/vnd.spot-map"
+
+_PREAMBLE = struct.Struct("<4sII")
+_ALIGNMENT = 8
+_DTYPES = {"float32": "<f4", "uint32": "<u4", "uint8": "u1"}
+
+
+class _StringTable:
+    def __init__(self):
+        self.index = {}
+
+    def add(self, string):
+        string = (string or "").replace("\0", "")
+        position = self.index.get(string)
+        if position is None:
+            position = self.index[string] = len(self.index)
+        return position
+
+    def encode(self):
+        return "\0".join(self.index).encode("utf-8")
+
+
+class _ListColumn:
+    """A list per item stored as offsets into one flat array of string indices."""
+
+    def __init__(self):
+        self.offsets = [0]
+        self.values = []
+
+    def append(self, strings, table):
+        self.values.extend(table.add(string) for string in strings)
+        self.offsets.append(len(self.values))
+
+
+def encode_map(records):
+    """Encode the ``(kind, record)`` pairs of ``SpotMapAPI.iter_map_data`` in the binary map format."""
+    strings = _StringTable()
+    fields = {}
+    point_rows = {}
+    positions, point_ids = [], []
+    labels, snapshot_ids, has_images = [], [], []
+    waypoint_objects, waypoint_members = _ListColumn(), _ListColumn()
+    edge_points, edge_members = [], _ListColumn()
+    object_positions, object_ids, object_types = [], [], []
+
+    def point(point_id, position):
+        row = point_rows.get(point_id)
+        if row is None:
+            row = point_rows[point_id] = len(point_ids)
+            point_ids.append(strings.add(point_id))
+            positions.append(position)
+        return row
+
+    for kind, record in records:
+        if kind == "map":
+            fields = record
+        elif kind == "waypoint":
+            point(record["id"], record["position"])
+            labels.append(strings.add(record["label"]))
+            snapshot_ids.append(strings.add(record["snapshot_id"]))
+            has_images.append(record["has_images"])
+            waypoint_objects.append(record.get("objects", []), strings)
+            waypoint_members.append(record.get("members", []), strings)
+        elif kind == "edge":
+            # Endpoints outside a bbox are not waypoints of the response; they are appended as extra points
+            edge_points.append(point(record["from_id"], record["from_position"]))
+            edge_points.append(point(record["to_id"], record["to_position"]))
+            edge_members.append(record.get("members", []), strings)
+        elif kind == "object":
+            object_positions.append(record["position"])
+            object_ids.append(strings.add(record["id"]))
+            object_types.append(strings.add(record["type"]))
+
+    sections = {
+        "positions": np.asarray(positions, dtype=np.float32).reshape(-1),
+        "point_ids": np.asarray(point_ids, dtype=np.uint32),
+        "waypoint_labels": np.asarray(labels, dtype=np.uint32),
+        "waypoint_snapshot_ids": np.asarray(snapshot_ids, dtype=np.uint32),
+        "waypoint_has_images": np.asarray(has_images, dtype=np.uint8),
+        "waypoint_object_offsets": np.asarray(waypoint_objects.offsets, dtype=np.uint32),
+        "waypoint_objects": np.asarray(waypoint_objects.values, dtype=np.uint32),
+        "edge_points": np.asarray(edge_points, dtype=np.uint32),
+        "object_positions": np.asarray(object_positions, dtype=np.float32).reshape(-1),
+        "object_ids": np.asarray(object_ids, dtype=np.uint32),
+        "object_types": np.asarray(object_types, dtype=np.uint32),
+    }
+    if "lod" in fields:
+        sections["waypoint_member_offsets"] = np.asarray(waypoint_members.offsets, dtype=np.uint32)
+        sections["waypoint_members"] = np.asarray(waypoint_members.values, dtype=np.uint32)
+        sections["edge_member_offsets"] = np.asarray(edge_members.offsets, dtype=np.uint32)
+        sections["edge_members"] = np.asarray(edge_members.values, dtype=np.uint32)
+    sections["strings"] = np.frombuffer(strings.encode(), dtype=np.uint8)
+
+    counts = {
+        "waypoints": len(labels),
+        "points": len(point_ids),
+        "edges": len(edge_points) // 2,
+        "objects": len(object_ids),
+        "strings": len(strings.index),
+    }
+    return _pack(fields, counts, sections)
+
+
+def _pack(fields, counts, sections):
+    dtype_names = {np.dtype(dtype): name for name, dtype in _DTYPES.items()}
+
+    # Section offsets depend on the header length, which depends on the offsets; lay out the sections relative
+    # to the end of the header first, then shift them once the header size is known
+    layout = {}
+    size = 0
+    for name, array in sections.items():
+        layout[name] = [dtype_names[array.dtype], size, int(array.size)]
+        size += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+
+    header_length = 0
+    while True:
+        start = -(-(_PREAMBLE.size + header_length) // _ALIGNMENT) * _ALIGNMENT
+        shifted = {name: [dtype, offset + start, length] for name, (dtype, offset, length) in layout.items()}
+        header = json.dumps({"map": fields, "counts": counts, "sections": shifted}, separators=(",", ":"))
+        header = header.encode("utf-8")
+        if len(header) == header_length:
+            break
+        header_length = len(header)
+
+    buffer = bytearray(start + size)
+    _PREAMBLE.pack_into(buffer, 0, MAGIC, FORMAT_VERSION, header_length)
+    buffer[_PREAMBLE.size : _PREAMBLE.size + header_length] = header
+    for name, array in sections.items():
+        offset = shifted[name][1]
+        buffer[offset : offset + array.nbytes] = array.tobytes()
+    return bytes(buffer)
+
+
+def read_header(data):
+    """Return the decoded header of a binary map, raising ValueError if data is not one."""
+    magic, version, header_length = _PREAMBLE.unpack_from(data, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Not a binary map in a supported format version")
+    return json.loads(bytes(data[_PREAMBLE.size : _PREAMBLE.size + header_length]).decode("utf-8"))
+
+
+def decode_map(data):
+    """Decode a binary map into its header and a dict of NumPy arrays (views into data), plus the string table."""
+    header = read_header(data)
+    arrays = {
+        name: np.frombuffer(data, dtype=_DTYPES[dtype], count=length, offset=offset)
+        for name, (dtype, offset, length) in header["sections"].items()
+    }
+    strings = bytes(arrays.pop("strings")).decode("utf-8").split("\0")
+    return header, arrays, strings
@@ -0,0 +1,112 @@
+import logging
+import os
+import threading
+from collections import namedtuple
+
+from parallel_loader import is_metadata_file
+
+logger = logging.getLogger(__name__)
+
+# What changed between two scans. ``graph`` and ``labels`` are flags for the graph file and the label journal; the
+# other fields are sets of file names in the snapshot and RAG folders.
+MapChanges = namedtuple("MapChanges", ["graph", "labels", "snapshots", "rag_changed", "rag_removed"])
+
+
+def file_stat(path):
+    """Return ``(size, mtime_ns)`` of a file, or None if it doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def scan_dir(directory, predicate=None):
+    """Map the name of each file in a directory (accepted by predicate) to its ``(size, mtime_ns)``."""
+    files = {}
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if (predicate is None or predicate(entry.name)) and entry.is_file():
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        pass
+    return files
+
+
+class MapWatcher:
+    """Polls the map and RAG folders and reports changed files to ``on_change`` as ``MapChanges``.
+
+    A change is only reported once two consecutive scans agree, so files that are still being copied are not
+    picked up half-written. If ``on_change`` raises, the same changes are reported again on the next poll.
+    """
+
+    def __init__(self, graph_file_path, label_journal_path, snapshot_dir, rag_dir, on_change, interval=2.0):
+        self.graph_file_path = graph_file_path
+        self.label_journal_path = label_journal_path
+        self.snapshot_dir = snapshot_dir
+        self.rag_dir = rag_dir
+        self.on_change = on_change
+        self.interval = interval
+
+        self._state = self.scan()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def scan(self):
+        return {
+            "graph": file_stat(self.graph_file_path),
+            "labels": file_stat(self.label_journal_path),
+            "snapshots": scan_dir(self.snapshot_dir),
+            "rag": scan_dir(self.rag_dir, is_metadata_file),
+        }
+
+    @staticmethod
+    def _changed_files(old, new):
+        return {name for name, stat in new.items() if old.get(name) != stat}
+
+    def changes(self, old, new):
+        """Return the ``MapChanges`` between two scans, or None if nothing changed."""
+        if old == new:
+            return None
+
+        snapshots = self._changed_files(old["snapshots"], new["snapshots"])
+        snapshots.update(old["snapshots"].keys() - new["snapshots"].keys())
+        return MapChanges(
+            graph=old["graph"] != new["graph"],
+            labels=old["labels"] != new["labels"],
+            snapshots=snapshots,
+            rag_changed=self._changed_files(old["rag"], new["rag"]),
+            rag_removed=set(old["rag"].keys() - new["rag"].keys()),
+        )
+
+    def start(self):
+        """Start polling in a background thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="map-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+
+    def _run(self):
+        candidate = None
+        while not self._stop.wait(self.interval):
+            scan = self.scan()
+            if scan == self._state:
+                candidate = None
+                continue
+            if scan != candidate:
+                # Wait for the files to stop changing before reloading them
+                candidate = scan
+                continue
+
+            try:
+                self.on_change(self.changes(self._state, scan))
+                self._state = scan
+            except Exception:
+                logger.exception("Error reloading map data")
+            candidate = None
@@ -0,0 +1,145 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds of the duration histogram buckets
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Metrics:
+    """Thread-safe registry of counters, histograms and gauges, rendered in the Prometheus text format.
+
+    Counters and histograms are created on first use, keyed by name and labels, so instrumented code doesn't
+    have to declare them; ``describe`` adds their HELP text. Gauges are functions evaluated at render time.
+    Values are per process: behind several server workers, each scrape reports the worker that served it.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        """Add value to a counter."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Record one observation, e.g. a duration in seconds, in a histogram."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                # One count per bucket, then the sum and the total count
+                state = series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the duration of a with block in a histogram."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def gauge(self, name, function, help_text=None, label=None):
+        """Register a gauge whose value is read by calling function when the metrics are rendered.
+
+        function returns a number, None to omit the gauge, or with ``label`` set, a dict mapping values of
+        that label to numbers.
+        """
+        self._gauges[name] = (function, label)
+        if help_text:
+            self.describe(name, help_text)
+
+    def _gauge_samples(self, function, label):
+        try:
+            value = function()
+        except Exception:
+            return []
+        if value is None:
+            return []
+        if label is None:
+            return [((), value)]
+        return [(((label, key),), v) for key, v in value.items()]
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {k: list(v) for k, v in series.items()} for name, series in self._histograms.items()}
+        lines = []
+
+        def header(name, kind):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for name in sorted(counters):
+            header(name, "counter")
+            for labels, value in sorted(counters[name].items()):
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for name in sorted(histograms):
+            header(name, "histogram")
+            for labels, state in sorted(histograms[name].items()):
+                for bound, count in zip(self.buckets + (math.inf,), state[:-2] + [state[-1]]):
+                    bucket_labels = labels + (("le", _format_value(float(bound))),)
+                    lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(state[-2])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {state[-1]}")
+
+        for name in sorted(self._gauges):
+            samples = self._gauge_samples(*self._gauges[name])
+            if not samples:
+                continue
+            header(name, "gauge")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def resident_memory_bytes():
+    """Current resident set size of this process, or None where /proc isn't available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# Registry shared by the whole server process
+METRICS = Metrics()
+METRICS.gauge("process_resident_memory_bytes", resident_memory_bytes, "Resident memory size in bytes")
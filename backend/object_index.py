@@ -0,0 +1,122 @@
+import re
+
+
+def _singular(word):
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("lves"):
+        return word[:-3] + "f"
+    if word.endswith(("ches", "shes", "sses", "xes", "zes")):
+        return word[:-2]
+    if len(word) > 2 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def normalize_object_name(text):
+    """Reduce an object name to its indexed form: case-folded and singular, without articles or extra whitespace."""
+    if not text:
+        return ""
+    words = re.sub(r"\b(a|an|the)\b", " ", text.casefold()).split()
+    return " ".join(_singular(word) for word in words)
+
+
+class ObjectIndex:
+    """Inverted index from normalized object names to the waypoints and views that see them.
+
+    Built once from the RAG annotations. ``postings`` maps each object to ``{waypoint_id: {view: count}}``
+    and ``waypoint_objects`` maps each annotated waypoint to its unique objects in first-seen order.
+    """
+
+    def __init__(self, waypoint_annotations, normalize):
+        self.normalize = normalize
+        self.postings = {}
+        self.waypoint_objects = {}
+
+        for waypoint_id, ann in waypoint_annotations.items():
+            self.add_waypoint(waypoint_id, ann)
+
+    @classmethod
+    def from_postings(cls, postings, waypoint_objects, normalize):
+        """Rebuild an index from the ``postings`` and ``waypoint_objects`` of a previously built one."""
+        index = cls({}, normalize)
+        index.postings = postings
+        index.waypoint_objects = waypoint_objects
+        return index
+
+    def add_waypoint(self, waypoint_id, ann):
+        """Index the visible objects of one waypoint annotation."""
+        objects = {}
+        for view_type, view_data in ann.get("views", {}).items():
+            for obj in view_data.get("visible_objects", []):
+                clean_obj = self.normalize(obj)
+                objects.setdefault(clean_obj, None)
+                views = self.postings.setdefault(clean_obj, {}).setdefault(waypoint_id, {})
+                views[view_type] = views.get(view_type, 0) + 1
+
+        self.waypoint_objects[waypoint_id] = list(objects)
+
+    def updated(self, waypoint_annotations, waypoint_ids):
+        """Return a new index with the given waypoints re-indexed from waypoint_annotations.
+
+        Waypoints missing from waypoint_annotations are dropped. This index is left unchanged and shares every
+        posting the update doesn't touch with the new one, so it can keep serving queries in the meantime.
+        """
+        index = ObjectIndex.from_postings(dict(self.postings), dict(self.waypoint_objects), self.normalize)
+        copied = set()
+
+        def own(obj):
+            # Copy a posting before its first change so the shared one stays intact
+            if obj not in copied and obj in index.postings:
+                index.postings[obj] = dict(index.postings[obj])
+            copied.add(obj)
+
+        for waypoint_id in waypoint_ids:
+            for obj in index.waypoint_objects.pop(waypoint_id, []):
+                own(obj)
+                index.postings[obj].pop(waypoint_id, None)
+                if not index.postings[obj]:
+                    del index.postings[obj]
+
+            ann = waypoint_annotations.get(waypoint_id)
+            if ann is not None:
+                for view_data in ann.get("views", {}).values():
+                    for obj in view_data.get("visible_objects", []):
+                        own(self.normalize(obj))
+                index.add_waypoint(waypoint_id, ann)
+
+        return index
+
+    @property
+    def objects(self):
+        """All indexed object names, sorted."""
+        return sorted(self.postings)
+
+    def resolve(self, name):
+        """Map a query name to its indexed form, or None if no waypoint sees it."""
+        if name in self.postings:
+            return name
+
+        clean_name = self.normalize(name)
+        return clean_name if clean_name in self.postings else None
+
+    def waypoints(self, name):
+        """Return ``{waypoint_id: {view: count}}`` for an object, empty if it is unknown."""
+        resolved = self.resolve(name)
+        return self.postings[resolved] if resolved is not None else {}
+
+    def query(self, names, mode="or"):
+        """Return the set of waypoint ids that see all (``mode="and"``) or any (``mode="or"``) of the objects."""
+        if mode not in ("and", "or"):
+            raise ValueError(f"Unknown query mode: {mode}")
+
+        waypoint_sets = [set(self.waypoints(name)) for name in names]
+        if not waypoint_sets:
+            return set()
+
+        if mode == "and":
+            # Intersect starting from the rarest object to keep intermediate sets small
+            waypoint_sets.sort(key=len)
+            return set.intersection(*waypoint_sets)
+
+        return set.union(*waypoint_sets)
@@ -0,0 +1,90 @@
+import json
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+# Below this many metadata files, process start-up costs more than parsing them serially. Spawned workers
+# start a fresh interpreter, which takes a few tenths of a second.
+MIN_FILES_FOR_PROCESS_POOL = 10000
+
+
+def is_metadata_file(filename):
+    """Whether a file in the RAG folder holds the annotation of one waypoint."""
+    return filename.startswith("metadata_") and filename.endswith(".json")
+
+
+def load_metadata_files(paths):
+    """Parse RAG ``metadata_*.json`` files, returning ``(path, waypoint_id, metadata)`` for those with an id.
+
+    Runs in worker processes, so it only depends on the standard library.
+    """
+    annotations = []
+    for path in paths:
+        with open(path) as f:
+            metadata = json.load(f)
+        waypoint_id = metadata.get("waypoint_id")
+        if waypoint_id:
+            annotations.append((path, waypoint_id, metadata))
+
+    return annotations
+
+
+def load_metadata_files_parallel(paths, workers):
+    """Parse metadata files across ``workers`` processes, preserving the order of paths."""
+    if workers <= 1 or len(paths) < MIN_FILES_FOR_PROCESS_POOL:
+        return load_metadata_files(paths)
+
+    # A few chunks per worker keeps them busy without paying per-file IPC
+    chunk_size = max(1, len(paths) // (workers * 4))
+    chunks = [paths[i : i + chunk_size] for i in range(0, len(paths), chunk_size)]
+
+    annotations = []
+    # Loading runs alongside other threads (transform computation, the map watcher, requests); spawned workers are
+    # safe to start from a multithreaded process, unlike forked ones, which can inherit a lock another thread holds
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        for chunk_annotations in executor.map(load_metadata_files, chunks):
+            annotations.extend(chunk_annotations)
+
+    return annotations
+
+
+class PhaseTimer:
+    """Thread-safe record of how long each named start-up phase took, in seconds.
+
+    Phases may run concurrently, so their durations can add up to more than the wall-clock ``total``.
+    """
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._timings = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._timings[name] = time.perf_counter() - start
+
+    def timed(self, name, func, *args, **kwargs):
+        """Call func, recording its duration under name. Useful for work submitted to an executor."""
+        with self.phase(name):
+            return func(*args, **kwargs)
+
+    def finish(self):
+        """Record the wall-clock time since the timer was created as ``total``."""
+        with self._lock:
+            self._timings["total"] = time.perf_counter() - self._start
+
+    def as_dict(self):
+        with self._lock:
+            return {name: round(seconds, 4) for name, seconds in self._timings.items()}
+
+    def summary(self):
+        return ", ".join(f"{name}={seconds:.3f}s" for name, seconds in self.as_dict().items())
@@ -0,0 +1,72 @@
+import numpy as np
+
+
+def se3_matrices(poses):
+    """Convert an iterable of ``SE3Pose`` protos to an (N, 4, 4) array of homogeneous transforms."""
+    values = np.array(
+        [
+            (p.position.x, p.position.y, p.position.z, p.rotation.w, p.rotation.x, p.rotation.y, p.rotation.z)
+            for p in poses
+        ],
+        dtype=np.float64,
+    ).reshape(-1, 7)
+
+    # Normalize so protos with slightly denormalized quaternions still yield rotations
+    quats = values[:, 3:]
+    norms = np.linalg.norm(quats, axis=1, keepdims=True)
+    quats = np.divide(quats, norms, out=np.tile([1.0, 0.0, 0.0, 0.0], (len(quats), 1)), where=norms > 0)
+    w, x, y, z = quats.T
+
+    matrices = np.zeros((len(values), 4, 4))
+    matrices[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    matrices[:, 0, 1] = 2 * (x * y - z * w)
+    matrices[:, 0, 2] = 2 * (x * z + y * w)
+    matrices[:, 1, 0] = 2 * (x * y + z * w)
+    matrices[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    matrices[:, 1, 2] = 2 * (y * z - x * w)
+    matrices[:, 2, 0] = 2 * (x * z - y * w)
+    matrices[:, 2, 1] = 2 * (y * z + x * w)
+    matrices[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    matrices[:, :3, 3] = values[:, :3]
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+
+def invert_se3(matrices):
+    """Invert an (N, 4, 4) array of rigid transforms without a general matrix inverse."""
+    rotations_t = np.transpose(matrices[:, :3, :3], (0, 2, 1))
+    inverses = np.zeros_like(matrices)
+    inverses[:, :3, :3] = rotations_t
+    inverses[:, :3, 3] = -np.einsum("nij,nj->ni", rotations_t, matrices[:, :3, 3])
+    inverses[:, 3, 3] = 1.0
+    return inverses
+
+
+class PoseTable:
+    """Poses of a set of ids as one (N, 4, 4) array plus an id -> row index, read like a dict of matrices."""
+
+    def __init__(self, ids, matrices):
+        self.ids = list(ids)
+        self.index = {pose_id: row for row, pose_id in enumerate(self.ids)}
+        self.matrices = np.ascontiguousarray(matrices, dtype=np.float64).reshape(len(self.ids), 4, 4)
+        self.positions = np.ascontiguousarray(self.matrices[:, :3, 3])
+
+    def __contains__(self, pose_id):
+        return pose_id in self.index
+
+    def __getitem__(self, pose_id):
+        return self.matrices[self.index[pose_id]]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def get(self, pose_id, default=None):
+        row = self.index.get(pose_id)
+        return default if row is None else self.matrices[row]
+
+    def rows(self, pose_ids):
+        """Return the row of each id as an int array, with -1 for ids not in the table."""
+        return np.fromiter((self.index.get(pose_id, -1) for pose_id in pose_ids), dtype=np.int64)
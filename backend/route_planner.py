@@ -0,0 +1,156 @@
+import copy
+import heapq
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from metrics import METRICS
+
+
+class RoutePlanner:
+    """Shortest routes over the waypoint graph, with each edge weighted by the length of its transform.
+
+    The weighted adjacency is built once per graph geometry. Routes to one waypoint are found with A*, using the
+    straight-line distance between global waypoint positions as the heuristic; routes to the nearest of several
+    waypoints with Dijkstra, stopping at the first one reached. Results are memoized in an LRU of ``memo_size``
+    entries. A changed graph gets a new planner, which discards the memo. When only the waypoints a ``nearest``
+    query stands for change, e.g. the objects they see, ``with_empty_memo`` discards it as well.
+    """
+
+    def __init__(self, waypoint_ids, adjacency, edge_transforms, positions, memo_size=4096):
+        """Build the planner from the edge index of ``SpotMapAPI.build_edge_index``.
+
+        positions holds the global position of each waypoint, in waypoint_ids order.
+        """
+        self.waypoint_ids = list(waypoint_ids)
+        self.rows = {waypoint_id: row for row, waypoint_id in enumerate(self.waypoint_ids)}
+        self.positions = [tuple(position) for position in np.asarray(positions, dtype=float).tolist()]
+        lengths = np.linalg.norm(edge_transforms[:, 0, :3, 3], axis=1).tolist() if len(edge_transforms) else []
+
+        # (neighbor_row, length) per waypoint row; edges can be walked in both directions
+        self.neighbors = [
+            [(self.rows[neighbor_id], lengths[edge_index]) for neighbor_id, edge_index, _ in adjacency.get(w, ())]
+            for w in self.waypoint_ids
+        ]
+
+        # Positions are chained along a spanning tree, so the edges outside it can be shorter than the distance
+        # between their endpoints. Scaling the heuristic by the smallest ratio of the two keeps it consistent.
+        self.heuristic_scale = 1.0
+        for row, edges in enumerate(self.neighbors):
+            for neighbor, length in edges:
+                distance = math.dist(self.positions[row], self.positions[neighbor])
+                if distance > 0:
+                    self.heuristic_scale = min(self.heuristic_scale, length / distance)
+
+        self.memo_size = memo_size
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    def with_empty_memo(self):
+        """Return a planner over the same graph that shares its adjacency but none of its memoized routes."""
+        planner = copy.copy(self)
+        planner._memo = OrderedDict()
+        planner._lock = threading.Lock()
+        return planner
+
+    def _memoized(self, key, search):
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                METRICS.inc("spot_map_cache_requests_total", cache="route", result="hit")
+                return self._memo[key]
+
+        METRICS.inc("spot_map_cache_requests_total", cache="route", result="miss")
+        with METRICS.timer("spot_map_phase_duration_seconds", phase="route_search"):
+            result = search()
+        with self._lock:
+            self._memo[key] = result
+            if len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return result
+
+    def _route(self, previous, row, cost):
+        rows = []
+        while row is not None:
+            rows.append(row)
+            row = previous[row]
+        return cost, [self.waypoint_ids[row] for row in reversed(rows)]
+
+    def shortest_path(self, source_id, target_id):
+        """Return ``(distance, waypoint_ids)`` of the shortest route, or None if target_id can't be reached.
+
+        Raises KeyError for an unknown waypoint.
+        """
+        source, target = self.rows[source_id], self.rows[target_id]
+        # Routes are the same in both directions, so both share one memo entry
+        key = (min(source, target), max(source, target))
+        result = self._memoized(key, lambda: self._a_star(*key))
+        if result is None or source == key[0]:
+            return result
+        distance, waypoint_ids = result
+        return distance, waypoint_ids[::-1]
+
+    def nearest(self, source_id, query, find_targets):
+        """Return ``(distance, waypoint_ids)`` of the shortest route to the closest waypoint find_targets returns.
+
+        Routes are memoized by source and ``query``, a hashable description of the targets such as the object names
+        they see, so find_targets is only called when a route is searched. Unknown target ids are ignored. Returns
+        None if none of the targets can be reached.
+        """
+        source = self.rows[source_id]
+
+        def search():
+            targets = {self.rows[w] for w in find_targets() if w in self.rows}
+            return self._dijkstra(source, targets) if targets else None
+
+        return self._memoized((source, query), search)
+
+    def _a_star(self, source, target):
+        positions, scale = self.positions, self.heuristic_scale
+        target_position = positions[target]
+        costs = {source: 0.0}
+        previous = {source: None}
+        heap = [(scale * math.dist(positions[source], target_position), 0.0, source)]
+        done = set()
+
+        while heap:
+            _, cost, row = heapq.heappop(heap)
+            if row == target:
+                return self._route(previous, row, cost)
+            if row in done:
+                continue
+            done.add(row)
+
+            for neighbor, length in self.neighbors[row]:
+                neighbor_cost = cost + length
+                if neighbor_cost < costs.get(neighbor, math.inf):
+                    costs[neighbor] = neighbor_cost
+                    previous[neighbor] = row
+                    estimate = neighbor_cost + scale * math.dist(positions[neighbor], target_position)
+                    heapq.heappush(heap, (estimate, neighbor_cost, neighbor))
+
+        return None
+
+    def _dijkstra(self, source, targets):
+        costs = {source: 0.0}
+        previous = {source: None}
+        heap = [(0.0, source)]
+        done = set()
+
+        while heap:
+            cost, row = heapq.heappop(heap)
+            if row in targets:
+                return self._route(previous, row, cost)
+            if row in done:
+                continue
+            done.add(row)
+
+            for neighbor, length in self.neighbors[row]:
+                neighbor_cost = cost + length
+                if neighbor_cost < costs.get(neighbor, math.inf):
+                    costs[neighbor] = neighbor_cost
+                    previous[neighbor] = row
+                    heapq.heappush(heap, (neighbor_cost, neighbor))
+
+        return None
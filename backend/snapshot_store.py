@@ -0,0 +1,131 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from bosdyn.api.graph_nav import map_pb2
+from metrics import METRICS
+
+
+class SnapshotStore:
+    """Waypoint snapshot files indexed by id, parsed on first use and kept in an LRU of at most max_bytes."""
+
+    def __init__(self, snapshot_dir, snapshot_ids, max_bytes=512 * 1024 * 1024):
+        self.snapshot_dir = snapshot_dir
+        self.max_bytes = max_bytes
+        self._index = self._build_index(snapshot_dir, snapshot_ids)
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _build_index(snapshot_dir, snapshot_ids):
+        """Map each referenced snapshot id to its file path, size and modification time without reading it."""
+        wanted = set(snapshot_ids)
+        index = {}
+        if not wanted or not os.path.isdir(snapshot_dir):
+            return index
+
+        with os.scandir(snapshot_dir) as entries:
+            for entry in entries:
+                if entry.name in wanted and entry.is_file():
+                    stat = entry.stat()
+                    index[entry.name] = (entry.path, stat.st_size, stat.st_mtime_ns)
+
+        return index
+
+    def __contains__(self, snapshot_id):
+        return snapshot_id in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return iter(self._index)
+
+    @property
+    def loaded_count(self):
+        """Number of snapshots currently parsed and held in memory."""
+        return len(self._cache)
+
+    @property
+    def loaded_bytes(self):
+        """Serialized size of the snapshots currently held in memory."""
+        return self._cache_bytes
+
+    def version(self, snapshot_id):
+        """Return a string that changes whenever the snapshot file is rewritten, or None if it is unknown."""
+        entry = self._index.get(snapshot_id)
+        return None if entry is None else f"{entry[1]:x}-{entry[2]:x}"
+
+    def get(self, snapshot_id):
+        """Return the parsed snapshot, loading it from disk if needed, or None if unknown."""
+        if snapshot_id not in self._index:
+            return None
+
+        with self._lock:
+            snapshot = self._cache.get(snapshot_id)
+            if snapshot is not None:
+                self._cache.move_to_end(snapshot_id)
+                METRICS.inc("spot_map_cache_requests_total", cache="snapshot", result="hit")
+                return snapshot
+
+        METRICS.inc("spot_map_cache_requests_total", cache="snapshot", result="miss")
+        path, size, _ = self._index[snapshot_id]
+        with METRICS.timer("spot_map_phase_duration_seconds", phase="snapshot_parse"):
+            with open(path, "rb") as f:
+                snapshot = map_pb2.WaypointSnapshot()
+                snapshot.ParseFromString(f.read())
+
+        with self._lock:
+            if snapshot_id not in self._cache:
+                self._cache[snapshot_id] = snapshot
+                self._cache_bytes += size
+                self._evict()
+            return self._cache.get(snapshot_id, snapshot)
+
+    def _evict(self):
+        """Drop least recently used snapshots until the cache fits in max_bytes, always keeping the newest one."""
+        while self._cache_bytes > self.max_bytes and len(self._cache) > 1:
+            snapshot_id, _ = self._cache.popitem(last=False)
+            self._cache_bytes -= self._index[snapshot_id][1]
+
+    def preload(self, snapshot_ids=None, workers=1):
+        """Parse snapshots in order until the memory budget is full, returning how many were loaded."""
+        selected = []
+        budget = self.max_bytes
+        for snapshot_id in self._index if snapshot_ids is None else snapshot_ids:
+            if snapshot_id not in self._index:
+                continue
+            size = self._index[snapshot_id][1]
+            if size > budget:
+                break
+            selected.append(snapshot_id)
+            budget -= size
+
+        if workers <= 1:
+            for snapshot_id in selected:
+                self.get(snapshot_id)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(self.get, selected))
+
+        return len(selected)
+
+    def adopt(self, previous):
+        """Take over the parsed snapshots of an earlier store whose files haven't changed since it indexed them."""
+        with previous._lock:
+            snapshots = list(previous._cache.items())
+
+        with self._lock:
+            for snapshot_id, snapshot in snapshots:
+                if snapshot_id not in self._cache and self._index.get(snapshot_id) == previous._index.get(snapshot_id):
+                    self._cache[snapshot_id] = snapshot
+                    self._cache_bytes += self._index[snapshot_id][1]
+            self._evict()
+
+    def clear(self):
+        """Release all parsed snapshots."""
+        with self._lock:
+            self._cache.clear()
+            self._cache_bytes = 0
@@ -0,0 +1,88 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def segments_in_bbox(start, end, bbox):
+    """Return a mask of the 2D segments (start[i], end[i]) that intersect a box, by Liang-Barsky clipping."""
+    min_x, min_y, max_x, max_y = bbox
+    start = np.asarray(start, dtype=np.float64).reshape(-1, 2)
+    delta = np.asarray(end, dtype=np.float64).reshape(-1, 2) - start
+
+    t_enter = np.zeros(len(start))
+    t_exit = np.ones(len(start))
+    visible = np.ones(len(start), dtype=bool)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for p, q in (
+            (-delta[:, 0], start[:, 0] - min_x),
+            (delta[:, 0], max_x - start[:, 0]),
+            (-delta[:, 1], start[:, 1] - min_y),
+            (delta[:, 1], max_y - start[:, 1]),
+        ):
+            # Parallel to this boundary and outside it
+            visible &= ~((p == 0) & (q < 0))
+            t = q / p
+            t_enter = np.where(p < 0, np.maximum(t_enter, t), t_enter)
+            t_exit = np.where(p > 0, np.minimum(t_exit, t), t_exit)
+
+    return visible & (t_enter <= t_exit)
+
+
+class SpatialIndex:
+    """KD-tree over the XY waypoint positions of one coordinate frame, plus the edge endpoints in that frame.
+
+    Queries return rows of the underlying ``PoseTable``; edge queries return a boolean mask indexed like
+    the graph's edge list.
+    """
+
+    def __init__(self, poses, edge_ids):
+        self.poses = poses
+        self.xy = poses.positions[:, :2]
+        self.tree = cKDTree(self.xy) if len(poses) else None
+
+        # (E, 2) rows of each edge's endpoints, -1 where an endpoint has no pose in this frame
+        self.edge_rows = np.stack(
+            [poses.rows(from_id for from_id, _ in edge_ids), poses.rows(to_id for _, to_id in edge_ids)], axis=1
+        ).reshape(-1, 2)
+        self.edge_valid = np.all(self.edge_rows >= 0, axis=1)
+
+    def within_bbox(self, min_x, min_y, max_x, max_y):
+        """Return the sorted rows of waypoints inside an axis-aligned box."""
+        if self.tree is None:
+            return np.zeros(0, dtype=np.int64)
+
+        # Fetch candidates in the circumscribed circle, then keep the ones inside the box
+        center = ((min_x + max_x) / 2.0, (min_y + max_y) / 2.0)
+        radius = np.hypot(max_x - min_x, max_y - min_y) / 2.0
+        rows = np.asarray(self.tree.query_ball_point(center, radius), dtype=np.int64)
+        xy = self.xy[rows]
+        inside = (xy[:, 0] >= min_x) & (xy[:, 0] <= max_x) & (xy[:, 1] >= min_y) & (xy[:, 1] <= max_y)
+        return np.sort(rows[inside])
+
+    def nearest(self, x, y, k=1):
+        """Return ``(rows, distances)`` of the k waypoints closest to a point, nearest first."""
+        if self.tree is None or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        k = min(int(k), len(self.poses))
+        distances, rows = self.tree.query((x, y), k=k)
+        return np.atleast_1d(rows).astype(np.int64), np.atleast_1d(distances)
+
+    def within_radius(self, x, y, radius):
+        """Return ``(rows, distances)`` of the waypoints within radius of a point, nearest first."""
+        if self.tree is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        rows = np.asarray(self.tree.query_ball_point((x, y), radius), dtype=np.int64)
+        distances = np.hypot(self.xy[rows, 0] - x, self.xy[rows, 1] - y)
+        order = np.argsort(distances, kind="stable")
+        return rows[order], distances[order]
+
+    def edges_in_bbox(self, min_x, min_y, max_x, max_y):
+        """Return a mask of the edges whose segment intersects an axis-aligned box."""
+        if self.tree is None:
+            return np.zeros(len(self.edge_rows), dtype=bool)
+
+        start = self.xy[self.edge_rows[:, 0]]
+        end = self.xy[self.edge_rows[:, 1]]
+        return self.edge_valid & segments_in_bbox(start, end, (min_x, min_y, max_x, max_y))
@@ -0,0 +1,188 @@
+"""Generate synthetic GraphNav maps with snapshots and RAG annotations, for benchmarking.
+
+    python synthetic_map.py /tmp/synthetic_map --waypoints 10000
+
+writes ``<output>/map`` (``graph`` and ``waypoint_snapshots/``) and ``<output>/rag`` (one ``metadata_*.json`` per
+waypoint), laid out like a recorded map. The same arguments always produce the same files.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+
+import cv2
+import numpy as np
+from bosdyn.api import geometry_pb2, image_pb2
+from bosdyn.api.graph_nav import map_pb2
+
+# Bump when the generated files change, so that cached benchmark maps are regenerated
+GENERATOR_VERSION = 1
+
+# Cameras of a Spot waypoint snapshot
+IMAGE_SOURCES = (
+    "frontleft_fisheye_image",
+    "frontright_fisheye_image",
+    "left_fisheye_image",
+    "right_fisheye_image",
+    "back_fisheye_image",
+)
+
+# Object names for the RAG annotations, written with the articles and plurals the annotation text has
+OBJECT_NAMES = (
+    "a chair", "the chairs", "table", "the tables", "door", "doors", "a window", "plant", "the plants", "monitor",
+    "monitors", "a keyboard", "whiteboard", "a shelf", "the shelves", "trash can", "a fire extinguisher", "sofa",
+    "lamp", "a coffee machine", "the printer", "a cabinet", "boxes", "a robot", "stairs", "elevator", "a sink",
+    "the fridge", "microwave", "a bicycle", "backpack", "a laptop", "the cables", "a ladder", "exit sign",
+)  # fmt: skip
+
+# Distinct camera images encoded per map; snapshots reuse them so that generation stays fast
+IMAGE_VARIANTS = 8
+
+
+def _yaw_pose(x, y, z, yaw):
+    return geometry_pb2.SE3Pose(
+        position=geometry_pb2.Vec3(x=x, y=y, z=z),
+        rotation=geometry_pb2.Quaternion(w=math.cos(yaw / 2), x=0.0, y=0.0, z=math.sin(yaw / 2)),
+    )
+
+
+def _relative_pose(a, b):
+    """Pose of b in the frame of a, for planar poses ``(x, y, z, yaw)``."""
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    cos_yaw, sin_yaw = math.cos(a[3]), math.sin(a[3])
+    return _yaw_pose(cos_yaw * dx + sin_yaw * dy, -sin_yaw * dx + cos_yaw * dy, b[2] - a[2], b[3] - a[3])
+
+
+def _layout(waypoint_count, rng, spacing=1.5, loop_closure_rate=0.15):
+    """Lay waypoints out as a walk snaking through the rows of a grid, like a robot mapping a building floor.
+
+    Returns the planar pose of each waypoint and the edges as ``(from_index, to_index)``: the walk itself plus loop
+    closures between waypoints in neighboring rows.
+    """
+    columns = max(2, int(math.ceil(math.sqrt(waypoint_count))))
+    cells = []
+    for i in range(waypoint_count):
+        row, column = divmod(i, columns)
+        if row % 2:
+            column = columns - 1 - column
+        cells.append((row, column))
+
+    poses = []
+    for i, (row, column) in enumerate(cells):
+        x = column * spacing + rng.gauss(0, 0.1)
+        y = row * spacing + rng.gauss(0, 0.1)
+        if i + 1 < waypoint_count:
+            next_row, next_column = cells[i + 1]
+            yaw = math.atan2(next_row - row, next_column - column)
+        else:
+            yaw = poses[-1][3] if poses else 0.0
+        poses.append((x, y, rng.gauss(0, 0.02), yaw + rng.gauss(0, 0.05)))
+
+    edges = [(i, i + 1) for i in range(waypoint_count - 1)]
+    index = {cell: i for i, cell in enumerate(cells)}
+    for i, (row, column) in enumerate(cells):
+        below = index.get((row + 1, column))
+        if below is not None and below != i + 1 and rng.random() < loop_closure_rate:
+            edges.append((i, below))
+    return poses, edges
+
+
+def _camera_images(image_size, seed):
+    """JPEG-encode IMAGE_VARIANTS smooth greyscale images, which compress like real fisheye images do."""
+    rows, cols = image_size
+    random_state = np.random.RandomState(seed)
+    images = []
+    for _ in range(IMAGE_VARIANTS):
+        noise = random_state.rand(rows // 8, cols // 8).astype(np.float32)
+        image = cv2.resize(noise, (cols, rows), interpolation=cv2.INTER_CUBIC)
+        image = cv2.GaussianBlur(image, (0, 0), 2) * 200 + random_state.rand(rows, cols).astype(np.float32) * 6
+        _, jpeg = cv2.imencode(".jpg", np.clip(image, 0, 255).astype(np.uint8), [cv2.IMWRITE_JPEG_QUALITY, 80])
+        images.append(jpeg.tobytes())
+    return images
+
+
+def generate_map(output_dir, waypoint_count, seed=0, image_size=(480, 640), snapshot_ratio=1.0, fiducial_every=50):
+    """Write a synthetic map and RAG folder with waypoint_count waypoints to output_dir.
+
+    ``snapshot_ratio`` is the fraction of waypoints that get a snapshot, to keep large maps small on disk. Returns
+    ``(map_path, rag_path)``.
+    """
+    rng = random.Random(seed)
+    map_path = os.path.join(output_dir, "map")
+    rag_path = os.path.join(output_dir, "rag")
+    snapshot_dir = os.path.join(map_path, "waypoint_snapshots")
+    os.makedirs(snapshot_dir, exist_ok=True)
+    os.makedirs(rag_path, exist_ok=True)
+
+    poses, edges = _layout(waypoint_count, rng)
+    waypoint_ids = [f"waypoint-{i:06d}-{rng.getrandbits(32):08x}" for i in range(waypoint_count)]
+
+    graph = map_pb2.Graph()
+    has_snapshot = [rng.random() < snapshot_ratio for _ in range(waypoint_count)]
+    for i, waypoint_id in enumerate(waypoint_ids):
+        waypoint = graph.waypoints.add(id=waypoint_id)
+        waypoint.annotations.name = f"waypoint_{i}"
+        if has_snapshot[i]:
+            waypoint.snapshot_id = f"snapshot_{waypoint_id}"
+
+    for from_index, to_index in edges:
+        edge = graph.edges.add()
+        edge.id.from_waypoint = waypoint_ids[from_index]
+        edge.id.to_waypoint = waypoint_ids[to_index]
+        edge.from_tform_to.CopyFrom(_relative_pose(poses[from_index], poses[to_index]))
+
+    # Anchoring is the optimized map: the odometry poses with the drift corrected, modelled as small offsets
+    for waypoint_id, (x, y, z, yaw) in zip(waypoint_ids, poses):
+        anchor = graph.anchoring.anchors.add(id=waypoint_id)
+        anchor.seed_tform_waypoint.CopyFrom(
+            _yaw_pose(x + rng.gauss(0, 0.05), y + rng.gauss(0, 0.05), z, yaw + rng.gauss(0, 0.01))
+        )
+    for i in range(0, waypoint_count, fiducial_every):
+        x, y, z, yaw = poses[i]
+        world_object = graph.anchoring.objects.add(id=f"fiducial_{i // fiducial_every + 200}")
+        world_object.seed_tform_object.CopyFrom(_yaw_pose(x + 0.5, y, 0.5, yaw))
+
+    with open(os.path.join(map_path, "graph"), "wb") as f:
+        f.write(graph.SerializeToString())
+
+    images = _camera_images(image_size, seed)
+    for i, waypoint in enumerate(graph.waypoints):
+        if not waypoint.snapshot_id:
+            continue
+        snapshot = map_pb2.WaypointSnapshot(id=waypoint.snapshot_id)
+        for j, source in enumerate(IMAGE_SOURCES):
+            image_response = snapshot.images.add()
+            image_response.source.name = source
+            image = image_response.shot.image
+            image.rows, image.cols = image_size
+            image.format = image_pb2.Image.FORMAT_JPEG
+            image.pixel_format = image_pb2.Image.PIXEL_FORMAT_GREYSCALE_U8
+            image.data = images[(i + j) % len(images)]
+        with open(os.path.join(snapshot_dir, waypoint.snapshot_id), "wb") as f:
+            f.write(snapshot.SerializeToString())
+
+    # A few objects are seen everywhere and most rarely, as in real annotations
+    weights = [1.0 / (rank + 1) for rank in range(len(OBJECT_NAMES))]
+    for waypoint_id in waypoint_ids:
+        views = {}
+        for view in ("front", "left", "right", "back"):
+            views[view] = {"visible_objects": rng.choices(OBJECT_NAMES, weights, k=rng.randint(0, 4))}
+        with open(os.path.join(rag_path, f"metadata_{waypoint_id}.json"), "w") as f:
+            json.dump({"waypoint_id": waypoint_id, "views": views}, f)
+
+    return map_path, rag_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic GraphNav map and RAG folder")
+    parser.add_argument("output_dir", help="Folder to write map/ and rag/ into")
+    parser.add_argument("--waypoints", type=int, default=1000, help="Number of waypoints (default: 1000)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument(
+        "--snapshot-ratio", type=float, default=1.0, help="Fraction of waypoints with a snapshot (default: 1)"
+    )
+    args = parser.parse_args()
+
+    print(generate_map(args.output_dir, args.waypoints, args.seed, snapshot_ratio=args.snapshot_ratio))
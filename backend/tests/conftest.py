@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# The backend modules import each other by plain name, as when app.py is run from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def map_api(tmp_path):
+    """A SpotMapAPI over a small synthetic map without snapshots."""
+    from app import SpotMapAPI
+    from synthetic_map import generate_map
+
+    map_path, rag_path = generate_map(str(tmp_path / "map"), 12, snapshot_ratio=0.0)
+    api = SpotMapAPI(
+        map_path,
+        rag_path,
+        image_cache_dir=str(tmp_path / "images"),
+        derived_cache_dir=str(tmp_path / "derived"),
+        prefetch_workers=0,
+    )
+    yield api
+    api.close()
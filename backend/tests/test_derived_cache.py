@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+import pytest
+from derived_cache import DerivedCache, files_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DerivedCache(str(tmp_path / "cache"))
+
+
+def save_sample(cache, key="k1"):
+    arrays = {"positions": np.arange(12, dtype=np.float64).reshape(4, 3), "empty": np.zeros((0, 2))}
+    objects = {"ids": ["a", "b", "c", "d"], "labels": {"a": "kitchen"}}
+    assert cache.save("graph", key, arrays, objects)
+    return arrays, objects
+
+
+def test_round_trip(cache):
+    arrays, objects = save_sample(cache)
+    loaded_arrays, loaded_objects = cache.load("graph", "k1")
+
+    assert loaded_objects == objects
+    assert set(loaded_arrays) == set(arrays)
+    for name, array in arrays.items():
+        assert np.array_equal(loaded_arrays[name], array)
+        assert loaded_arrays[name].shape == array.shape
+    # Non-empty arrays are memory-mapped read-only
+    assert isinstance(loaded_arrays["positions"], np.memmap)
+    assert not loaded_arrays["positions"].flags.writeable
+
+
+def test_sections_are_independent(cache):
+    save_sample(cache)
+    cache.save("rag", "r1", {}, ["annotations"])
+    assert cache.load("rag", "r1") == ({}, ["annotations"])
+    assert cache.load("graph", "k1")[1]["ids"] == ["a", "b", "c", "d"]
+    assert cache.load("missing", "k1") is None
+
+
+def test_changed_key_invalidates(cache):
+    save_sample(cache)
+    assert cache.load("graph", "k2") is None
+
+    cache.save("graph", "k2", {"positions": np.ones((1, 3))}, {"ids": ["e"]})
+    assert cache.load("graph", "k1") is None
+    arrays, objects = cache.load("graph", "k2")
+    assert objects == {"ids": ["e"]}
+    assert arrays["positions"].tolist() == [[1.0, 1.0, 1.0]]
+
+
+def test_changed_version_invalidates(cache, monkeypatch):
+    import derived_cache
+
+    save_sample(cache)
+    monkeypatch.setattr(derived_cache, "CACHE_VERSION", derived_cache.CACHE_VERSION + 1)
+    assert cache.load("graph", "k1") is None
+
+
+@pytest.mark.parametrize("filename", ["objects.pickle", "positions.npy", "key.json"])
+def test_corrupt_file_falls_back(cache, filename):
+    save_sample(cache)
+    with open(os.path.join(cache.cache_dir, "graph", filename), "wb") as f:
+        f.write(b"\x80not what was saved")
+
+    assert cache.load("graph", "k1") is None
+    # The next save replaces the corrupt section
+    save_sample(cache)
+    assert cache.load("graph", "k1") is not None
+
+
+def test_missing_file_falls_back(cache):
+    save_sample(cache)
+    os.unlink(os.path.join(cache.cache_dir, "graph", "positions.npy"))
+    assert cache.load("graph", "k1") is None
+
+
+def test_unwritable_cache_dir(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    cache = DerivedCache(str(blocker / "cache"))
+    assert not cache.save("graph", "k1", {}, {})
+    assert cache.load("graph", "k1") is None
+
+
+def test_files_key_tracks_size_and_mtime(tmp_path):
+    paths = [str(tmp_path / "a.json"), str(tmp_path / "b.json")]
+    for path in paths:
+        with open(path, "w") as f:
+            f.write("{}")
+
+    key = files_key(paths)
+    assert files_key(reversed(paths)) == key
+
+    with open(paths[0], "w") as f:
+        f.write('{"waypoint_id": "w1"}')
+    assert files_key(paths) != key
+
+    key = files_key(paths)
+    stat = os.stat(paths[1])
+    os.utime(paths[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert files_key(paths) != key
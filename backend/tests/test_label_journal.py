@@ -0,0 +1,129 @@
+import json
+import os
+import time
+
+import pytest
+from label_journal import LabelJournal
+
+
+def rewrite_graph(graph_file_path):
+    """A rewrite_graph callback for a "graph" that is a JSON dict of labels by waypoint id."""
+
+    def rewrite(entries):
+        with open(graph_file_path) as f:
+            labels = json.load(f)
+        labels.update(entries)
+        return json.dumps(labels).encode("utf-8")
+
+    return rewrite
+
+
+@pytest.fixture
+def paths(tmp_path):
+    graph_file_path = str(tmp_path / "graph")
+    with open(graph_file_path, "w") as f:
+        json.dump({"a": "old a", "b": "old b"}, f)
+    return str(tmp_path / "graph_labels.jsonl"), graph_file_path
+
+
+def open_journal(paths, compact_delay=3600):
+    journal_path, graph_file_path = paths
+    return LabelJournal(journal_path, graph_file_path, rewrite_graph(graph_file_path), compact_delay)
+
+
+def write_lines(path, lines):
+    with open(path, "wb") as f:
+        f.write(b"".join(lines))
+
+
+def read_graph(paths):
+    with open(paths[1]) as f:
+        return json.load(f)
+
+
+def test_append_is_replayed_on_startup(paths):
+    journal = open_journal(paths)
+    journal.append([("a", "first"), ("b", "second")])
+    journal.append([("a", "third")])
+
+    assert LabelJournal.read(paths[0]) == [("a", "first"), ("b", "second"), ("a", "third")]
+    assert open_journal(paths).pending_count == 3
+
+
+def test_torn_last_line_is_cut_off(paths):
+    journal_path = paths[0]
+    write_lines(journal_path, [b'{"waypoint_id": "a", "label": "kept"}\n', b'{"waypoint_id": "b", "lab'])
+
+    journal = open_journal(paths)
+    assert journal.pending_count == 1
+    with open(journal_path, "rb") as f:
+        assert f.read() == b'{"waypoint_id": "a", "label": "kept"}\n'
+
+    journal.append([("b", "after")])
+    assert LabelJournal.read(journal_path) == [("a", "kept"), ("b", "after")]
+
+
+def test_invalid_entries_are_skipped(paths):
+    journal_path = paths[0]
+    write_lines(
+        journal_path,
+        [
+            b'{"waypoint_id": "a", "label": 5}\n',
+            b'{"waypoint_id": ["b"], "label": "x"}\n',
+            b'{"waypoint_id": "b", "label": "valid"}\n',
+        ],
+    )
+
+    assert LabelJournal.read(journal_path) == [("b", "valid")]
+    journal = open_journal(paths)
+    journal.compact()
+    assert read_graph(paths) == {"a": "old a", "b": "valid"}
+
+
+def test_compact_rewrites_graph_and_empties_journal(paths):
+    journal = open_journal(paths)
+    journal.append([("a", "new a")])
+
+    assert journal.compact()
+    assert read_graph(paths) == {"a": "new a", "b": "old b"}
+    assert not os.path.exists(paths[0])
+    assert journal.pending_count == 0
+    assert not journal.compact()
+
+
+def test_failed_compaction_keeps_graph_and_journal(paths):
+    journal_path, graph_file_path = paths
+
+    def fail(entries):
+        raise RuntimeError("rewrite failed")
+
+    journal = LabelJournal(journal_path, graph_file_path, fail, compact_delay=3600)
+    journal.append([("a", "new a")])
+
+    with pytest.raises(RuntimeError):
+        journal.compact()
+    assert read_graph(paths) == {"a": "old a", "b": "old b"}
+    assert LabelJournal.read(journal_path) == [("a", "new a")]
+    assert [name for name in os.listdir(os.path.dirname(graph_file_path)) if name.endswith(".tmp")] == []
+
+
+def test_edits_are_compacted_in_the_background(paths):
+    journal = open_journal(paths, compact_delay=0.01)
+    journal.append([("b", "new b")])
+
+    deadline = time.monotonic() + 5
+    while journal.pending_count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert journal.pending_count == 0
+    assert read_graph(paths) == {"a": "old a", "b": "new b"}
+    journal.close()
+
+
+def test_unwritable_journal_is_read_only(tmp_path):
+    # The lock file can't be created in a folder that doesn't exist, as in a read-only one
+    journal = LabelJournal(str(tmp_path / "missing" / "graph_labels.jsonl"), str(tmp_path / "graph"), None)
+
+    assert journal.read_only
+    with pytest.raises(PermissionError):
+        journal.append([("a", "new a")])
+    journal.close()
@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+from level_of_detail import LevelOfDetailPyramid, simplify_polyline
+from pose_table import PoseTable
+
+
+def make_pyramid(positions, edges, **kwargs):
+    """A pyramid over waypoints "w<i>" at the given XY positions, joined by edges (i, j)."""
+    matrices = np.tile(np.eye(4), (len(positions), 1, 1))
+    matrices[:, :2, 3] = positions
+    poses = PoseTable([f"w{i}" for i in range(len(positions))], matrices)
+    return LevelOfDetailPyramid(poses, [(f"w{i}", f"w{j}") for i, j in edges], **kwargs)
+
+
+@pytest.fixture
+def pyramid():
+    rng = np.random.default_rng(0)
+    positions, edges = [], []
+
+    def add_path(points, closed=False):
+        start = len(positions)
+        positions.extend(points)
+        edges.extend((i, i + 1) for i in range(start, len(positions) - 1))
+        if closed:
+            edges.append((len(positions) - 1, start))
+        return start
+
+    # A noisy straight corridor, a random walk branching off it, a grid, a loop and an isolated waypoint
+    corridor = add_path([(x, rng.normal(0.0, 0.01)) for x in np.linspace(0.0, 100.0, 400)])
+    walk = add_path(np.cumsum(rng.normal(0.0, 1.0, size=(300, 2)), axis=0) + (50.0, 0.0))
+    edges.append((corridor + 200, walk))
+    grid = len(positions)
+    positions.extend((x, y) for y in range(-40, -20) for x in range(20))
+    edges.extend((grid + i, grid + i + 1) for i in range(400) if i % 20 != 19)
+    edges.extend((grid + i, grid + i + 20) for i in range(380))
+    angles = np.linspace(0.0, 2 * np.pi, 60, endpoint=False)
+    add_path(np.stack([80.0 + 5.0 * np.cos(angles), -30.0 + 5.0 * np.sin(angles)], axis=1), closed=True)
+    positions.append((-20.0, -20.0))
+    # Duplicate, reversed and self-loop edges collapse into one or none
+    edges.extend([(1, 0), (corridor + 5, corridor + 6), (3, 3)])
+    return make_pyramid(np.array(positions), edges, min_nodes=8)
+
+
+def test_levels_get_coarser(pyramid):
+    assert len(pyramid) > 2
+    resolutions = [level.resolution for level in pyramid.levels]
+    assert np.allclose(np.divide(resolutions[1:], resolutions[:-1]), 2.0)
+    node_counts = [len(level.nodes) for level in pyramid.levels]
+    assert node_counts == sorted(node_counts, reverse=True)
+    assert node_counts[0] < len(pyramid.xy)
+
+
+def test_each_level_partitions_the_waypoints(pyramid):
+    for level in pyramid.levels:
+        members = [row for rows in level.nodes.values() for row in rows]
+        members += [row for rows in level.edges.values() for row in rows]
+        assert sorted(members) == list(range(len(pyramid.xy)))
+
+        # Every node stands for itself
+        assert all(row in rows for row, rows in level.nodes.items())
+
+
+def test_edge_endpoints_are_nodes(pyramid):
+    for level in pyramid.levels:
+        for a, b in level.edges:
+            assert a < b
+            assert a in level.nodes and b in level.nodes
+
+
+def test_level_for_zoom(pyramid):
+    assert pyramid.level_for_zoom(1e9) == 0
+    assert pyramid.level_for_zoom(1e-9) == len(pyramid)
+
+    lods = [pyramid.level_for_zoom(zoom) for zoom in np.geomspace(1e-3, 1e3, 50)]
+    assert lods == sorted(lods, reverse=True)
+    for zoom, lod in zip(np.geomspace(1e-3, 1e3, 50), lods):
+        if lod:
+            assert pyramid.level(lod).resolution * zoom <= 4.0
+
+
+def test_empty_graph():
+    pyramid = make_pyramid(np.zeros((0, 2)), [])
+    assert len(pyramid) == 0
+    assert pyramid.level_for_zoom(1.0) == 0
+
+
+def test_from_levels_round_trip(pyramid):
+    rebuilt = LevelOfDetailPyramid.from_levels(pyramid.levels)
+    assert len(rebuilt) == len(pyramid)
+    assert rebuilt.level(1) is pyramid.level(1)
+    assert rebuilt.level_for_zoom(0.5) == pyramid.level_for_zoom(0.5)
+
+
+def test_simplify_polyline_keeps_endpoints_and_corners():
+    xy = np.array([(0.0, 0.0), (1.0, 0.01), (2.0, 0.0), (3.0, 0.0), (3.0, 1.0), (3.0, 2.0)])
+    assert np.flatnonzero(simplify_polyline(xy, 0.1)).tolist() == [0, 3, 5]
+    assert np.flatnonzero(simplify_polyline(xy, 0.001)).tolist() == [0, 1, 2, 3, 5]
+
+
+@pytest.mark.parametrize(
+    "query, error",
+    [
+        ("lod=abc", "Invalid lod: abc"),
+        ("lod=-1", "lod must be non-negative"),
+        ("zoom=0", "Invalid zoom: 0"),
+        ("zoom=-2.5", "Invalid zoom: -2.5"),
+        ("zoom=nan", "Invalid zoom: nan"),
+    ],
+)
+def test_map_route_rejects_invalid_detail(map_api, monkeypatch, query, error):
+    import app
+
+    monkeypatch.setattr(app, "api_instance", map_api)
+    response = app.app.test_client().get(f"/api/map?{query}")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": error}
+
+
+def test_map_route_picks_level_for_zoom(map_api, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "api_instance", map_api)
+    client = app.app.test_client()
+    assert "lod" not in client.get("/api/map?zoom=1e9").get_json()
+
+    lod = map_api.lod_pyramids[False].level_for_zoom(1e-9)
+    assert client.get("/api/map?zoom=1e-9").get_json().get("lod", 0) == lod
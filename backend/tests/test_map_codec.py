@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from map_codec import MAGIC, decode_map, encode_map, read_header
+
+
+def records(lod=False):
+    map_fields = {"use_anchoring": True, "waypoints_count": 2}
+    if lod:
+        map_fields["lod"] = 1
+    yield "map", map_fields
+    yield "waypoint", {
+        "id": "wp-a",
+        "label": "kitchen",
+        "snapshot_id": "snap-a",
+        "has_images": True,
+        "position": [1.0, 2.0, 0.5],
+        "objects": ["chair", "table"],
+        "members": ["wp-a", "wp-c"],
+    }
+    yield "waypoint", {
+        "id": "wp-b",
+        "label": "",
+        "snapshot_id": "",
+        "has_images": False,
+        "position": [-3.0, 4.0, 0.0],
+        "objects": [],
+        "members": ["wp-b"],
+    }
+    # The second edge leads to a point outside the response, e.g. outside a bbox
+    yield "edge", {
+        "from_id": "wp-a",
+        "to_id": "wp-b",
+        "from_position": [1.0, 2.0, 0.5],
+        "to_position": [-3.0, 4.0, 0.0],
+    }
+    yield "edge", {
+        "from_id": "wp-b",
+        "to_id": "wp-x",
+        "from_position": [-3.0, 4.0, 0.0],
+        "to_position": [9.0, 9.0, 1.0],
+    }
+    yield "object", {"id": "fiducial_200", "type": "fiducial", "position": [0.5, 0.0, 0.5]}
+
+
+def strings_of(arrays, strings, name):
+    return [strings[i] for i in arrays[name]]
+
+
+def test_round_trip():
+    data = encode_map(records())
+    header, arrays, strings = decode_map(data)
+
+    assert data[:4] == MAGIC
+    assert header["map"] == {"use_anchoring": True, "waypoints_count": 2}
+    assert header["counts"] == {"waypoints": 2, "points": 3, "edges": 2, "objects": 1, "strings": len(strings)}
+
+    positions = arrays["positions"].reshape(-1, 3)
+    np.testing.assert_array_equal(positions, [[1.0, 2.0, 0.5], [-3.0, 4.0, 0.0], [9.0, 9.0, 1.0]])
+    assert strings_of(arrays, strings, "point_ids") == ["wp-a", "wp-b", "wp-x"]
+    assert strings_of(arrays, strings, "waypoint_labels") == ["kitchen", ""]
+    assert strings_of(arrays, strings, "waypoint_snapshot_ids") == ["snap-a", ""]
+    assert arrays["waypoint_has_images"].tolist() == [1, 0]
+    assert arrays["waypoint_object_offsets"].tolist() == [0, 2, 2]
+    assert strings_of(arrays, strings, "waypoint_objects") == ["chair", "table"]
+    assert arrays["edge_points"].tolist() == [0, 1, 1, 2]
+    np.testing.assert_array_equal(arrays["object_positions"], [0.5, 0.0, 0.5])
+    assert strings_of(arrays, strings, "object_ids") == ["fiducial_200"]
+    assert strings_of(arrays, strings, "object_types") == ["fiducial"]
+    assert "waypoint_members" not in arrays
+
+
+def test_lod_members():
+    header, arrays, strings = decode_map(encode_map(records(lod=True)))
+
+    assert header["map"]["lod"] == 1
+    assert arrays["waypoint_member_offsets"].tolist() == [0, 2, 3]
+    assert strings_of(arrays, strings, "waypoint_members") == ["wp-a", "wp-c", "wp-b"]
+    assert arrays["edge_member_offsets"].tolist() == [0, 0, 0]
+
+
+def test_sections_are_aligned():
+    header = read_header(encode_map(records(lod=True)))
+    for dtype, offset, length in header["sections"].values():
+        assert offset % 8 == 0
+
+
+def test_empty_map():
+    header, arrays, strings = decode_map(encode_map([("map", {})]))
+
+    assert header["counts"]["waypoints"] == 0
+    assert arrays["positions"].size == 0
+    assert arrays["waypoint_object_offsets"].tolist() == [0]
+
+
+def test_rejects_other_data():
+    data = bytearray(encode_map(records()))
+    data[:4] = b"JSON"
+    with pytest.raises(ValueError):
+        read_header(bytes(data))
@@ -0,0 +1,46 @@
+import gzip
+import json
+
+import pytest
+
+
+@pytest.fixture
+def client(map_api, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "api_instance", map_api)
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize("fmt", ["json", "ndjson", "binary"])
+def test_each_encoding_has_its_own_etag(client, fmt):
+    identity = client.get(f"/api/map?format={fmt}", headers={"Accept-Encoding": "identity"})
+    compressed = client.get(f"/api/map?format={fmt}", headers={"Accept-Encoding": "gzip"})
+    assert identity.status_code == compressed.status_code == 200
+    assert "Content-Encoding" not in identity.headers
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(compressed.get_data()) == identity.get_data()
+
+    identity_etag, weak = identity.get_etag()
+    compressed_etag, compressed_weak = compressed.get_etag()
+    assert not weak and not compressed_weak
+    assert compressed_etag != identity_etag
+    for response in (identity, compressed):
+        assert "Accept-Encoding" in response.headers["Vary"]
+
+
+def test_conditional_requests_match_the_encoding(client):
+    identity_etag = client.get("/api/map", headers={"Accept-Encoding": "identity"}).get_etag()[0]
+    compressed_etag = client.get("/api/map", headers={"Accept-Encoding": "gzip"}).get_etag()[0]
+
+    def get(etag, encoding):
+        return client.get("/api/map", headers={"Accept-Encoding": encoding, "If-None-Match": f'"{etag}"'})
+
+    assert get(identity_etag, "identity").status_code == 304
+    assert get(compressed_etag, "gzip").status_code == 304
+
+    # A cached body in the other encoding is not revalidated
+    response = get(compressed_etag, "identity")
+    assert response.status_code == 200
+    assert "waypoints" in json.loads(response.get_data())
+    assert get(identity_etag, "gzip").status_code == 200
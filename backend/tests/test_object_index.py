@@ -0,0 +1,73 @@
+import pytest
+from object_index import ObjectIndex, normalize_object_name
+
+
+def annotation(**views):
+    return {"views": {view: {"visible_objects": objects} for view, objects in views.items()}}
+
+
+@pytest.fixture
+def index():
+    return ObjectIndex(
+        {
+            "wp-a": annotation(front=["a chair", "The Tables"], left=[" chair"]),
+            "wp-b": annotation(back=["table", "a  coffee   machine "]),
+            "wp-c": annotation(right=["DOORS"]),
+        },
+        normalize_object_name,
+    )
+
+
+@pytest.mark.parametrize(
+    "name, normalized",
+    [
+        ("chair", "chair"),
+        ("a chair", "chair"),
+        ("The Chairs", "chair"),
+        (" chair ", "chair"),
+        ("an  exit   sign", "exit sign"),
+        ("the boxes", "box"),
+        ("shelves", "shelf"),
+        ("batteries", "battery"),
+        ("glass", "glass"),
+        ("Exit Signs", "exit sign"),
+        ("", ""),
+        (None, ""),
+    ],
+)
+def test_normalize_object_name(name, normalized):
+    assert normalize_object_name(name) == normalized
+
+
+def test_objects_are_indexed_by_normalized_name(index):
+    assert index.objects == ["chair", "coffee machine", "door", "table"]
+    assert index.waypoints("table") == {"wp-a": {"front": 1}, "wp-b": {"back": 1}}
+    assert index.waypoints("chair") == {"wp-a": {"front": 1, "left": 1}}
+    assert index.waypoint_objects["wp-a"] == ["chair", "table"]
+
+
+@pytest.mark.parametrize("name", ["chair", "Chairs", "the chair", "  A   CHAIR "])
+def test_resolve_normalizes_query_names(index, name):
+    assert index.resolve(name) == "chair"
+
+
+def test_resolve_unknown_name(index):
+    assert index.resolve("sofa") is None
+    assert index.waypoints("sofa") == {}
+
+
+def test_query_modes(index):
+    assert index.query(["Tables", "door"], "or") == {"wp-a", "wp-b", "wp-c"}
+    assert index.query(["table", "a chair"], "and") == {"wp-a"}
+    assert index.query(["table", "sofa"], "and") == set()
+    assert index.query([], "or") == set()
+    with pytest.raises(ValueError):
+        index.query(["table"], "xor")
+
+
+def test_updated_leaves_original_index_intact(index):
+    updated = index.updated({"wp-b": annotation(front=["a sofa"])}, {"wp-a", "wp-b"})
+
+    assert updated.objects == ["door", "sofa"]
+    assert updated.waypoints("sofa") == {"wp-b": {"front": 1}}
+    assert index.waypoints("table") == {"wp-a": {"front": 1}, "wp-b": {"back": 1}}
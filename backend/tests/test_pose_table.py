@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from bosdyn.api import geometry_pb2
+from bosdyn.client.math_helpers import SE3Pose
+from pose_table import PoseTable, invert_se3, se3_matrices
+
+
+def random_poses(count, seed=0):
+    rng = np.random.default_rng(seed)
+    poses = []
+    for position, rotation in zip(rng.normal(0.0, 10.0, size=(count, 3)), rng.normal(size=(count, 4))):
+        rotation /= np.linalg.norm(rotation)
+        poses.append(
+            geometry_pb2.SE3Pose(
+                position=geometry_pb2.Vec3(x=position[0], y=position[1], z=position[2]),
+                rotation=geometry_pb2.Quaternion(w=rotation[0], x=rotation[1], y=rotation[2], z=rotation[3]),
+            )
+        )
+    return poses
+
+
+def test_se3_matrices_match_se3_pose():
+    poses = random_poses(50)
+    expected = np.array([SE3Pose.from_proto(pose).to_matrix() for pose in poses])
+    assert np.allclose(se3_matrices(poses), expected)
+    assert se3_matrices([]).shape == (0, 4, 4)
+
+
+def test_se3_matrices_normalize_quaternions():
+    pose = random_poses(1)[0]
+    expected = SE3Pose.from_proto(pose).to_matrix()
+    for name in ("w", "x", "y", "z"):
+        setattr(pose.rotation, name, 1.5 * getattr(pose.rotation, name))
+    assert np.allclose(se3_matrices([pose])[0], expected)
+
+    # A zero quaternion is read as no rotation
+    pose.rotation.Clear()
+    assert np.allclose(se3_matrices([pose])[0, :3, :3], np.eye(3))
+
+
+def test_invert_se3_matches_se3_pose():
+    poses = random_poses(50, seed=1)
+    expected = np.array([SE3Pose.from_proto(pose).inverse().to_matrix() for pose in poses])
+    matrices = se3_matrices(poses)
+    assert np.allclose(invert_se3(matrices), expected)
+    assert np.allclose(np.einsum("nij,njk->nik", matrices, invert_se3(matrices)), np.eye(4))
+
+
+def test_pose_table_reads_like_a_dict():
+    matrices = se3_matrices(random_poses(3))
+    table = PoseTable(["a", "b", "c"], matrices)
+    assert len(table) == 3 and list(table) == ["a", "b", "c"]
+    assert "b" in table and "d" not in table
+    assert np.array_equal(table["b"], matrices[1])
+    assert table.get("d") is None
+    assert np.array_equal(table.positions, matrices[:, :3, 3])
+    assert table.rows(["c", "d", "a"]).tolist() == [2, -1, 0]
+    with pytest.raises(KeyError):
+        table["d"]
+
+
+def baseline_global_transforms(graph, waypoints):
+    """The breadth-first walk over SE3Pose matrices that the pose tables replaced."""
+    global_transforms = {}
+    queue = [(graph.waypoints[0], np.eye(4))]
+    visited = set()
+    while queue:
+        waypoint, world_tform_current = queue.pop(0)
+        if waypoint.id in visited:
+            continue
+        visited.add(waypoint.id)
+        global_transforms[waypoint.id] = world_tform_current
+
+        for edge in graph.edges:
+            if edge.id.from_waypoint == waypoint.id and edge.id.to_waypoint not in visited:
+                current_tform_to = SE3Pose.from_proto(edge.from_tform_to).to_matrix()
+                queue.append((waypoints[edge.id.to_waypoint], np.dot(world_tform_current, current_tform_to)))
+            elif edge.id.to_waypoint == waypoint.id and edge.id.from_waypoint not in visited:
+                current_tform_from = SE3Pose.from_proto(edge.from_tform_to).inverse().to_matrix()
+                queue.append((waypoints[edge.id.from_waypoint], np.dot(world_tform_current, current_tform_from)))
+
+    return global_transforms
+
+
+def test_map_transforms_match_baseline(map_api):
+    expected = baseline_global_transforms(map_api.graph, map_api.waypoints)
+    assert set(map_api.global_transforms) == set(expected)
+    for waypoint_id, matrix in expected.items():
+        assert np.allclose(map_api.global_transforms[waypoint_id], matrix)
+
+    anchored = {
+        waypoint_id: SE3Pose.from_proto(anchor.seed_tform_waypoint).to_matrix()
+        for waypoint_id, anchor in map_api.anchors.items()
+    }
+    assert set(map_api.anchored_transforms) == set(anchored)
+    for waypoint_id, matrix in anchored.items():
+        assert np.allclose(map_api.anchored_transforms[waypoint_id], matrix)
@@ -0,0 +1,149 @@
+import json
+import os
+import random
+
+import numpy as np
+import pytest
+from route_planner import RoutePlanner
+
+
+def make_planner(positions, edges, lengths=None):
+    """A planner over waypoints "w<i>" at positions, joined by edges (i, j) with the given or straight-line lengths."""
+    waypoint_ids = [f"w{i}" for i in range(len(positions))]
+    adjacency = {waypoint_id: [] for waypoint_id in waypoint_ids}
+    edge_transforms = np.tile(np.eye(4), (len(edges), 2, 1, 1))
+    for edge_index, (i, j) in enumerate(edges):
+        offset = np.subtract(positions[j], positions[i])
+        if lengths is not None:
+            offset = offset / np.linalg.norm(offset) * lengths[edge_index]
+        edge_transforms[edge_index, 0, :3, 3] = offset
+        edge_transforms[edge_index, 1, :3, 3] = -offset
+        adjacency[waypoint_ids[i]].append((waypoint_ids[j], edge_index, True))
+        adjacency[waypoint_ids[j]].append((waypoint_ids[i], edge_index, False))
+    return RoutePlanner(waypoint_ids, adjacency, edge_transforms, positions)
+
+
+def route_length(planner, waypoint_ids):
+    rows = [planner.rows[w] for w in waypoint_ids]
+    return sum(dict(planner.neighbors[a])[b] for a, b in zip(rows, rows[1:]))
+
+
+@pytest.fixture
+def grid_planner():
+    # A 6x6 grid with random edge lengths, some shorter than the distance between their endpoints
+    rng = random.Random(0)
+    positions = [(x, y, 0.0) for y in range(6) for x in range(6)]
+    edges = [(i, i + 1) for i in range(36) if i % 6 != 5] + [(i, i + 6) for i in range(30)]
+    lengths = [rng.uniform(0.5, 3.0) for _ in edges]
+    return make_planner(positions, edges, lengths)
+
+
+def test_a_star_agrees_with_dijkstra(grid_planner):
+    for source in grid_planner.waypoint_ids:
+        for target in grid_planner.waypoint_ids:
+            distance, waypoint_ids = grid_planner.shortest_path(source, target)
+            expected, _ = grid_planner.nearest(source, ("single", target), lambda: [target])
+
+            assert distance == pytest.approx(expected)
+            assert waypoint_ids[0] == source and waypoint_ids[-1] == target
+            assert route_length(grid_planner, waypoint_ids) == pytest.approx(distance)
+
+
+def test_reverse_route_shares_memo_entry(grid_planner):
+    distance, waypoint_ids = grid_planner.shortest_path("w0", "w35")
+    assert grid_planner.shortest_path("w35", "w0") == (distance, waypoint_ids[::-1])
+    assert len(grid_planner._memo) == 1
+
+
+def test_unreachable_target():
+    planner = make_planner([(0, 0, 0), (1, 0, 0), (5, 0, 0), (6, 0, 0)], [(0, 1), (2, 3)])
+
+    assert planner.shortest_path("w0", "w3") is None
+    assert planner.nearest("w0", "far", lambda: ["w2", "w3"]) is None
+    assert planner.nearest("w0", "none", lambda: []) is None
+    assert planner.shortest_path("w0", "w0") == (0.0, ["w0"])
+    with pytest.raises(KeyError):
+        planner.shortest_path("w0", "unknown")
+
+
+def test_nearest_picks_closest_target():
+    # w0 - w1 - w2 - w3 in a line; w3 is also one short hop from w0
+    planner = make_planner([(0, 0, 0), (1, 0, 0), (2, 0, 0), (0, 1, 0)], [(0, 1), (1, 2), (0, 3)], [1.0, 1.0, 0.5])
+
+    assert planner.nearest("w0", "q", lambda: ["w2", "w3"]) == (0.5, ["w0", "w3"])
+    assert planner.nearest("w1", "q", lambda: ["w2", "w3"]) == (1.0, ["w1", "w2"])
+
+
+def test_nearest_resolves_targets_only_on_memo_miss(grid_planner):
+    calls = []
+
+    def find_targets():
+        calls.append(1)
+        return ["w35"]
+
+    first = grid_planner.nearest("w0", "query", find_targets)
+    assert grid_planner.nearest("w0", "query", find_targets) == first
+    assert len(calls) == 1
+
+    fresh = grid_planner.with_empty_memo()
+    assert fresh.neighbors is grid_planner.neighbors
+    assert fresh.nearest("w0", "query", find_targets) == first
+    assert len(calls) == 2
+
+
+def test_memo_is_bounded():
+    planner = make_planner([(i, 0, 0) for i in range(5)], [(i, i + 1) for i in range(4)])
+    planner.memo_size = 3
+    for target in ["w1", "w2", "w3", "w4"]:
+        planner.shortest_path("w0", target)
+    assert list(planner._memo) == [(0, 2), (0, 3), (0, 4)]
+
+
+def write_annotation(rag_path, waypoint_id, objects):
+    with open(os.path.join(rag_path, f"metadata_{waypoint_id}.json"), "w") as f:
+        json.dump({"waypoint_id": waypoint_id, "views": {"front": {"visible_objects": objects}}}, f)
+    return f"metadata_{waypoint_id}.json"
+
+
+def annotate(api, objects_by_row):
+    """Replace every annotation with objects_by_row ({row: [objects]}) and reload; returns the reloaded API."""
+    from map_watcher import MapChanges
+
+    ids = api.global_transforms.ids
+    changed = {
+        write_annotation(api.rag_db_path, waypoint_id, objects_by_row.get(row, []))
+        for row, waypoint_id in enumerate(ids)
+    }
+    return api.reload(MapChanges(False, False, set(), changed, set()))
+
+
+def test_route_to_objects_modes(map_api):
+    # The synthetic map is a walk: waypoint i is joined to i + 1, plus a few loop closures
+    api = annotate(map_api, {3: ["a chair"], 6: ["chairs", "the table"], 9: ["Table"]})
+    ids = api.global_transforms.ids
+
+    route = api.plan_route_to_objects(ids[0], ["chair"], "or")
+    assert route["to"] in (ids[3], ids[6])
+    assert route["waypoints"][0] == ids[0]
+    assert "chair" in route["objects"]
+
+    route = api.plan_route_to_objects(ids[0], ["chair", "table"], "and")
+    assert route["to"] == ids[6]
+    assert route["objects"] == ["chair", "table"]
+
+    assert api.plan_route_to_objects(ids[0], ["chair", "sofa"], "and") is None
+    assert api.plan_route_to_objects(ids[0], ["sofa"], "or") is None
+    assert api.plan_route_to_objects("unknown", ["chair"]) is None
+
+
+def test_object_routes_are_replanned_after_reload(map_api):
+    api = annotate(map_api, {5: ["chair"]})
+    ids = api.global_transforms.ids
+    assert api.plan_route_to_objects(ids[0], ["chair"])["to"] == ids[5]
+
+    reloaded = annotate(api, {1: ["chair"]})
+    assert reloaded.route_planner is not api.route_planner
+    assert reloaded.route_planner.neighbors is api.route_planner.neighbors
+    assert reloaded.plan_route_to_objects(ids[0], ["chair"])["to"] == ids[1]
+    # The old API keeps serving the routes of its own annotations
+    assert api.plan_route_to_objects(ids[0], ["chair"])["to"] == ids[5]
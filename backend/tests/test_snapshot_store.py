@@ -0,0 +1,122 @@
+import os
+
+import pytest
+from bosdyn.api.graph_nav import map_pb2
+from snapshot_store import SnapshotStore
+
+# Serialized size of each snapshot written by write_snapshot
+SNAPSHOT_BYTES = 1003
+
+
+def write_snapshot(snapshot_dir, snapshot_id):
+    # Pad the id so every snapshot file has the same size
+    snapshot = map_pb2.WaypointSnapshot(id=snapshot_id.ljust(SNAPSHOT_BYTES - 3, "."))
+    with open(os.path.join(snapshot_dir, snapshot_id), "wb") as f:
+        f.write(snapshot.SerializeToString())
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path):
+    for i in range(6):
+        write_snapshot(str(tmp_path), f"s{i}")
+    # Files no waypoint refers to are not indexed
+    write_snapshot(str(tmp_path), "orphan")
+    return str(tmp_path)
+
+
+def make_store(snapshot_dir, capacity):
+    """A store over snapshots s0..s5 (plus a missing one) with room for capacity of them."""
+    return SnapshotStore(snapshot_dir, [f"s{i}" for i in range(7)], max_bytes=capacity * SNAPSHOT_BYTES)
+
+
+def cached_ids(store):
+    return list(store._cache)
+
+
+def test_index_only_holds_existing_referenced_snapshots(snapshot_dir):
+    store = make_store(snapshot_dir, 2)
+    assert sorted(store) == [f"s{i}" for i in range(6)]
+    assert "orphan" not in store and "s6" not in store
+    assert store.get("s6") is None
+    assert store.loaded_count == 0
+
+
+def test_get_parses_on_demand(snapshot_dir):
+    store = make_store(snapshot_dir, 2)
+    snapshot = store.get("s1")
+    assert snapshot.id.startswith("s1.")
+    assert store.get("s1") is snapshot
+    assert store.loaded_count == 1
+    assert store.loaded_bytes == SNAPSHOT_BYTES
+
+
+def test_lru_evicts_at_its_bound(snapshot_dir):
+    store = make_store(snapshot_dir, 3)
+    for snapshot_id in ["s0", "s1", "s2"]:
+        store.get(snapshot_id)
+    assert cached_ids(store) == ["s0", "s1", "s2"]
+
+    # Using s0 makes s1 the least recently used one
+    store.get("s0")
+    store.get("s3")
+    assert cached_ids(store) == ["s2", "s0", "s3"]
+    assert store.loaded_bytes == 3 * SNAPSHOT_BYTES
+
+    for snapshot_id in ["s4", "s5", "s0", "s1"]:
+        store.get(snapshot_id)
+        assert store.loaded_bytes <= store.max_bytes
+    assert cached_ids(store) == ["s5", "s0", "s1"]
+
+
+def test_evicted_snapshot_is_reloaded(snapshot_dir):
+    store = make_store(snapshot_dir, 1)
+    first = store.get("s0")
+    store.get("s1")
+    assert cached_ids(store) == ["s1"]
+
+    reloaded = store.get("s0")
+    assert reloaded is not first
+    assert reloaded == first
+    assert cached_ids(store) == ["s0"]
+
+
+def test_newest_snapshot_is_kept_over_budget(snapshot_dir):
+    store = SnapshotStore(snapshot_dir, ["s0", "s1"], max_bytes=SNAPSHOT_BYTES // 2)
+    assert store.get("s0") is not None
+    store.get("s1")
+    assert cached_ids(store) == ["s1"]
+
+
+def test_preload_fills_the_budget(snapshot_dir):
+    store = make_store(snapshot_dir, 4)
+    assert store.preload(["s5", "s6", "s1", "s2", "s3", "s4", "s0"]) == 4
+    assert cached_ids(store) == ["s5", "s1", "s2", "s3"]
+
+    threaded = make_store(snapshot_dir, 4)
+    assert threaded.preload(workers=3) == 4
+    assert threaded.loaded_count == 4
+
+
+def test_adopt_keeps_unchanged_snapshots(snapshot_dir):
+    store = make_store(snapshot_dir, 6)
+    store.preload()
+
+    # Rewrite s2 with a different size, so its version changes
+    with open(os.path.join(snapshot_dir, "s2"), "wb") as f:
+        f.write(map_pb2.WaypointSnapshot(id="s2").SerializeToString())
+    reloaded = make_store(snapshot_dir, 6)
+    assert reloaded.version("s2") != store.version("s2")
+    assert reloaded.version("s0") == store.version("s0")
+
+    reloaded.adopt(store)
+    assert "s2" not in cached_ids(reloaded)
+    assert reloaded.get("s0") is store.get("s0")
+    assert reloaded.get("s2").id == "s2"
+
+
+def test_clear(snapshot_dir):
+    store = make_store(snapshot_dir, 2)
+    store.get("s0")
+    store.clear()
+    assert store.loaded_count == 0 and store.loaded_bytes == 0
+    assert store.get("s0") is not None
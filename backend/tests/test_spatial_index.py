@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from pose_table import PoseTable
+from spatial_index import SpatialIndex, segments_in_bbox
+
+
+def make_index(positions, edge_ids=()):
+    """A spatial index over waypoints "w<i>" at the given XY positions."""
+    matrices = np.tile(np.eye(4), (len(positions), 1, 1))
+    matrices[:, :2, 3] = positions
+    return SpatialIndex(PoseTable([f"w{i}" for i in range(len(positions))], matrices), list(edge_ids))
+
+
+@pytest.fixture
+def random_index():
+    rng = np.random.default_rng(0)
+    return make_index(rng.uniform(-50.0, 50.0, size=(500, 2)))
+
+
+def test_within_bbox_matches_brute_force(random_index):
+    xy = random_index.xy
+    for bbox in [(-10.0, -20.0, 15.0, 5.0), (30.0, 30.0, 80.0, 80.0), (-1.0, -1.0, 1.0, 1.0), (60.0, 60.0, 70.0, 70.0)]:
+        min_x, min_y, max_x, max_y = bbox
+        expected = np.flatnonzero((xy[:, 0] >= min_x) & (xy[:, 0] <= max_x) & (xy[:, 1] >= min_y) & (xy[:, 1] <= max_y))
+        assert random_index.within_bbox(*bbox).tolist() == expected.tolist()
+
+
+def test_within_bbox_includes_points_on_the_border():
+    index = make_index([(0.0, 0.0), (1.0, 0.5), (1.0, 1.0), (1.0001, 0.5)])
+    assert index.within_bbox(0.0, 0.0, 1.0, 1.0).tolist() == [0, 1, 2]
+
+
+def test_nearest_matches_brute_force(random_index):
+    distances = np.hypot(random_index.xy[:, 0] - 3.0, random_index.xy[:, 1] + 7.0)
+    rows, found = random_index.nearest(3.0, -7.0, k=5)
+    assert rows.tolist() == np.argsort(distances)[:5].tolist()
+    assert np.allclose(found, np.sort(distances)[:5])
+
+
+def test_nearest_caps_k_at_the_number_of_waypoints():
+    index = make_index([(0.0, 0.0), (2.0, 0.0), (5.0, 0.0)])
+    rows, distances = index.nearest(4.0, 0.0, k=10)
+    assert rows.tolist() == [2, 1, 0]
+    assert distances.tolist() == [1.0, 2.0, 4.0]
+    assert index.nearest(4.0, 0.0, k=0)[0].tolist() == []
+
+
+def test_within_radius_is_sorted_by_distance(random_index):
+    rows, distances = random_index.within_radius(0.0, 0.0, 12.0)
+    expected = np.hypot(random_index.xy[:, 0], random_index.xy[:, 1])
+    assert sorted(rows.tolist()) == np.flatnonzero(expected <= 12.0).tolist()
+    assert np.all(np.diff(distances) >= 0)
+    assert np.allclose(distances, expected[rows])
+
+
+def test_empty_index():
+    index = make_index(np.zeros((0, 2)))
+    assert index.within_bbox(0.0, 0.0, 1.0, 1.0).tolist() == []
+    assert index.nearest(0.0, 0.0)[0].tolist() == []
+    assert index.within_radius(0.0, 0.0, 1.0)[0].tolist() == []
+
+
+@pytest.mark.parametrize(
+    "start, end, visible",
+    [
+        ((0.5, 0.5), (0.6, 0.6), True),  # Inside
+        ((-1.0, 0.5), (2.0, 0.5), True),  # Crosses the box with both endpoints outside
+        ((-1.0, -1.0), (2.0, 2.0), True),  # Diagonal through the box
+        ((-1.0, 1.0), (0.0, 1.0), True),  # Ends on the border
+        ((0.0, 2.0), (0.0, -2.0), True),  # Runs along the border
+        ((1.0, 2.0), (2.0, 1.0), False),  # Passes the corner on the outside
+        ((-1.0, 0.5), (-0.001, 0.5), False),  # Stops short of the border
+        ((1.5, -1.0), (1.5, 2.0), False),  # Parallel to and outside the box
+        ((2.0, 2.0), (2.0, 2.0), False),  # Degenerate, outside
+        ((0.5, 0.5), (0.5, 0.5), True),  # Degenerate, inside
+    ],
+)
+def test_segments_in_bbox(start, end, visible):
+    assert segments_in_bbox([start], [end], (0.0, 0.0, 1.0, 1.0)).tolist() == [visible]
+
+
+def test_edges_in_bbox_clips_edges_at_the_border():
+    index = make_index(
+        [(-1.0, 0.5), (2.0, 0.5), (3.0, 3.0), (4.0, 3.0), (0.5, 0.5)],
+        [("w0", "w1"), ("w2", "w3"), ("w4", "w2"), ("w3", "missing")],
+    )
+    assert index.edges_in_bbox(0.0, 0.0, 1.0, 1.0).tolist() == [True, False, True, False]
@@ -0,0 +1,48 @@
+"""WSGI entry point for serving the visualizer with a production server.
+
+    cd backend
+    SPOT_MAP_PATH=/path/to/map SPOT_RAG_PATH=/path/to/rag_db gunicorn -c gunicorn.conf.py wsgi:app
+
+The map is configured through environment variables mirroring the ``app.py`` flags. With ``preload_app`` (see
+``gunicorn.conf.py``) it is loaded once before the workers are forked, so every worker shares the loaded poses,
+indexes and payloads copy-on-write instead of holding its own copy.
+"""
+
+import gc
+import os
+
+from app import app, configure_logging, create_api, watch_map  # noqa: F401
+
+
+def _env(name, default=None, cast=str):
+    value = os.environ.get(name)
+    return default if value in (None, "") else cast(value)
+
+
+def _required_env(name):
+    value = _env(name)
+    if value is None:
+        raise RuntimeError(f"Set {name} to serve the visualizer through WSGI")
+    return value
+
+
+configure_logging(_env("SPOT_LOG_LEVEL", "info"))
+
+api = create_api(
+    _required_env("SPOT_MAP_PATH"),
+    _required_env("SPOT_RAG_PATH"),
+    snapshot_cache_mb=_env("SPOT_SNAPSHOT_CACHE_MB", 512, float),
+    image_cache_dir=_env("SPOT_IMAGE_CACHE_DIR"),
+    derived_cache_dir=_env("SPOT_DERIVED_CACHE_DIR"),
+    workers=_env("SPOT_LOADER_WORKERS", None, int),
+    image_workers=_env("SPOT_IMAGE_WORKERS", min(4, os.cpu_count() or 1), int),
+    prefetch_workers=_env("SPOT_PREFETCH_WORKERS", 2, int),
+    prefetch_depth=_env("SPOT_PREFETCH_DEPTH", 1, int),
+)
+
+# Seconds between checks for changed map and RAG files; each worker reloads its own copy (0 disables reloading)
+reload_interval = _env("SPOT_RELOAD_INTERVAL", 0, float)
+
+# Everything allocated so far lives as long as the server; keeping the garbage collector from scanning it stops
+# it from writing to (and so un-sharing) those pages in forked workers
+gc.freeze()
@@ -1,12 +1,49 @@
 // src/App.js
-import React, { useState, useEffect, Component } from 'react';
+import React, { useState, useEffect, useRef, Component } from 'react';
 import './App.css';
 import EnhancedMapView from './components/MapViewer/EnhancedMapView';
 import Header from './components/Layout/Header';
 import Sidebar from './components/Layout/Sidebar';
 import WaypointPanel from './components/WaypointManager/WaypointPanel';
 import ObjectFilterPanel from './components/ObjectFilter/ObjectFilterPanel';
-import { fetchMap, fetchWaypoint, fetchWaypointImages, fetchObjects, updateWaypointLabel } from './services/api';
+import {
+  fetchMap,
+  fetchMapBinary,
+  binaryMapToMapData,
+  streamMap,
+  fetchWaypointsDetails,
+  getWaypointImageUrls,
+  fetchObjects,
+  fetchObjectWaypoints,
+  updateWaypointLabel
+} from './services/api';
+
+// Most waypoints fetched in one /waypoints/details request
+const MAX_DETAILS_BATCH = 100;
+
+// Maps with at least this many waypoints are only drawn for the visible viewport, at the level of detail its zoom
+// needs, refetched on pan and zoom
+const VIEWPORT_FETCH_MIN_WAYPOINTS = 2000;
+
+// Fraction of the viewport size fetched beyond each of its sides, so short pans need no refetch to fill in
+const VIEWPORT_MARGIN = 0.5;
+
+// The viewport's bbox grown by VIEWPORT_MARGIN on every side
+const padBbox = ([minX, minY, maxX, maxY]) => {
+  const padX = (maxX - minX) * VIEWPORT_MARGIN;
+  const padY = (maxY - minY) * VIEWPORT_MARGIN;
+  return [minX - padX, minY - padY, maxX + padX, maxY + padY];
+};
+
+// IDs of the waypoints connected to a waypoint by an edge of the map
+const getNeighborIds = (mapData, waypointId) => {
+  const neighborIds = new Set();
+  (mapData?.edges || []).forEach(edge => {
+    if (edge.from_id === waypointId) neighborIds.add(edge.to_id);
+    if (edge.to_id === waypointId) neighborIds.add(edge.from_id);
+  });
+  return [...neighborIds];
+};
 
 // Simple Debug View Component
 const SimpleMapView = ({ mapData }) => {
@@ -123,6 +160,9 @@ const DebugPanel = () => {
 function App() {
   // State for map data
   const [mapData, setMapData] = useState(null);
+  const [mapComplete, setMapComplete] = useState(false);
+  const [viewport, setViewport] = useState(null);
+  const [viewportData, setViewportData] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [dataValid, setDataValid] = useState(true);
@@ -138,26 +178,57 @@ function App() {
   const [waypointImages, setWaypointImages] = useState(null);
   const [allObjects, setAllObjects] = useState([]);
   const [filteredObjects, setFilteredObjects] = useState([]);
+  const [filteredWaypointIds, setFilteredWaypointIds] = useState(null);
 
-  // Load initial map data
+  // Load initial map data, drawing it as it streams in
   useEffect(() => {
     console.log("Fetching map data...");
     setLoading(true);
-    fetchMap(useAnchoring)
+    setMapComplete(false);
+    setViewportData(null);
+    const controller = new AbortController();
+    const showPartialMap = data => {
+      setMapData(data);
+      setLoading(false);
+    };
+    streamMap(useAnchoring, { onProgress: showPartialMap, signal: controller.signal })
       .then(data => {
         console.log("Map data received:", data);
         console.log("Waypoints:", data.waypoints ? data.waypoints.length : 'none');
         console.log("Edges:", data.edges ? data.edges.length : 'none');
         setMapData(data);
+        setMapComplete(true);
         setLoading(false);
       })
       .catch(err => {
+        if (err.name === 'AbortError') return;
         console.error('Error loading map data:', err);
         setError(`Failed to load map data: ${err.message}`);
         setLoading(false);
       });
+    // Stop a download for the previous frame when the frame is switched
+    return () => controller.abort();
   }, [useAnchoring]);
 
+  // Refetch only the visible part of large maps, once the full map has been loaded to frame the view
+  useEffect(() => {
+    if (!mapComplete || !viewport || !mapData || mapData.waypoints.length < VIEWPORT_FETCH_MIN_WAYPOINTS) {
+      setViewportData(null);
+      return;
+    }
+
+    // The previous viewport stays drawn until this one arrives
+    const controller = new AbortController();
+    streamMap(useAnchoring, { bbox: padBbox(viewport.bbox), zoom: viewport.zoom, signal: controller.signal })
+      .then(setViewportData)
+      .catch(err => {
+        if (err.name === 'AbortError') return;
+        console.error('Error loading viewport map data:', err);
+        setViewportData(null);
+      });
+    return () => controller.abort();
+  }, [mapComplete, mapData, viewport, useAnchoring]);
+
   // Validate map data
   useEffect(() => {
     // Validate map data structure
@@ -194,6 +265,37 @@ function App() {
       });
   }, []);
 
+  // Resolve the object filter to waypoint ids on the server
+  useEffect(() => {
+    if (!filteredObjects || filteredObjects.length === 0) {
+      setFilteredWaypointIds(null);
+      return;
+    }
+
+    let cancelled = false;
+    fetchObjectWaypoints(filteredObjects, 'or')
+      .then(waypointIds => {
+        if (!cancelled) setFilteredWaypointIds(waypointIds);
+      })
+      .catch(err => {
+        // Fall back to client-side filtering on the map data
+        console.error('Error loading filtered waypoints:', err);
+        if (!cancelled) setFilteredWaypointIds(null);
+      });
+
+    return () => {
+      cancelled = true;
+    };
+  }, [filteredObjects]);
+
+  // Details of selected waypoints and their neighbors, so stepping along the graph needs no round-trip
+  const waypointDetailsCache = useRef(new Map());
+  const mapDataRef = useRef(null);
+  useEffect(() => {
+    mapDataRef.current = mapData;
+    waypointDetailsCache.current.clear();
+  }, [mapData, useAnchoring]);
+
   // When a waypoint is selected, fetch its details
   useEffect(() => {
     if (!selectedWaypoint) {
@@ -202,25 +304,46 @@ function App() {
       return;
     }
 
-    // Fetch waypoint data
-    fetchWaypoint(selectedWaypoint, useAnchoring)
-      .then(data => {
-        console.log("Selected waypoint data:", data);
-        setSelectedWaypointData(data);
-      })
-      .catch(err => {
-        console.error('Error loading waypoint data:', err);
-      });
+    let active = true;
+    const cache = waypointDetailsCache.current;
+    const showWaypoint = data => {
+      console.log("Selected waypoint data:", data);
+      setSelectedWaypointData(data);
 
-    // Fetch waypoint images
-    fetchWaypointImages(selectedWaypoint)
-      .then(images => {
-        console.log("Waypoint images received:", images);
-        setWaypointImages(images);
+      // Images are served as binary JPEGs, so the browser fetches and caches each camera in parallel. Their URLs
+      // carry the image version, so a changed snapshot is fetched again rather than served from the browser cache.
+      setWaypointImages(data.has_images ? getWaypointImageUrls(data.images) : null);
+    };
+
+    const cached = cache.get(selectedWaypoint);
+    if (cached) {
+      showWaypoint(cached);
+    }
+
+    // Fetch the waypoint together with its neighbors, the likely next selections; the server also starts
+    // rendering their images
+    const waypointIds = [selectedWaypoint, ...getNeighborIds(mapDataRef.current, selectedWaypoint)]
+      .filter(waypointId => !cache.has(waypointId))
+      .slice(0, MAX_DETAILS_BATCH);
+    if (waypointIds.length === 0) {
+      return;
+    }
+
+    fetchWaypointsDetails(waypointIds, useAnchoring)
+      .then(({ waypoints }) => {
+        waypoints.forEach(data => cache.set(data.id, data));
+        if (!active || cached) return;
+        if (!cache.has(selectedWaypoint)) {
+          throw new Error(`Waypoint not found: ${selectedWaypoint}`);
+        }
+        showWaypoint(cache.get(selectedWaypoint));
       })
       .catch(err => {
-        console.error('Error loading waypoint images:', err);
+        console.error('Error loading waypoint data:', err);
       });
+    return () => {
+      active = false;
+    };
   }, [selectedWaypoint, useAnchoring]);
 
   // Handle waypoint selection
@@ -235,6 +358,7 @@ function App() {
     updateWaypointLabel(waypointId, newLabel)
       .then(() => {
         // Update the local data
+        waypointDetailsCache.current.delete(waypointId);
         if (selectedWaypointData) {
           setSelectedWaypointData(prev => ({
             ...prev,
@@ -243,7 +367,7 @@ function App() {
         }
 
         // Refresh map data
-        return fetchMap(useAnchoring);
+        return fetchMapBinary(useAnchoring).then(binaryMapToMapData);
       })
       .then(updatedMapData => {
         setMapData(updatedMapData);
@@ -313,6 +437,7 @@ function App() {
                       .then(data => {
                         console.log("Retry successful:", data);
                         setMapData(data);
+                        setMapComplete(true);
                         setLoading(false);
                       })
                       .catch(err => {
@@ -343,10 +468,13 @@ function App() {
               <SimpleMapView mapData={mapData} />
             ) : (
               <EnhancedMapView
-                mapData={mapData}
+                mapData={viewportData || mapData}
+                extentWaypoints={mapData.waypoints}
+                onViewportChange={setViewport}
                 selectedWaypoint={selectedWaypoint}
                 onWaypointSelect={handleWaypointSelect}
                 filteredObjects={filteredObjects}
+                filteredWaypointIds={filteredWaypointIds}
                 useAnchoring={useAnchoring}
                 showLabels={showLabels}
               />
@@ -1,14 +1,20 @@
 // src/components/MapViewer/EnhancedMapView.jsx
-import React, { useEffect, useRef, useState, useCallback } from 'react';
+import React, { useEffect, useRef, useState, useCallback, useMemo } from 'react';
 import './EnhancedMapView.css';
 
+// Milliseconds the view must stay still before the visible viewport is reported
+const VIEWPORT_DEBOUNCE_MS = 250;
+
 const EnhancedMapView = ({
   mapData,
   selectedWaypoint,
   onWaypointSelect,
   filteredObjects = [],
+  filteredWaypointIds = null,
   useAnchoring = false,
-  showLabels = true
+  showLabels = true,
+  extentWaypoints = null,
+  onViewportChange = null
 }) => {
   const canvasRef = useRef(null);
   const containerRef = useRef(null);
@@ -23,7 +29,6 @@ const EnhancedMapView = ({
 
   // Map rendering references
   const waypointsRef = useRef({});
-  const mapBoundsRef = useRef({ minX: 0, maxX: 0, minY: 0, maxY: 0 });
 
   // Define colors for better maintenance
   const colors = {
@@ -48,6 +53,12 @@ const EnhancedMapView = ({
     }
   };
 
+  // Waypoint ids matching the object filter, as resolved by the server
+  const filteredWaypointSet = useMemo(
+    () => (Array.isArray(filteredWaypointIds) ? new Set(filteredWaypointIds) : null),
+    [filteredWaypointIds]
+  );
+
   // Check if a waypoint should be filtered based on objects - with robust error handling
   const isWaypointFiltered = useCallback((waypoint, filteredObjects) => {
     try {
@@ -56,6 +67,11 @@ const EnhancedMapView = ({
         return false;
       }
 
+      // Prefer the server-side object index when it has answered
+      if (filteredWaypointSet) {
+        return !!waypoint && filteredWaypointSet.has(waypoint.id);
+      }
+
       // Ensure waypoint and waypoint.objects exist and are valid
       if (!waypoint || !waypoint.objects || !Array.isArray(waypoint.objects)) {
         return false;
@@ -74,7 +90,7 @@ const EnhancedMapView = ({
       console.error("Error in isWaypointFiltered:", error, waypoint, filteredObjects);
       return false; // Fail safely
     }
-  }, []);
+  }, [filteredWaypointSet]);
 
   // Check if an edge connects filtered waypoints - with robust error handling
   const isEdgeHighlighted = useCallback((edge, filteredObjects, waypoints) => {
@@ -88,6 +104,10 @@ const EnhancedMapView = ({
         return false;
       }
 
+      if (filteredWaypointSet) {
+        return filteredWaypointSet.has(edge.from_id) || filteredWaypointSet.has(edge.to_id);
+      }
+
       // Find connected waypoints safely
       const fromWaypoint = edge.from_id ? waypoints.find(wp => wp && wp.id === edge.from_id) : null;
       const toWaypoint = edge.to_id ? waypoints.find(wp => wp && wp.id === edge.to_id) : null;
@@ -99,7 +119,7 @@ const EnhancedMapView = ({
       console.error("Error in isEdgeHighlighted:", error, edge, filteredObjects);
       return false; // Fail safely
     }
-  }, [isWaypointFiltered]);
+  }, [isWaypointFiltered, filteredWaypointSet]);
 
   // Calculate map bounds for proper scaling
   const calculateMapBounds = useCallback((waypoints) => {
@@ -134,6 +154,12 @@ const EnhancedMapView = ({
     };
   }, []);
 
+  // The view is framed on extentWaypoints when given, so it stays put while only part of the map is drawn
+  const mapBounds = useMemo(
+    () => calculateMapBounds(extentWaypoints || (mapData && mapData.waypoints)),
+    [calculateMapBounds, extentWaypoints, mapData]
+  );
+
   // Handle wheel event for zooming
   const handleWheel = useCallback((e) => {
     // Calculate zoom factor
@@ -189,7 +215,7 @@ const EnhancedMapView = ({
     const canvas = canvasRef.current;
     if (!canvas) return { x: 0, y: 0 };
 
-    const bounds = mapBoundsRef.current;
+    const bounds = mapBounds;
     const effectiveScale = scale * Math.min(
       (canvas.width - 100) / (bounds.maxX - bounds.minX),
       (canvas.height - 100) / (bounds.maxY - bounds.minY)
@@ -202,7 +228,27 @@ const EnhancedMapView = ({
     const mapY = (screenY - effectiveOffsetY) / effectiveScale + (bounds.minY + bounds.maxY) / 2;
 
     return { x: mapX, y: mapY };
-  }, [scale, offset]);
+  }, [scale, offset, mapBounds]);
+
+  // Report the visible part of the map once the view settles after a pan or zoom
+  useEffect(() => {
+    if (!onViewportChange) return;
+
+    const timer = setTimeout(() => {
+      const canvas = canvasRef.current;
+      if (!canvas || !canvas.width || !canvas.height) return;
+
+      const topLeft = screenToMapCoordinates(0, 0);
+      const bottomRight = screenToMapCoordinates(canvas.width, canvas.height);
+      onViewportChange({
+        bbox: [topLeft.x, topLeft.y, bottomRight.x, bottomRight.y],
+        // Screen pixels per meter, which picks the level of detail worth drawing
+        zoom: canvas.width / (bottomRight.x - topLeft.x)
+      });
+    }, VIEWPORT_DEBOUNCE_MS);
+
+    return () => clearTimeout(timer);
+  }, [screenToMapCoordinates, onViewportChange]);
 
   // Handle mouse events
   const handleMouseDown = (e) => {
@@ -309,9 +355,7 @@ const EnhancedMapView = ({
       // Extract waypoints and edges
       const { waypoints, edges } = mapData;
 
-      // Calculate map bounds
-      const bounds = calculateMapBounds(waypoints);
-      mapBoundsRef.current = bounds;
+      const bounds = mapBounds;
 
       // Calculate scaling to fit the map
       const scaleX = (canvas.width - 100) / (bounds.maxX - bounds.minX);
@@ -625,7 +669,7 @@ const EnhancedMapView = ({
     showLabels,
     isEdgeHighlighted,
     isWaypointFiltered,
-    calculateMapBounds,
+    mapBounds,
     colors
   ]);
 
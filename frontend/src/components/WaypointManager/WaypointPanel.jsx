@@ -1,6 +1,5 @@
 // src/components/WaypointManager/WaypointPanel.jsx
 import React, { useState, useEffect } from 'react';
-import { formatImageUrl } from '../../services/api';
 import './WaypointPanel.css';
 
 const WaypointPanel = ({ waypointData, waypointImages, onLabelUpdate }) => {
@@ -104,7 +103,7 @@ const WaypointPanel = ({ waypointData, waypointImages, onLabelUpdate }) => {
                 onClick={() => handleImageClick('left')}
               >
                 <img
-                  src={formatImageUrl(waypointImages.left)}
+                  src={waypointImages.left.thumbnail}
                   alt="Left View"
                 />
                 <span>Left View</span>
@@ -117,7 +116,7 @@ const WaypointPanel = ({ waypointData, waypointImages, onLabelUpdate }) => {
                 onClick={() => handleImageClick('right')}
               >
                 <img
-                  src={formatImageUrl(waypointImages.right)}
+                  src={waypointImages.right.thumbnail}
                   alt="Right View"
                 />
                 <span>Right View</span>
@@ -134,7 +133,7 @@ const WaypointPanel = ({ waypointData, waypointImages, onLabelUpdate }) => {
             <button className="close-button" onClick={closeExpandedImage}>×</button>
             <h3>{expandedImage === 'left' ? 'Left View' : 'Right View'}</h3>
             <img
-              src={formatImageUrl(waypointImages[expandedImage])}
+              src={waypointImages[expandedImage].full}
               alt={`${expandedImage} View`}
               className="expanded-image"
             />
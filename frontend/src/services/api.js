@@ -3,12 +3,23 @@ const API_BASE_URL = 'http://127.0.0.1:5000/api';
 /**
  * Fetch the map data from the server
  * @param {boolean} useAnchoring - Whether to use anchoring mode
+ * @param {Array<number>|null} bbox - Optional viewport [minX, minY, maxX, maxY]; only what it contains is returned
+ * @param {number|null} lod - Optional level of detail; 0 is the full graph, higher levels are coarser
+ * @param {number|null} zoom - Optional screen pixels per meter, used to pick the level of detail when lod is null
  * @returns {Promise<Object>} - The map data
  */
-export const fetchMap = async (useAnchoring = false) => {
+export const fetchMap = async (useAnchoring = false, bbox = null, lod = null, zoom = null) => {
   try {
     console.log(`Fetching map data with useAnchoring=${useAnchoring}`);
-    const url = `${API_BASE_URL}/map?use_anchoring=${useAnchoring}`;
+    let url = `${API_BASE_URL}/map?use_anchoring=${useAnchoring}`;
+    if (bbox) {
+      url += `&bbox=${bbox.join(',')}`;
+    }
+    if (lod !== null) {
+      url += `&lod=${lod}`;
+    } else if (zoom !== null) {
+      url += `&zoom=${zoom}`;
+    }
     console.log(`Request URL: ${url}`);
 
     const response = await fetch(url);
@@ -35,6 +46,233 @@ export const fetchMap = async (useAnchoring = false) => {
   }
 };
 
+/**
+ * Incremental parser for the NDJSON map stream: feed it text as it arrives and read the partial map data
+ * @returns {Object} - { data, push(text), finish() }; finish() returns the map data once the stream is complete
+ */
+const createMapStreamParser = () => {
+  const data = { waypoints: [], edges: [], objects: [] };
+  let buffer = '';
+  let complete = false;
+
+  const handleLine = (line) => {
+    if (!line.trim()) return;
+    const record = JSON.parse(line);
+    const kind = Object.keys(record)[0];
+    if (kind === 'map') {
+      Object.assign(data, record.map);
+    } else if (kind === 'end') {
+      complete = true;
+    } else {
+      data[`${kind}s`].push(record[kind]);
+    }
+  };
+
+  return {
+    data,
+    push(text) {
+      buffer += text;
+      const lines = buffer.split('\n');
+      // The last piece may be an incomplete line; keep it for the next chunk
+      buffer = lines.pop();
+      lines.forEach(handleLine);
+    },
+    finish() {
+      handleLine(buffer);
+      buffer = '';
+      if (!complete) {
+        throw new Error('Map stream ended before all data was received');
+      }
+      return data;
+    },
+  };
+};
+
+/**
+ * Stream the map data from the server, reporting the partial map while it downloads
+ * @param {boolean} useAnchoring - Whether to use anchoring mode
+ * @param {Object} options - Optional settings:
+ *   bbox, lod and zoom as in fetchMap;
+ *   onProgress(partialData), called at most every progressInterval milliseconds with the map data received so far;
+ *   signal, an AbortSignal to cancel the download
+ * @returns {Promise<Object>} - The complete map data, in the same shape as fetchMap returns
+ */
+export const streamMap = async (
+  useAnchoring = false,
+  { bbox = null, lod = null, zoom = null, onProgress = null, progressInterval = 100, signal = undefined } = {}
+) => {
+  try {
+    const params = new URLSearchParams({ use_anchoring: useAnchoring, format: 'ndjson' });
+    if (bbox) {
+      params.append('bbox', bbox.join(','));
+    }
+    if (lod !== null) {
+      params.append('lod', lod);
+    } else if (zoom !== null) {
+      params.append('zoom', zoom);
+    }
+
+    const response = await fetch(`${API_BASE_URL}/map?${params.toString()}`, { signal });
+    if (!response.ok) {
+      const errorBody = await response.text();
+      throw new Error(`HTTP error! Status: ${response.status}, Details: ${errorBody}`);
+    }
+
+    const parser = createMapStreamParser();
+    if (!response.body || !response.body.getReader) {
+      // No streaming support in this browser: parse the whole body at once
+      parser.push(await response.text());
+      return parser.finish();
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let lastProgress = 0;
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+
+      parser.push(decoder.decode(value, { stream: true }));
+      const now = Date.now();
+      if (onProgress && now - lastProgress >= progressInterval) {
+        lastProgress = now;
+        // A new object so React sees a change; the arrays keep growing in place
+        onProgress({ ...parser.data });
+      }
+    }
+    parser.push(decoder.decode());
+
+    const data = parser.finish();
+    console.log(`Successfully streamed map with ${data.waypoints.length} waypoints`);
+    return data;
+  } catch (error) {
+    if (error.name !== 'AbortError') {
+      console.error('Error streaming map data:', error);
+    }
+    throw error;
+  }
+};
+
+const MAP_BINARY_MAGIC = 'SPMB';
+const MAP_BINARY_VERSION = 1;
+const MAP_BINARY_TYPES = { float32: Float32Array, uint32: Uint32Array, uint8: Uint8Array };
+
+/**
+ * Decode a binary map (format=binary, see backend/map_codec.py) into typed arrays without copying them
+ * @param {ArrayBuffer} buffer - The response body
+ * @returns {Object} - { map, counts, strings, ...sections }: map holds the top-level map fields, strings the string
+ *   table, and each section is a typed array view into buffer (positions are x, y, z triples)
+ */
+export const decodeMapBinary = (buffer) => {
+  const view = new DataView(buffer);
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+  if (magic !== MAP_BINARY_MAGIC || view.getUint32(4, true) !== MAP_BINARY_VERSION) {
+    throw new Error('Unsupported binary map format');
+  }
+
+  const headerLength = view.getUint32(8, true);
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 12, headerLength)));
+  const decoded = { map: header.map, counts: header.counts };
+  Object.entries(header.sections).forEach(([name, [dtype, offset, length]]) => {
+    decoded[name] = new MAP_BINARY_TYPES[dtype](buffer, offset, length);
+  });
+  decoded.strings = new TextDecoder().decode(decoded.strings).split('\0');
+  return decoded;
+};
+
+/**
+ * Convert a decoded binary map into the same shape as fetchMap returns, for components that expect plain objects
+ * @param {Object} decoded - The result of decodeMapBinary
+ * @returns {Object} - The map data
+ */
+export const binaryMapToMapData = (decoded) => {
+  const { counts, strings, positions } = decoded;
+  const lod = decoded.map.lod !== undefined;
+  const ids = Array.from(decoded.point_ids, (index) => strings[index]);
+  const position = (row) => [positions[row * 3], positions[row * 3 + 1], positions[row * 3 + 2]];
+  const list = (offsets, values, row) =>
+    Array.from(values.subarray(offsets[row], offsets[row + 1]), (index) => strings[index]);
+
+  const waypoints = new Array(counts.waypoints);
+  for (let i = 0; i < counts.waypoints; i++) {
+    const waypoint = {
+      id: ids[i],
+      position: position(i),
+      label: strings[decoded.waypoint_labels[i]],
+      snapshot_id: strings[decoded.waypoint_snapshot_ids[i]],
+      has_images: decoded.waypoint_has_images[i] === 1,
+    };
+    const objects = list(decoded.waypoint_object_offsets, decoded.waypoint_objects, i);
+    if (objects.length > 0 || lod) {
+      waypoint.objects = objects;
+    }
+    if (lod) {
+      waypoint.members = list(decoded.waypoint_member_offsets, decoded.waypoint_members, i);
+    }
+    waypoints[i] = waypoint;
+  }
+
+  const edges = new Array(counts.edges);
+  for (let i = 0; i < counts.edges; i++) {
+    const from = decoded.edge_points[i * 2];
+    const to = decoded.edge_points[i * 2 + 1];
+    const edge = {
+      id: `${ids[from]}_${ids[to]}`,
+      from_id: ids[from],
+      to_id: ids[to],
+      from_position: position(from),
+      to_position: position(to),
+    };
+    if (lod) {
+      edge.members = list(decoded.edge_member_offsets, decoded.edge_members, i);
+    }
+    edges[i] = edge;
+  }
+
+  const objects = new Array(counts.objects);
+  for (let i = 0; i < counts.objects; i++) {
+    objects[i] = {
+      id: strings[decoded.object_ids[i]],
+      position: Array.from(decoded.object_positions.subarray(i * 3, i * 3 + 3)),
+      type: strings[decoded.object_types[i]],
+    };
+  }
+
+  return { ...decoded.map, waypoints, edges, objects };
+};
+
+/**
+ * Fetch the map data in the compact binary format
+ * @param {boolean} useAnchoring - Whether to use anchoring mode
+ * @param {Array<number>|null} bbox - As in fetchMap
+ * @param {number|null} lod - As in fetchMap
+ * @returns {Promise<Object>} - The decoded map, see decodeMapBinary
+ */
+export const fetchMapBinary = async (useAnchoring = false, bbox = null, lod = null) => {
+  try {
+    const params = new URLSearchParams({ use_anchoring: useAnchoring, format: 'binary' });
+    if (bbox) {
+      params.append('bbox', bbox.join(','));
+    }
+    if (lod !== null) {
+      params.append('lod', lod);
+    }
+
+    const response = await fetch(`${API_BASE_URL}/map?${params.toString()}`);
+    if (!response.ok) {
+      const errorBody = await response.text();
+      throw new Error(`HTTP error! Status: ${response.status}, Details: ${errorBody}`);
+    }
+
+    const decoded = decodeMapBinary(await response.arrayBuffer());
+    console.log(`Successfully retrieved binary map with ${decoded.counts.waypoints} waypoints`);
+    return decoded;
+  } catch (error) {
+    console.error('Error fetching binary map data:', error);
+    throw error;
+  }
+};
+
 /**
  * Fetch all waypoints
  * @returns {Promise<Array>} - Array of waypoint data
@@ -53,6 +291,54 @@ export const fetchWaypoints = async () => {
   }
 };
 
+/**
+ * Fetch the waypoints nearest to a point
+ * @param {number} x - X coordinate in the selected frame
+ * @param {number} y - Y coordinate in the selected frame
+ * @param {number} k - Number of waypoints to return
+ * @param {boolean} useAnchoring - Whether to use anchoring mode
+ * @returns {Promise<Array>} - Waypoints with their distance, nearest first
+ */
+export const fetchNearestWaypoints = async (x, y, k = 1, useAnchoring = false) => {
+  try {
+    const response = await fetch(
+      `${API_BASE_URL}/waypoints/nearest?x=${x}&y=${y}&k=${k}&use_anchoring=${useAnchoring}`
+    );
+    if (!response.ok) {
+      const errorBody = await response.text();
+      throw new Error(`HTTP error! Status: ${response.status}, Details: ${errorBody}`);
+    }
+    return await response.json();
+  } catch (error) {
+    console.error('Error fetching nearest waypoints:', error);
+    throw error;
+  }
+};
+
+/**
+ * Fetch the waypoints within a radius of a point
+ * @param {number} x - X coordinate in the selected frame
+ * @param {number} y - Y coordinate in the selected frame
+ * @param {number} radius - Search radius in meters
+ * @param {boolean} useAnchoring - Whether to use anchoring mode
+ * @returns {Promise<Array>} - Waypoints with their distance, nearest first
+ */
+export const fetchWaypointsInRadius = async (x, y, radius, useAnchoring = false) => {
+  try {
+    const response = await fetch(
+      `${API_BASE_URL}/waypoints/radius?x=${x}&y=${y}&r=${radius}&use_anchoring=${useAnchoring}`
+    );
+    if (!response.ok) {
+      const errorBody = await response.text();
+      throw new Error(`HTTP error! Status: ${response.status}, Details: ${errorBody}`);
+    }
+    return await response.json();
+  } catch (error) {
+    console.error('Error fetching waypoints in radius:', error);
+    throw error;
+  }
+};
+
 /**
  * Fetch data for a specific waypoint
  * @param {string} waypointId - The ID of the waypoint
@@ -73,14 +359,39 @@ export const fetchWaypoint = async (waypointId, useAnchoring = false) => {
   }
 };
 
+/**
+ * Fetch the details and image URLs of several waypoints in one request
+ * @param {Array<string>} waypointIds - The waypoint IDs, at most 100
+ * @param {boolean} useAnchoring - Whether to use anchoring mode
+ * @returns {Promise<Object>} - { waypoints, missing }: the details of each waypoint found, as fetchWaypoint
+ *   returns plus image URLs and ETags, and the IDs that were not found
+ */
+export const fetchWaypointsDetails = async (waypointIds, useAnchoring = false) => {
+  try {
+    const params = new URLSearchParams({ use_anchoring: useAnchoring });
+    waypointIds.forEach(waypointId => params.append('id', waypointId));
+
+    const response = await fetch(`${API_BASE_URL}/waypoints/details?${params.toString()}`);
+    if (!response.ok) {
+      const errorBody = await response.text();
+      throw new Error(`HTTP error! Status: ${response.status}, Details: ${errorBody}`);
+    }
+    return await response.json();
+  } catch (error) {
+    console.error('Error fetching waypoint details:', error);
+    throw error;
+  }
+};
+
 /**
  * Fetch images for a specific waypoint
  * @param {string} waypointId - The ID of the waypoint
+ * @param {string} size - Image size variant, 'thumbnail' or 'full'
  * @returns {Promise<Object>} - Object containing image data
  */
-export const fetchWaypointImages = async (waypointId) => {
+export const fetchWaypointImages = async (waypointId, size = 'full') => {
   try {
-    const response = await fetch(`${API_BASE_URL}/waypoint/${waypointId}/images`);
+    const response = await fetch(`${API_BASE_URL}/waypoint/${waypointId}/images?size=${size}`);
     if (!response.ok) {
       const errorBody = await response.text();
       throw new Error(`HTTP error! Status: ${response.status}, Details: ${errorBody}`);
@@ -92,6 +403,40 @@ export const fetchWaypointImages = async (waypointId) => {
   }
 };
 
+/**
+ * Build the URL of a single waypoint camera image served as binary JPEG
+ * @param {string} waypointId - The ID of the waypoint
+ * @param {string} camera - Camera name, 'left' or 'right'
+ * @param {string} size - Image size variant, 'thumbnail' or 'full'
+ * @param {string} version - The image's ETag; browsers only cache versioned URLs without revalidating them
+ * @returns {string} - Image URL usable directly as an <img> src
+ */
+export const getWaypointImageUrl = (waypointId, camera, size = 'full', version = null) => {
+  const params = new URLSearchParams({ size });
+  if (version) {
+    params.set('v', version);
+  }
+  return `${API_BASE_URL}/waypoint/${encodeURIComponent(waypointId)}/image/${camera}?${params.toString()}`;
+};
+
+/**
+ * Build thumbnail and full-size image URLs for the front cameras of a waypoint
+ * @param {Object} images - The images of a waypoint as fetchWaypointsDetails returns them,
+ *   { camera: { size: { url, etag } } }
+ * @returns {Object} - Map of camera name to { thumbnail, full } URLs
+ */
+export const getWaypointImageUrls = (images) => {
+  const urls = {};
+  Object.entries(images || {}).forEach(([camera, sizes]) => {
+    urls[camera] = {};
+    Object.entries(sizes).forEach(([size, image]) => {
+      // The server returns versioned paths; resolve them against the API server rather than the page
+      urls[camera][size] = new URL(image.url, API_BASE_URL).href;
+    });
+  });
+  return urls;
+};
+
 /**
  * Fetch all objects in the environment
  * @returns {Promise<Array>} - Array of object names
@@ -110,6 +455,82 @@ export const fetchObjects = async () => {
   }
 };
 
+/**
+ * Fetch the ids of waypoints that see the given objects
+ * @param {Array<string>} objects - Object names as returned by fetchObjects
+ * @param {string} mode - 'or' to match any object, 'and' to match all of them
+ * @returns {Promise<Array<string>>} - Matching waypoint ids in graph order
+ */
+export const fetchObjectWaypoints = async (objects, mode = 'or') => {
+  try {
+    const params = new URLSearchParams({ mode });
+    objects.forEach(object => params.append('object', object));
+    const response = await fetch(`${API_BASE_URL}/objects/filter?${params.toString()}`);
+    if (!response.ok) {
+      const errorBody = await response.text();
+      throw new Error(`HTTP error! Status: ${response.status}, Details: ${errorBody}`);
+    }
+    const data = await response.json();
+    return data.waypoints;
+  } catch (error) {
+    console.error('Error fetching waypoints for objects:', error);
+    throw error;
+  }
+};
+
+/**
+ * Fetch the shortest route along the graph edges between two waypoints
+ * @param {string} fromId - The ID of the start waypoint
+ * @param {string} toId - The ID of the destination waypoint
+ * @param {boolean} useAnchoring - Whether to use anchoring mode
+ * @returns {Promise<Object|null>} - { from, to, distance, waypoints, positions }, or null if no route connects them
+ */
+export const fetchRoute = async (fromId, toId, useAnchoring = false) => {
+  try {
+    const params = new URLSearchParams({ from: fromId, to: toId, use_anchoring: useAnchoring });
+    const response = await fetch(`${API_BASE_URL}/route?${params.toString()}`);
+    if (response.status === 404) {
+      return null;
+    }
+    if (!response.ok) {
+      const errorBody = await response.text();
+      throw new Error(`HTTP error! Status: ${response.status}, Details: ${errorBody}`);
+    }
+    return await response.json();
+  } catch (error) {
+    console.error('Error fetching route:', error);
+    throw error;
+  }
+};
+
+/**
+ * Fetch the shortest route from a waypoint to the nearest waypoint that sees the given objects
+ * @param {string} fromId - The ID of the start waypoint
+ * @param {Array<string>} objects - Object names as returned by fetchObjects
+ * @param {string} mode - 'or' to match any object, 'and' to match all of them
+ * @param {boolean} useAnchoring - Whether to use anchoring mode
+ * @returns {Promise<Object|null>} - The route as fetchRoute returns it plus the objects seen at its end, or null
+ *   if no waypoint seeing the objects can be reached
+ */
+export const fetchRouteToObjects = async (fromId, objects, mode = 'or', useAnchoring = false) => {
+  try {
+    const params = new URLSearchParams({ from: fromId, mode, use_anchoring: useAnchoring });
+    objects.forEach(object => params.append('object', object));
+    const response = await fetch(`${API_BASE_URL}/route/objects?${params.toString()}`);
+    if (response.status === 404) {
+      return null;
+    }
+    if (!response.ok) {
+      const errorBody = await response.text();
+      throw new Error(`HTTP error! Status: ${response.status}, Details: ${errorBody}`);
+    }
+    return await response.json();
+  } catch (error) {
+    console.error('Error fetching route to objects:', error);
+    throw error;
+  }
+};
+
 /**
  * Update the label for a waypoint
  * @param {string} waypointId - The ID of the waypoint
@@ -136,6 +557,31 @@ export const updateWaypointLabel = async (waypointId, newLabel) => {
   }
 };
 
+/**
+ * Update the labels of several waypoints in one request
+ * @param {Object} labels - Map of waypoint ID to new label
+ * @returns {Promise<Object>} - The response data
+ */
+export const updateWaypointLabels = async (labels) => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/waypoints/labels`, {
+      method: 'PUT',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ labels }),
+    });
+    if (!response.ok) {
+      const errorBody = await response.text();
+      throw new Error(`HTTP error! Status: ${response.status}, Details: ${errorBody}`);
+    }
+    return await response.json();
+  } catch (error) {
+    console.error('Error updating waypoint labels:', error);
+    throw error;
+  }
+};
+
 /**
  * Helper function to format base64 image data
  * @param {string} base64String - Base64 encoded image string